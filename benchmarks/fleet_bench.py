@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""Fan-out benchmarks against a fake SSH fleet on loopback.
+
+Starts N paramiko ``ServerInterface`` endpoints on 127.0.0.1 (one listening
+port each) that answer exec requests synthetically: no shell is spawned, a
+command sleeps for ``--command-runtime``, writes ``--output-bytes`` of
+output and exits non-zero with probability ``--failure-rate``. Handshakes
+can be slowed with ``--handshake-delay`` (the banner is held back) and a
+share of connections dropped with ``--connect-failure-rate``.
+
+The harness then drives ``SSHCommander.run_command_on_all``,
+``run_commands_from_file`` and ``test_connectivity`` for each requested
+``--parallel`` value and engine and reports hosts/sec, per-host latency
+percentiles (sum of the recorded phases), CPU time, peak RSS and peak
+thread count of the controller.
+
+By default the fleet runs in a child process so its threads, memory and
+CPU do not count against the controller; ``--in-process`` keeps it local.
+
+    python benchmarks/fleet_bench.py --hosts 200 --parallel 1,16,64,auto
+    python benchmarks/fleet_bench.py --hosts 500 --scenario exec --engine async \\
+        --handshake-delay 0.05 --command-runtime 0.2 --json results.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import paramiko
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ssh_commander  # noqa: E402
+from ssh_commander import SSHCommander, TimingReport  # noqa: E402
+
+SCENARIOS = ('exec', 'file', 'test')
+# Output is sent in chunks of this size, as full lines.
+CHUNK = 32 * 1024
+
+
+# ---------------------------------------------------------------------------
+# Fake fleet
+# ---------------------------------------------------------------------------
+
+
+class _FakeServer(paramiko.ServerInterface):
+    """Accept any password and run exec requests through ``fleet``."""
+
+    def __init__(self, fleet: 'FakeFleet') -> None:
+        self._fleet = fleet
+
+    def get_allowed_auths(self, username: str) -> str:
+        return 'password'
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args) -> bool:
+        return True
+
+    def check_channel_exec_request(self, channel, command: bytes) -> bool:
+        threading.Thread(
+            target=self._fleet.run_command, args=(channel,), daemon=True
+        ).start()
+        return True
+
+
+class FakeFleet:
+    """N loopback SSH endpoints sharing one host key and one accept loop."""
+
+    def __init__(
+        self,
+        hosts: int,
+        handshake_delay: float = 0.0,
+        command_runtime: float = 0.0,
+        output_bytes: int = 64,
+        failure_rate: float = 0.0,
+        connect_failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.hosts = hosts
+        self.handshake_delay = handshake_delay
+        self.command_runtime = command_runtime
+        self.output_bytes = output_bytes
+        self.failure_rate = failure_rate
+        self.connect_failure_rate = connect_failure_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._selector = selectors.DefaultSelector()
+        self._listeners: List[socket.socket] = []
+        self.ports: List[int] = []
+        # Clients hang up without a disconnect message; don't log every reset.
+        logging.getLogger('paramiko.transport').setLevel(logging.CRITICAL)
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < rate
+
+    def start(self) -> List[int]:
+        """Bind every endpoint and start accepting; returns the ports."""
+        for _ in range(self.hosts):
+            listener = socket.socket()
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1024)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ)
+            self._listeners.append(listener)
+            self.ports.append(listener.getsockname()[1])
+        threading.Thread(target=self._accept_loop, name='fleet-accept', daemon=True).start()
+        return self.ports
+
+    def _accept_loop(self) -> None:
+        while True:
+            for key, _ in self._selector.select():
+                try:
+                    conn, _ = key.fileobj.accept()
+                except (BlockingIOError, OSError):
+                    continue
+                conn.setblocking(True)
+                # As sshd does; otherwise Nagle stalls each handshake round trip.
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn: socket.socket) -> None:
+        if self._chance(self.connect_failure_rate):
+            conn.close()
+            return
+        if self.handshake_delay > 0:
+            time.sleep(self.handshake_delay)
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self._host_key)
+        try:
+            transport.start_server(server=_FakeServer(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def run_command(self, channel) -> None:
+        try:
+            if self.command_runtime > 0:
+                time.sleep(self.command_runtime)
+            remaining = self.output_bytes
+            line = b'x' * 63 + b'\n'
+            chunk = line * (CHUNK // len(line))
+            while remaining > 0:
+                piece = chunk[:remaining]
+                channel.sendall(piece)
+                remaining -= len(piece)
+            channel.send_exit_status(1 if self._chance(self.failure_rate) else 0)
+            # Send EOF but leave the close to the client: closing here can
+            # overtake the exec request's reply and fail the client's
+            # exec_command() when the command takes no time.
+            channel.shutdown_write()
+        except (EOFError, OSError, paramiko.SSHException):
+            channel.close()
+
+
+def _serve_fleet(pipe, options: Dict) -> None:
+    """Child-process entry point: start a fleet, send its ports, then idle."""
+    fleet = FakeFleet(**options)
+    pipe.send(fleet.start())
+    # The parent closes its end (or exits) when the benchmark is done.
+    try:
+        pipe.recv()
+    except EOFError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+
+class _Sampler:
+    """Sample the controller's RSS and Python thread count in the background."""
+
+    INTERVAL = 0.01
+
+    def __init__(self) -> None:
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bench-sampler', daemon=True)
+        self._page = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def _rss(self) -> int:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            # Not Linux: fall back to the process-lifetime peak.
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _sample(self) -> None:
+        self.peak_rss = max(self.peak_rss, self._rss())
+        # Don't count the sampler itself.
+        self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.INTERVAL):
+            self._sample()
+
+    def __enter__(self) -> '_Sampler':
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _settle(baseline: int, timeout: float = 5.0) -> None:
+    """Wait for threads left over from the previous run to exit."""
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > baseline and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = max(0, -(-len(ordered) * pct // 100) - 1)
+    return ordered[int(index)]
+
+
+def _write_inventory(path: str, ports: List[int]) -> None:
+    servers = [
+        {
+            'hostname': '127.0.0.1',
+            'port': port,
+            'username': 'bench',
+            'password': 'bench',
+            'tags': ['bench'],
+        }
+        for port in ports
+    ]
+    with open(path, 'w') as f:
+        yaml.safe_dump(servers, f)
+
+
+def run_scenario(
+    config_file: str,
+    workdir: str,
+    scenario: str,
+    parallel: Union[int, str],
+    engine: str,
+    output: str,
+    file_commands: int,
+    timeout: float,
+) -> Dict:
+    """Run one scenario against the fleet and return its measurements."""
+    commander = SSHCommander(config_file=config_file, connect_timeout=timeout)
+    # Keep accepted host keys away from the user's known_hosts.
+    commander.known_hosts = ssh_commander._KnownHosts(os.path.join(workdir, 'known_hosts'))
+    commander.timings = TimingReport()
+    command_file = os.path.join(workdir, 'commands.txt')
+    with open(command_file, 'w') as f:
+        f.writelines(f"echo {i}\n" for i in range(file_commands))
+
+    cpu_before = os.times()
+    started = time.monotonic()
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull), \
+            _Sampler() as sampler:
+        if scenario == 'exec':
+            failures = commander.run_command_on_all(
+                'bench', parallel=parallel, engine=engine, output=output
+            )
+        elif scenario == 'file':
+            failures = commander.run_commands_from_file(
+                command_file, parallel=parallel, engine=engine, output=output
+            )
+        else:
+            failures = commander.test_connectivity(parallel=parallel, engine=engine)
+    wall = time.monotonic() - started
+    cpu_after = os.times()
+
+    hosts = len(commander.servers)
+    latencies = sorted(
+        sum(v for phase, v in timer.phases.items() if phase != 'first_byte')
+        for timer in commander.timings.hosts
+    )
+    return {
+        'scenario': scenario,
+        'engine': engine,
+        'parallel': parallel,
+        'hosts': hosts,
+        'failed': failures,
+        'wall': wall,
+        'hosts_per_sec': hosts / wall if wall > 0 else 0.0,
+        'p50': _percentile(latencies, 50),
+        'p95': _percentile(latencies, 95),
+        'p99': _percentile(latencies, 99),
+        'max': latencies[-1] if latencies else 0.0,
+        'cpu': (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system),
+        'peak_rss': sampler.peak_rss,
+        'peak_threads': sampler.peak_threads,
+    }
+
+
+def _print_header() -> None:
+    print(
+        f"{'scenario':<9}{'engine':<8}{'par':>5}{'hosts':>7}{'fail':>6}{'wall':>9}"
+        f"{'hosts/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'cpu':>8}{'rss':>9}{'thr':>6}"
+    )
+
+
+def _print_row(r: Dict) -> None:
+    print(
+        f"{r['scenario']:<9}{r['engine']:<8}{str(r['parallel']):>5}{r['hosts']:>7}"
+        f"{r['failed']:>6}{r['wall']:>8.2f}s{r['hosts_per_sec']:>9.1f}"
+        f"{r['p50'] * 1000:>7.0f}ms{r['p95'] * 1000:>7.0f}ms{r['p99'] * 1000:>7.0f}ms"
+        f"{r['max'] * 1000:>7.0f}ms{r['cpu']:>7.2f}s{r['peak_rss'] / 1048576:>7.1f}MB"
+        f"{r['peak_threads']:>6}",
+        flush=True,
+    )
+
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Benchmark ssh-commander fan-out against a fake loopback SSH fleet',
+    )
+    parser.add_argument('--hosts', type=int, default=50, help='Fleet size (default: 50)')
+    parser.add_argument(
+        '--parallel', default='1,16,64',
+        help="Comma-separated --parallel values to try, 'auto' allowed (default: 1,16,64)",
+    )
+    parser.add_argument(
+        '--engine', default='thread',
+        help='Comma-separated engines to try: thread, async (default: thread)',
+    )
+    parser.add_argument(
+        '--scenario', default=','.join(SCENARIOS),
+        help=f"Comma-separated scenarios: {', '.join(SCENARIOS)} (default: all)",
+    )
+    parser.add_argument(
+        '--output', choices=('text', 'stream', 'ndjson'), default='text',
+        help='exec/file output mode; output goes to /dev/null (default: text)',
+    )
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per combination (default: 1)')
+    parser.add_argument(
+        '--handshake-delay', type=float, default=0.0, metavar='SECONDS',
+        help='Hold back each server banner this long (default: 0)',
+    )
+    parser.add_argument(
+        '--command-runtime', type=float, default=0.0, metavar='SECONDS',
+        help='Time each command takes before it exits (default: 0)',
+    )
+    parser.add_argument(
+        '--output-bytes', type=int, default=64, metavar='BYTES',
+        help='Output written by each command (default: 64)',
+    )
+    parser.add_argument(
+        '--failure-rate', type=float, default=0.0, metavar='RATE',
+        help='Probability a command exits with status 1 (default: 0)',
+    )
+    parser.add_argument(
+        '--connect-failure-rate', type=float, default=0.0, metavar='RATE',
+        help='Probability a connection is dropped before the banner (default: 0)',
+    )
+    parser.add_argument(
+        '--file-commands', type=int, default=5, metavar='N',
+        help="Commands per host in the 'file' scenario (default: 5)",
+    )
+    parser.add_argument('--timeout', type=float, default=30.0, help='Connect timeout (default: 30)')
+    parser.add_argument('--seed', type=int, help='Seed for the failure draws')
+    parser.add_argument(
+        '--in-process', action='store_true',
+        help='Run the fleet in this process instead of a child process',
+    )
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    scenarios = _split_list(args.scenario)
+    engines = _split_list(args.engine)
+    try:
+        levels = [p if p == 'auto' else int(p) for p in _split_list(args.parallel)]
+    except ValueError:
+        print(f"Invalid --parallel list: {args.parallel}", file=sys.stderr)
+        return 2
+    unknown = [s for s in scenarios if s not in SCENARIOS] + [
+        e for e in engines if e not in ('thread', 'async')
+    ]
+    if unknown or args.hosts < 1 or args.repeat < 1:
+        print(f"Invalid arguments: {', '.join(unknown) or '--hosts/--repeat must be >= 1'}",
+              file=sys.stderr)
+        return 2
+
+    options = {
+        'hosts': args.hosts,
+        'handshake_delay': args.handshake_delay,
+        'command_runtime': args.command_runtime,
+        'output_bytes': args.output_bytes,
+        'failure_rate': args.failure_rate,
+        'connect_failure_rate': args.connect_failure_rate,
+        'seed': args.seed,
+    }
+    child = None
+    if args.in_process:
+        ports = FakeFleet(**options).start()
+    else:
+        parent_end, child_end = multiprocessing.Pipe()
+        child = multiprocessing.Process(target=_serve_fleet, args=(child_end, options), daemon=True)
+        child.start()
+        ports = parent_end.recv()
+
+    results: List[Dict] = []
+    baseline = threading.active_count()
+    try:
+        with tempfile.TemporaryDirectory(prefix='ssh-commander-bench-') as workdir:
+            config_file = os.path.join(workdir, 'servers.yaml')
+            _write_inventory(config_file, ports)
+            print(
+                f"{args.hosts} hosts, handshake delay {args.handshake_delay:g}s, "
+                f"command runtime {args.command_runtime:g}s, {args.output_bytes} bytes output, "
+                f"failure rate {args.failure_rate:g}, connect failure rate "
+                f"{args.connect_failure_rate:g}\n",
+            )
+            _print_header()
+            for scenario in scenarios:
+                for engine in engines:
+                    for level in levels:
+                        for _ in range(args.repeat):
+                            _settle(baseline)
+                            result = run_scenario(
+                                config_file, workdir, scenario, level, engine, args.output,
+                                args.file_commands, args.timeout,
+                            )
+                            results.append(result)
+                            _print_row(result)
+    finally:
+        if child is not None:
+            child.terminate()
+            child.join()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,14 +5,14 @@ _ssh_commander() {
     _init_completion || return
 
     # List of all commands
-    local commands="exec add edit remove list sync test config-path version"
-    local global_opts="--config --no-color -q --quiet -v --verbose --timeout --strict-host-key-checking --version -h --help"
+    local commands="exec add edit remove list import export sync test push pull transport-bench pool config-path version"
+    local global_opts="--config --no-color -q --quiet -v --verbose --timeout --strict-host-key-checking --pool --pool-socket --agent --profile --version -h --help"
 
     # Find the subcommand (skip global options that take values)
     local i=1 cmd=""
     while [[ $i -lt $cword ]]; do
         case "${words[i]}" in
-            --config|--timeout)
+            --config|--timeout|--profile|--pool-socket)
                 i=$((i + 2))
                 ;;
             -*)
@@ -62,7 +62,7 @@ _ssh_commander() {
                 -c|--command)
                     return 0
                     ;;
-                -f|--file)
+                -f|--file|--timings-json|--trace|--metrics-file)
                     _filedir
                     return 0
                     ;;
@@ -71,10 +71,22 @@ _ssh_commander() {
                     return 0
                     ;;
                 -p|--parallel)
+                    COMPREPLY=( $(compgen -W "auto" -- "$cur") )
+                    return 0
+                    ;;
+                --max-parallel|--connect-parallel|--connect-rate|--connect-rate-per|--connect-retries|--retry-backoff|--dns-cache-ttl|--batch-size|--batch-percent|--canary|--pause|--max-failures|--command-timeout|--deadline)
+                    return 0
+                    ;;
+                --engine)
+                    COMPREPLY=( $(compgen -W "thread async" -- "$cur") )
+                    return 0
+                    ;;
+                -o|--output)
+                    COMPREPLY=( $(compgen -W "text stream ndjson" -- "$cur") )
                     return 0
                     ;;
                 *)
-                    COMPREPLY=( $(compgen -W "-c --command -f --file -t --tags -p --parallel --stop-on-error" -- "$cur") )
+                    COMPREPLY=( $(compgen -W "-c --command -f --file -t --tags -p --parallel -o --output --collate --stop-on-error --batch --engine --max-parallel --connect-parallel --connect-rate --connect-rate-per --connect-retries --retry-backoff --timings --timings-json --trace --metrics-file --dns-cache-ttl --batch-size --batch-percent --canary --pause --max-failures --command-timeout --deadline" -- "$cur") )
                     return 0
                     ;;
             esac
@@ -117,6 +129,53 @@ _ssh_commander() {
             COMPREPLY=( $(compgen -W "$hosts -y --yes" -- "$cur") )
             return 0
             ;;
+        import)
+            case $prev in
+                --format)
+                    COMPREPLY=( $(compgen -W "csv jsonl ini" -- "$cur") )
+                    return 0
+                    ;;
+                --mode)
+                    COMPREPLY=( $(compgen -W "merge replace" -- "$cur") )
+                    return 0
+                    ;;
+                --username)
+                    return 0
+                    ;;
+                --key-file)
+                    _filedir
+                    return 0
+                    ;;
+                *)
+                    if [[ $cur == -* ]]; then
+                        COMPREPLY=( $(compgen -W "--format --mode --username --key-file --dry-run -y --yes" -- "$cur") )
+                    else
+                        _filedir
+                    fi
+                    return 0
+                    ;;
+            esac
+            ;;
+        export)
+            case $prev in
+                -t|--tags)
+                    COMPREPLY=( $(compgen -W "$tags" -- "$cur") )
+                    return 0
+                    ;;
+                --format)
+                    COMPREPLY=( $(compgen -W "csv jsonl ini" -- "$cur") )
+                    return 0
+                    ;;
+                -o|--output)
+                    _filedir
+                    return 0
+                    ;;
+                *)
+                    COMPREPLY=( $(compgen -W "-t --tags --format -o --output" -- "$cur") )
+                    return 0
+                    ;;
+            esac
+            ;;
         list)
             case $prev in
                 -t|--tag|--tags)
@@ -140,10 +199,73 @@ _ssh_commander() {
                     return 0
                     ;;
                 -p|--parallel)
+                    COMPREPLY=( $(compgen -W "auto" -- "$cur") )
+                    return 0
+                    ;;
+                --max-parallel|--connect-parallel|--connect-rate|--connect-rate-per|--connect-retries|--retry-backoff|--dns-cache-ttl)
+                    return 0
+                    ;;
+                --timings-json|--trace|--metrics-file)
+                    _filedir
+                    return 0
+                    ;;
+                --engine)
+                    COMPREPLY=( $(compgen -W "thread async" -- "$cur") )
+                    return 0
+                    ;;
+                -o|--output)
+                    COMPREPLY=( $(compgen -W "text ndjson" -- "$cur") )
+                    return 0
+                    ;;
+                *)
+                    COMPREPLY=( $(compgen -W "-t --tags -p --parallel --max-parallel --connect-parallel --connect-rate --connect-rate-per --connect-retries --retry-backoff --engine -o --output --timings --timings-json --trace --metrics-file --dns-cache-ttl" -- "$cur") )
+                    return 0
+                    ;;
+            esac
+            ;;
+        push|pull)
+            case $prev in
+                -t|--tags)
+                    COMPREPLY=( $(compgen -W "$tags" -- "$cur") )
+                    return 0
+                    ;;
+                -p|--parallel)
+                    COMPREPLY=( $(compgen -W "auto" -- "$cur") )
+                    return 0
+                    ;;
+                --max-parallel)
                     return 0
                     ;;
                 *)
-                    COMPREPLY=( $(compgen -W "-t --tags -p --parallel" -- "$cur") )
+                    if [[ $cur == -* ]]; then
+                        COMPREPLY=( $(compgen -W "-t --tags -p --parallel --max-parallel --force" -- "$cur") )
+                    else
+                        _filedir
+                    fi
+                    return 0
+                    ;;
+            esac
+            ;;
+        transport-bench)
+            case $prev in
+                --profile)
+                    local profiles=""
+                    local transport_file="$(dirname "${config_file:-.}")/transport.yaml"
+                    if [[ -f $transport_file ]]; then
+                        profiles=$(grep -oE '^[^[:space:]#][^:]*' "$transport_file" | sort -u)
+                    fi
+                    COMPREPLY=( $(compgen -W "$profiles" -- "$cur") )
+                    return 0
+                    ;;
+                --payload)
+                    COMPREPLY=( $(compgen -W "random zeros" -- "$cur") )
+                    return 0
+                    ;;
+                --size|--repeat)
+                    return 0
+                    ;;
+                *)
+                    COMPREPLY=( $(compgen -W "$hosts --profile --size --repeat --payload" -- "$cur") )
                     return 0
                     ;;
             esac
@@ -163,6 +285,21 @@ _ssh_commander() {
                     ;;
             esac
             ;;
+        pool)
+            case $prev in
+                --socket)
+                    _filedir
+                    return 0
+                    ;;
+                --idle-ttl|--keepalive)
+                    return 0
+                    ;;
+                *)
+                    COMPREPLY=( $(compgen -W "start stop status --socket --idle-ttl --keepalive --foreground" -- "$cur") )
+                    return 0
+                    ;;
+            esac
+            ;;
         config-path|version)
             return 0
             ;;
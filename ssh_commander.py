@@ -7,10 +7,32 @@ __description__ = 'SSH Commander'
 __url__ = 'https://github.com/AthenaNetworks/ssh_commander'
 
 import argparse
+import asyncio
+import base64
+import binascii
+import codecs
+import cProfile
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import ipaddress
+import json
+import marshal
 import os
+import posixpath
+import pstats
+import random
+import re
+import secrets
+import select
+import selectors
+import shlex
 import shutil
 import socket
 import stat
+import struct
 import sys
 import tempfile
 import threading
@@ -18,14 +40,13 @@ import time
 import urllib.parse
 import urllib.request
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from getpass import getpass
-from io import StringIO
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import yaml
-from colorama import Fore, Style, init as colorama_init
+from colorama import Fore, Style, deinit as colorama_deinit, init as colorama_init
 from cryptography.utils import CryptographyDeprecationWarning
 
 # Filter out cryptography deprecation warnings from paramiko before paramiko loads.
@@ -35,6 +56,11 @@ warnings.filterwarnings(
     message='.*TripleDES.*',
 )
 
+# libyaml's loader and dumper are much faster on large inventories; fall back
+# to the pure-Python ones when PyYAML was built without libyaml.
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
 # Module-level toggles configured from CLI flags. They default to sensible values
 # so the library can also be imported and used programmatically.
 _QUIET = False
@@ -46,6 +72,9 @@ def _set_output_flags(quiet: bool = False, verbose: bool = False, no_color: bool
     global _QUIET, _VERBOSE
     _QUIET = bool(quiet)
     _VERBOSE = bool(verbose)
+    # Unwrap the streams first so a second call replaces the settings rather
+    # than stacking another wrapper on top.
+    colorama_deinit()
     # When --no-color is requested, disable ANSI escapes by stripping them.
     colorama_init(autoreset=True, strip=bool(no_color), convert=None)
 
@@ -127,18 +156,1877 @@ class SSHCommanderError(Exception):
     """Base error for ssh-commander; raised for user-facing failure conditions."""
 
 
+class CommandTimeout(SSHCommanderError):
+    """A remote command outlived ``command_timeout`` or the run's deadline.
+
+    Its channel has already been closed when this is raised.
+    """
+
+
+# SGR colour sequences as produced by colorama's Fore/Style constants.
+_ANSI_SGR = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def _strip_ansi(text: str) -> str:
+    return _ANSI_SGR.sub('', text)
+
+
+def _set_nodelay(sock: socket.socket) -> None:
+    """Disable Nagle on an SSH socket, as OpenSSH does.
+
+    The handshake is a series of small request/response packets; with Nagle
+    on, a packet queued behind an unacknowledged one waits for the peer's
+    delayed ACK (about 40ms on Linux) at several points during kex.
+    """
+    if sock.family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+
+# Splits a hostname around its last run of digits for range folding.
+_HOST_NUMBER_RE = re.compile(r'^(.*?)(\d+)(\D*)$')
+
+
+def _fold_hostnames(hostnames: Iterable[str]) -> str:
+    """Fold hostnames into a compact range list, e.g. ``web[001-003,007],db1``.
+
+    Hosts are grouped on everything around their last run of digits. If any
+    host in a group is zero padded, numbers only fold with numbers of the
+    same width, so ``web001``..``web480`` folds to ``web[001-480]``.
+    """
+    numbered: Dict[Tuple[str, str], List[str]] = {}
+    singles: List[str] = []
+    for host in hostnames:
+        match = _HOST_NUMBER_RE.match(host)
+        if not match:
+            singles.append(host)
+            continue
+        prefix, digits, suffix = match.groups()
+        numbered.setdefault((prefix, suffix), []).append(digits)
+
+    groups: Dict[Tuple[str, str, int], List[int]] = {}
+    for (prefix, suffix), members in numbered.items():
+        padded = any(len(digits) > 1 and digits.startswith('0') for digits in members)
+        for digits in members:
+            width = len(digits) if padded else 0
+            groups.setdefault((prefix, suffix, width), []).append(int(digits))
+
+    folded: List[str] = []
+    for (prefix, suffix, width), numbers in groups.items():
+        numbers = sorted(set(numbers))
+        if len(numbers) == 1:
+            folded.append(f"{prefix}{str(numbers[0]).zfill(width)}{suffix}")
+            continue
+        ranges = []
+        start = prev = numbers[0]
+        for number in numbers[1:] + [None]:
+            if number is not None and number == prev + 1:
+                prev = number
+                continue
+            if start == prev:
+                ranges.append(str(start).zfill(width))
+            else:
+                ranges.append(f"{str(start).zfill(width)}-{str(prev).zfill(width)}")
+            if number is not None:
+                start = prev = number
+        folded.append(f"{prefix}[{','.join(ranges)}]{suffix}")
+    return ','.join(sorted(folded) + sorted(set(singles)))
+
+
+def _format_size(nbytes: float) -> str:
+    """Render a byte count as B, KiB, MiB or GiB."""
+    for unit in ('B', 'KiB', 'MiB'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GiB"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _ChannelMultiplexer:
+    """Drain output from many paramiko channels with a single selector loop.
+
+    Paramiko channels expose ``fileno()``, a pipe that becomes readable when
+    stdout/stderr data, EOF or close arrives. One daemon thread waits on all of
+    them at once, so running a command no longer costs a polling thread and
+    completion is reported as soon as the exit status lands.
+    """
+
+    READ_SIZE = 32768
+    # Between remote EOF and the exit-status message the channel pipe stays
+    # permanently readable, so those channels are parked and re-checked on a
+    # short timer instead of spinning the selector.
+    DRAIN_INTERVAL = 0.01
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._entries: Dict[object, Tuple[int, Callable, threading.Event, Optional[Callable]]] = {}
+        self._to_add: List[object] = []
+        self._to_remove: List[Tuple[object, threading.Event]] = []
+        self._parked: List[object] = []
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def register(
+        self,
+        channel,
+        callback: Callable[[bytes, bool], None],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> threading.Event:
+        """Watch ``channel``; ``callback(data, is_stderr)`` receives its output.
+
+        Returns an event that is set once the channel has an exit status (or
+        was closed) and all buffered output has been delivered. ``on_done`` is
+        invoked from the multiplexer thread at the same moment.
+        """
+        done = threading.Event()
+        fd = channel.fileno()
+        with self._lock:
+            if self._closing:
+                raise SSHCommanderError("channel multiplexer is closed")
+            self._entries[channel] = (fd, callback, done, on_done)
+            self._to_add.append(channel)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name='ssh-commander-mux', daemon=True
+                )
+                self._thread.start()
+        self._wake()
+        return done
+
+    def discard(self, channel, timeout: float = 1.0) -> None:
+        """Stop watching ``channel``. Must be called before the channel closes."""
+        with self._lock:
+            if channel not in self._entries:
+                return
+            removed = threading.Event()
+            self._to_remove.append((channel, removed))
+        self._wake()
+        removed.wait(timeout)
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Stop the selector thread, wait for it and release the selector.
+
+        Channels still registered are finished as if they had closed. The
+        multiplexer cannot be used afterwards.
+        """
+        with self._lock:
+            self._closing = True
+            thread = self._thread
+        self._wake()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                return
+        for channel in list(self._entries):
+            self._finish(channel)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _finish(self, channel) -> None:
+        with self._lock:
+            entry = self._entries.pop(channel, None)
+        if entry is None:
+            return
+        fd, _, done, on_done = entry
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        if channel in self._parked:
+            self._parked.remove(channel)
+        done.set()
+        if on_done is not None:
+            try:
+                on_done()
+            except Exception:
+                pass
+
+    def _apply_changes(self) -> None:
+        with self._lock:
+            to_remove, self._to_remove = self._to_remove, []
+            to_add, self._to_add = self._to_add, []
+        for channel, removed in to_remove:
+            self._finish(channel)
+            removed.set()
+        for channel in to_add:
+            with self._lock:
+                entry = self._entries.get(channel)
+            if entry is None:
+                continue
+            fd = entry[0]
+            try:
+                stale = self._selector.get_map().get(fd)
+                if stale is not None:
+                    # The fd was recycled from a channel closed without discard().
+                    self._finish(stale.data)
+                self._selector.register(fd, selectors.EVENT_READ, channel)
+            except (KeyError, ValueError, OSError):
+                self._finish(channel)
+
+    def _drain(self, channel, callback) -> None:
+        while channel.recv_ready():
+            data = channel.recv(self.READ_SIZE)
+            if not data:
+                break
+            callback(data, False)
+        while channel.recv_stderr_ready():
+            data = channel.recv_stderr(self.READ_SIZE)
+            if not data:
+                break
+            callback(data, True)
+
+    def _service(self, channel) -> None:
+        with self._lock:
+            entry = self._entries.get(channel)
+        if entry is None:
+            return
+        fd, callback = entry[0], entry[1]
+        try:
+            # Check the exit status first: once it is ready every byte sent
+            # before it is already buffered, so a single drain is complete.
+            exited = channel.exit_status_ready()
+            self._drain(channel, callback)
+        except Exception:
+            # Best-effort streaming: if the channel dies mid-read we just stop.
+            self._finish(channel)
+            return
+        if exited:
+            self._finish(channel)
+        elif channel.eof_received and channel not in self._parked:
+            try:
+                self._selector.unregister(fd)
+            except (KeyError, ValueError):
+                pass
+            self._parked.append(channel)
+
+    def _loop(self) -> None:
+        while True:
+            self._apply_changes()
+            if self._closing:
+                return
+            timeout = self.DRAIN_INTERVAL if self._parked else None
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self._service(key.data)
+            for channel in list(self._parked):
+                self._service(channel)
+
+
+class _BatchOutputParser:
+    """Split the stdout of a batched command script back into per-command results.
+
+    The generated script brackets every command with ``\\x1e``-delimited
+    markers (``<nonce>:B:<index>`` before, ``<nonce>:X:<index>:<status>``
+    after). Markers are stripped from the stream and reported through the
+    ``on_begin`` / ``on_exit`` callbacks; everything else goes to ``on_text``.
+    """
+
+    MARK = '\x1e'
+    # A lone separator with no closing mark this far on is ordinary output.
+    MAX_MARKER_LEN = 128
+
+    def __init__(
+        self,
+        nonce: str,
+        on_text: Callable[[str], None],
+        on_begin: Callable[[int], None],
+        on_exit: Callable[[int, int], None],
+    ) -> None:
+        self._prefix = nonce + ':'
+        self._on_text = on_text
+        self._on_begin = on_begin
+        self._on_exit = on_exit
+        self._pending = ''
+
+    def _emit(self, text: str) -> None:
+        if text:
+            self._on_text(text)
+
+    def _dispatch(self, body: str) -> bool:
+        if not body.startswith(self._prefix):
+            return False
+        fields = body[len(self._prefix):].split(':')
+        try:
+            if fields[0] == 'B' and len(fields) == 2:
+                self._on_begin(int(fields[1]))
+                return True
+            if fields[0] == 'X' and len(fields) == 3:
+                self._on_exit(int(fields[1]), int(fields[2]))
+                return True
+        except ValueError:
+            pass
+        return False
+
+    def feed(self, text: str) -> None:
+        data = self._pending + text
+        self._pending = ''
+        while data:
+            start = data.find(self.MARK)
+            if start < 0:
+                self._emit(data)
+                return
+            self._emit(data[:start])
+            end = data.find(self.MARK, start + 1)
+            if end < 0:
+                if len(data) - start > self.MAX_MARKER_LEN:
+                    self._emit(data[start:])
+                else:
+                    self._pending = data[start:]
+                return
+            if self._dispatch(data[start + 1:end]):
+                data = data[end + 1:]
+            else:
+                # Not one of ours: keep the text and rescan from the next mark.
+                self._emit(data[start:end])
+                data = data[end:]
+
+    def flush(self) -> None:
+        pending, self._pending = self._pending, ''
+        self._emit(pending)
+
+
+class _OutputSink:
+    """Base for per-host output sinks.
+
+    Sinks receive decoded output through ``write(text, is_stderr)``. When a
+    host runs several commands, :meth:`begin` and :meth:`exited` mark each
+    one and :meth:`note` reports a controller-side problem; by default these
+    are written into the output as coloured marker lines.
+    """
+
+    def write(self, text: str, is_stderr: bool = False) -> None:
+        raise NotImplementedError
+
+    def begin(self, command: str) -> None:
+        self.write(f"{Fore.YELLOW}>>> {command}{Style.RESET_ALL}\n")
+
+    def exited(self, status: int) -> None:
+        if status != 0:
+            self.write(f"{Fore.RED}Command exited with status {status}{Style.RESET_ALL}\n")
+
+    def note(self, message: str) -> None:
+        self.write(f"{Fore.RED}{message}{Style.RESET_ALL}\n")
+
+    # Set once a command on this host was cut off by a timeout.
+    timed_out = False
+
+
+class _LiveOutput(_OutputSink):
+    """Write a host's output straight to the terminal (serial execution)."""
+
+    def __init__(self, commander: 'SSHCommander') -> None:
+        self._commander = commander
+
+    def write(self, text: str, is_stderr: bool = False) -> None:
+        self._commander._write_output(text, is_stderr)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        return ""
+
+    def copy_to(self, stream) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _BufferedOutput(_OutputSink):
+    """Collect a host's output until its result block is printed.
+
+    Output is kept in memory up to ``threshold`` bytes and then spills to an
+    anonymous temporary file, so hosts returning tens of MB don't grow the
+    controller's memory. :meth:`copy_to` streams it back in large chunks.
+    """
+
+    COPY_CHUNK = 1024 * 1024
+
+    def __init__(self, threshold: int, hashed: bool = False) -> None:
+        self._file = tempfile.SpooledTemporaryFile(max_size=threshold, mode='w+b')
+        self._size = 0
+        self._ends_with_newline = True
+        self._hash = hashlib.sha256() if hashed else None
+
+    def write(self, text: str, is_stderr: bool = False) -> None:
+        if not text:
+            return
+        data = text.encode('utf-8', errors='replace')
+        self._file.write(data)
+        self._size += len(data)
+        self._ends_with_newline = text.endswith('\n')
+        if self._hash is not None:
+            self._hash.update(data)
+
+    def digest(self) -> str:
+        """Hex digest of everything written so far (requires ``hashed=True``)."""
+        return self._hash.hexdigest()
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        self._file.seek(0)
+        try:
+            return self._file.read().decode('utf-8', errors='replace')
+        finally:
+            self._file.seek(0, os.SEEK_END)
+
+    def copy_to(self, stream) -> None:
+        """Write the captured output to ``stream``, ending with a newline."""
+        if not self._size:
+            return
+        self._file.seek(0)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = self._file.read(self.COPY_CHUNK)
+            if not chunk:
+                break
+            stream.write(decoder.decode(chunk))
+        stream.write(decoder.decode(b'', final=True))
+        if not self._ends_with_newline:
+            stream.write('\n')
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _HostLineWriter(_OutputSink):
+    """Write a host's output as complete, hostname-prefixed lines (pdsh-style).
+
+    Partial lines are held per stream until their newline arrives, so output
+    from concurrent hosts never interleaves mid-line and memory per host is
+    bounded by ``MAX_PARTIAL`` rather than by total output.
+    """
+
+    MAX_PARTIAL = 65536
+
+    def __init__(self, hostname: str, lock: threading.Lock) -> None:
+        self._prefix = f"{Fore.LIGHTBLUE_EX}{hostname}:{Style.RESET_ALL} "
+        self._lock = lock
+        self._partial = {False: '', True: ''}
+
+    def write(self, text: str, is_stderr: bool = False) -> None:
+        data = self._partial[is_stderr] + text
+        lines = data.split('\n')
+        partial = lines.pop()
+        if len(partial) > self.MAX_PARTIAL:
+            lines.append(partial)
+            partial = ''
+        self._partial[is_stderr] = partial
+        if lines:
+            self._emit(lines, is_stderr)
+
+    def flush(self) -> None:
+        for is_stderr in (False, True):
+            partial, self._partial[is_stderr] = self._partial[is_stderr], ''
+            if partial:
+                self._emit([partial], is_stderr)
+
+    def getvalue(self) -> str:
+        # Everything has already been written to the terminal.
+        return ""
+
+    def copy_to(self, stream) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def _emit(self, lines: List[str], is_stderr: bool) -> None:
+        if is_stderr:
+            text = ''.join(
+                f"{self._prefix}{Fore.RED}{line.rstrip(chr(13))}{Style.RESET_ALL}\n" for line in lines
+            )
+        else:
+            text = ''.join(f"{self._prefix}{line.rstrip(chr(13))}\n" for line in lines)
+        stream = sys.stderr if is_stderr else sys.stdout
+        with self._lock:
+            stream.write(text)
+            stream.flush()
+
+
+class _RecordOutput(_OutputSink):
+    """Collect a host's stdout and stderr separately for one NDJSON record.
+
+    Each stream is spooled like :class:`_BufferedOutput`. With several
+    commands (``exec -f``) every :meth:`begin` starts a new entry in
+    :attr:`commands` with its own streams and exit status; output outside
+    any command stays on the host-level streams. ``timer`` is the host's
+    phase timer, if timings are being recorded.
+    """
+
+    def __init__(self, threshold: int, timer: Optional['_PhaseTimer'] = None) -> None:
+        self._threshold = threshold
+        self.timer = timer
+        self.commands: List[Dict] = []
+        self.notes: List[str] = []
+        self._host = {False: _BufferedOutput(threshold), True: _BufferedOutput(threshold)}
+        self._streams = self._host
+
+    def write(self, text: str, is_stderr: bool = False) -> None:
+        self._streams[is_stderr].write(text)
+
+    def begin(self, command: str) -> None:
+        self._streams = {False: _BufferedOutput(self._threshold), True: _BufferedOutput(self._threshold)}
+        self.commands.append({'command': command, 'status': None, 'streams': self._streams})
+
+    def exited(self, status: int) -> None:
+        if self.commands:
+            self.commands[-1]['status'] = status
+        self._streams = self._host
+
+    def note(self, message: str) -> None:
+        self.notes.append(message)
+
+    def flush(self) -> None:
+        pass
+
+    def record(self) -> Dict:
+        """Return the captured output as ``stdout``/``stderr`` (and ``commands``)."""
+        record = {'stdout': self._host[False].getvalue(), 'stderr': self._host[True].getvalue()}
+        if self.commands:
+            record['commands'] = [
+                {
+                    'command': entry['command'],
+                    'status': entry['status'],
+                    'stdout': entry['streams'][False].getvalue(),
+                    'stderr': entry['streams'][True].getvalue(),
+                }
+                for entry in self.commands
+            ]
+        return record
+
+    def close(self) -> None:
+        for streams in [self._host] + [entry['streams'] for entry in self.commands]:
+            for buffer in streams.values():
+                buffer.close()
+
+
+class Rollout:
+    """Rolling execution policy: run hosts in batches with a failure budget.
+
+    Hosts are split into batches of ``batch_size`` hosts (or ``batch_percent``
+    of the targets, rounded up), optionally preceded by a ``canary`` batch of
+    that many hosts. Batches run one after another with ``pause`` seconds in
+    between. Once ``max_failures`` hosts have failed no new host is started;
+    hosts already running are allowed to finish.
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        batch_percent: Optional[float] = None,
+        canary: int = 0,
+        pause: float = 0.0,
+        max_failures: Optional[int] = None,
+    ) -> None:
+        if batch_size is not None and batch_size < 1:
+            raise SSHCommanderError("Batch size must be >= 1")
+        if batch_percent is not None and not 0 < batch_percent <= 100:
+            raise SSHCommanderError("Batch percent must be in (0, 100]")
+        if canary < 0:
+            raise SSHCommanderError("Canary size must be >= 0")
+        if pause < 0:
+            raise SSHCommanderError("Pause must be >= 0")
+        if max_failures is not None and max_failures < 1:
+            raise SSHCommanderError("Max failures must be >= 1")
+        self.batch_size = batch_size
+        self.batch_percent = batch_percent
+        self.canary = canary
+        self.pause = pause
+        self.max_failures = max_failures
+
+    def batches(self, servers: List[Dict]) -> List[List[Dict]]:
+        """Split ``servers`` into the batches to run, in order."""
+        remaining = list(servers)
+        batches = []
+        if self.canary:
+            batches.append(remaining[:self.canary])
+            remaining = remaining[self.canary:]
+        if self.batch_size:
+            size = self.batch_size
+        elif self.batch_percent:
+            size = -(-len(servers) * self.batch_percent // 100)
+        else:
+            size = len(remaining)
+        size = max(1, int(size))
+        batches.extend(remaining[i:i + size] for i in range(0, len(remaining), size))
+        return [batch for batch in batches if batch]
+
+    def exhausted(self, failures: int) -> bool:
+        """True once ``failures`` has used up the failure budget."""
+        return self.max_failures is not None and failures >= self.max_failures
+
+
+class _AdaptiveConcurrency:
+    """AIMD limit on in-flight hosts for ``--parallel auto``.
+
+    The limit starts small and grows by one per healthy connect (doubling
+    every round trip) until the first sign of congestion, then by roughly one
+    per round trip. A connect timeout, reset or dropped banner, or a connect
+    that takes ``CONGESTED_RATIO`` times the fastest one seen so far, halves
+    the limit. Outcomes of hosts started before the last back-off are ignored
+    for further back-offs so one burst of drops only counts once.
+    """
+
+    INITIAL = 4
+    BACKOFF = 0.5
+    # How often the scheduler re-reads the limit while every slot is busy.
+    POLL_INTERVAL = 0.05
+    # Connect latency relative to the fastest seen: hold above the first
+    # ratio, back off above the second. Differences under LATENCY_SLACK
+    # seconds are treated as noise.
+    SLOW_RATIO = 2.0
+    CONGESTED_RATIO = 4.0
+    LATENCY_SLACK = 0.25
+
+    def __init__(self, ceiling: int) -> None:
+        self.ceiling = max(1, ceiling)
+        self._limit = float(min(self.INITIAL, self.ceiling))
+        self.peak = int(self._limit)
+        self.backoffs = 0
+        self._baseline: Optional[float] = None
+        self._slow_start = True
+        self._epoch = 0
+        self._started: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def begin(self, server: Dict) -> None:
+        """Note that ``server`` is being started under the current limit."""
+        with self._lock:
+            self._started[id(server)] = self._epoch
+
+    def observe(self, server: Dict, latency: float, exc: Optional[BaseException]) -> None:
+        """Feed one connect outcome into the limit."""
+        with self._lock:
+            epoch = self._started.pop(id(server), self._epoch)
+            ratio = 1.0
+            if self._baseline and latency - self._baseline >= self.LATENCY_SLACK:
+                ratio = latency / self._baseline
+            if self._is_congestion(exc) or ratio >= self.CONGESTED_RATIO:
+                if epoch == self._epoch:
+                    self._limit = max(1.0, self._limit * self.BACKOFF)
+                    self._epoch += 1
+                    self._slow_start = False
+                    self.backoffs += 1
+                return
+            if exc is not None:
+                # Auth failures, refused ports and the like say nothing
+                # about load.
+                return
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            if ratio >= self.SLOW_RATIO:
+                return
+            step = 1.0 if self._slow_start else 1.0 / self._limit
+            self._limit = min(float(self.ceiling), self._limit + step)
+            self.peak = max(self.peak, self.limit)
+
+    @staticmethod
+    def _is_congestion(exc: Optional[BaseException]) -> bool:
+        if exc is None:
+            return False
+        if isinstance(exc, (socket.timeout, TimeoutError, asyncio.TimeoutError,
+                            ConnectionResetError, ConnectionAbortedError,
+                            BrokenPipeError, EOFError)):
+            return True
+        # sshd's MaxStartups drops connections before the banner is sent.
+        return 'banner' in str(exc).lower()
+
+
+def _connect_error_class(exc: BaseException) -> str:
+    """Bucket a connect exception into a small, stable set of labels."""
+    paramiko = get_paramiko()
+    if isinstance(exc, socket.gaierror):
+        return 'dns'
+    if isinstance(exc, (socket.timeout, TimeoutError, asyncio.TimeoutError)):
+        return 'timeout'
+    if isinstance(exc, ConnectionRefusedError):
+        return 'refused'
+    if isinstance(exc, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, EOFError)):
+        return 'reset'
+    if isinstance(exc, paramiko.BadHostKeyException):
+        return 'host_key'
+    if isinstance(exc, paramiko.AuthenticationException):
+        # paramiko reports a server that never answered as "Authentication timeout."
+        return 'timeout' if 'timeout' in str(exc).lower() else 'auth'
+    if isinstance(exc, SSHCommanderError):
+        return 'config'
+    message = str(exc).lower()
+    if 'banner' in message:
+        return 'banner'
+    if isinstance(exc, paramiko.SSHException):
+        # The peer dropped the handshake part-way; anything else (no common
+        # algorithms, protocol errors) will fail the same way next time.
+        if any(word in message for word in ('eof', 'reset', 'session not active')):
+            return 'reset'
+        return 'ssh'
+    if isinstance(exc, OSError):
+        return 'network'
+    return 'other'
+
+
+class RetryPolicy:
+    """Retry failed connects with exponential backoff and jitter.
+
+    A connect (TCP, key exchange or authentication) that fails with a
+    transient error is retried up to ``retries`` times. The n-th retry waits
+    a random time between half and all of ``backoff * 2**n`` seconds, capped
+    at ``max_backoff``. Unresolvable names, host key mismatches, rejected
+    credentials, unusable key files, failed algorithm negotiation and config
+    errors fail at once; commands are never retried.
+    """
+
+    RETRYABLE = frozenset({'timeout', 'refused', 'reset', 'banner', 'network'})
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, retries: int = 0, backoff: float = 1.0, max_backoff: float = MAX_BACKOFF) -> None:
+        if retries < 0:
+            raise SSHCommanderError("Connect retries must be >= 0")
+        if backoff < 0:
+            raise SSHCommanderError("Retry backoff must be >= 0")
+        if max_backoff < backoff:
+            raise SSHCommanderError("Maximum retry backoff must be >= the backoff")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, exc: Optional[BaseException], attempt: int) -> bool:
+        """True if a connect that failed with ``exc`` on ``attempt`` (0-based) is retried."""
+        return (
+            exc is not None
+            and attempt < self.retries
+            and _connect_error_class(exc) in self.RETRYABLE
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after ``attempt`` (0-based) failed."""
+        ceiling = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+class _TokenBucket:
+    """Thread-safe token bucket that hands out waits instead of blocking.
+
+    :meth:`reserve` takes a token, borrowing against future refills when
+    the bucket is empty, and returns how long the caller must wait before
+    using it, so threads can ``time.sleep`` and coroutines ``asyncio.sleep``.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class ConnectRateLimiter:
+    """Pace new connections with token buckets.
+
+    ``rate`` (connections per second) applies to the whole fleet. ``per``
+    adds buckets for groups of hosts, e.g. the hosts behind one bastion:
+    keys are ``tag:NAME`` (servers carrying tag NAME) or ``subnet:CIDR``
+    (servers whose resolved address is in CIDR). A connect waits for a
+    token from the fleet bucket and from every group it belongs to. Buckets
+    hold one token, so connects are spaced out rather than let through in
+    bursts.
+    """
+
+    def __init__(self, rate: Optional[float] = None, per: Optional[Dict[str, float]] = None) -> None:
+        self._fleet = _TokenBucket(rate) if rate else None
+        self._tags: Dict[str, _TokenBucket] = {}
+        self._subnets: List[Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], _TokenBucket]] = []
+        for key, group_rate in (per or {}).items():
+            kind, _, value = key.partition(':')
+            if kind == 'tag' and value:
+                self._tags[value] = _TokenBucket(group_rate)
+            elif kind == 'subnet' and value:
+                try:
+                    network = ipaddress.ip_network(value, strict=False)
+                except ValueError as exc:
+                    raise SSHCommanderError(f"Invalid subnet '{value}': {exc}") from exc
+                self._subnets.append((network, _TokenBucket(group_rate)))
+            else:
+                raise SSHCommanderError(
+                    f"Invalid rate group '{key}' (expected tag:NAME or subnet:CIDR)"
+                )
+
+    @property
+    def by_address(self) -> bool:
+        """True if some bucket needs a server's resolved addresses."""
+        return bool(self._subnets)
+
+    @staticmethod
+    def parse_rate(text: str) -> float:
+        """Parse ``N``, ``N/s`` or ``N/m`` into connections per second."""
+        value, _, unit = text.strip().partition('/')
+        divisor = {'': 1.0, 's': 1.0, 'sec': 1.0, 'm': 60.0, 'min': 60.0}.get(unit.strip().lower())
+        try:
+            rate = float(value) / divisor if divisor else 0.0
+        except ValueError:
+            rate = 0.0
+        if rate <= 0:
+            raise SSHCommanderError(f"Invalid connect rate '{text}' (expected e.g. 50/s or 300/m)")
+        return rate
+
+    @classmethod
+    def from_specs(cls, rate: Optional[str], per: Iterable[str] = ()) -> 'ConnectRateLimiter':
+        """Build a limiter from ``--connect-rate`` and ``--connect-rate-per KEY=RATE`` values."""
+        groups: Dict[str, float] = {}
+        for spec in per:
+            key, sep, value = spec.rpartition('=')
+            if not sep or not key:
+                raise SSHCommanderError(f"Invalid rate group '{spec}' (expected KEY=RATE)")
+            groups[key.strip()] = cls.parse_rate(value)
+        return cls(cls.parse_rate(rate) if rate else None, groups)
+
+    def reserve(self, server: Dict, addresses: Iterable[str] = ()) -> float:
+        """Take a token for ``server`` from each bucket it uses; return the wait."""
+        wait = self._fleet.reserve() if self._fleet is not None else 0.0
+        for tag in server.get('tags', ['default']):
+            bucket = self._tags.get(str(tag))
+            if bucket is not None:
+                wait = max(wait, bucket.reserve())
+        if self._subnets:
+            ips = []
+            for address in addresses:
+                try:
+                    ips.append(ipaddress.ip_address(address.split('%', 1)[0]))
+                except ValueError:
+                    continue
+            for network, bucket in self._subnets:
+                if any(ip in network for ip in ips):
+                    wait = max(wait, bucket.reserve())
+        return wait
+
+
+class _HostResolver:
+    """Thread-safe ``getaddrinfo`` cache shared by every connect in a process.
+
+    Successful lookups are kept for ``ttl`` seconds and failures for
+    ``NEGATIVE_TTL``. With ``cache_file`` successful lookups are also loaded
+    from and saved to a JSON file, so later runs skip DNS entirely.
+    """
+
+    WORKERS = 32
+    NEGATIVE_TTL = 30.0
+
+    def __init__(self, cache_file: Optional[str] = None, ttl: float = 300.0) -> None:
+        self.cache_file = cache_file
+        self.ttl = ttl
+        # (host, port) -> (expires, addrinfo list or gaierror args)
+        self._entries: Dict[Tuple[str, int], Tuple[float, object]] = {}
+        # (host, port) -> (monotonic start, seconds) of timed prefetch lookups
+        self._prefetched: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if cache_file:
+            self._load()
+
+    def cached(self, host: str, port: int) -> Optional[list]:
+        """Return cached addresses, raise a cached failure, or return None."""
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry is None or entry[0] < time.time():
+            return None
+        if isinstance(entry[1], tuple):
+            raise socket.gaierror(*entry[1])
+        return entry[1]
+
+    def store(self, host: str, port: int, result) -> None:
+        """Cache ``result``: an addrinfo list or the ``gaierror`` it raised."""
+        with self._lock:
+            if isinstance(result, BaseException):
+                self._entries[(host, port)] = (time.time() + self.NEGATIVE_TTL, tuple(result.args))
+            else:
+                self._entries[(host, port)] = (time.time() + self.ttl, list(result))
+                self._dirty = True
+
+    def prefetch_time(self, host: str, port: int) -> Optional[Tuple[float, float]]:
+        """Return and forget (start, seconds) of the timed prefetch lookup of a target."""
+        with self._lock:
+            return self._prefetched.pop((host, port), None)
+
+    def lookup(self, host: str, port: int) -> list:
+        infos = self.cached(host, port)
+        if infos is not None:
+            return infos
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as exc:
+            self.store(host, port, exc)
+            raise
+        self.store(host, port, infos)
+        return infos
+
+    def prefetch(
+        self, targets: Iterable[Tuple[str, int]], timeout: float, timed: bool = False
+    ) -> Dict[Tuple[str, int], socket.gaierror]:
+        """Resolve ``targets`` concurrently, waiting at most ``timeout`` seconds.
+
+        Lookups still running at the deadline are cached as failures (a late
+        success replaces that). With ``timed`` each lookup's duration is kept
+        for :meth:`prefetch_time`. Returns the targets that failed to resolve.
+        """
+        pending = []
+        failures = {}
+        for target in dict.fromkeys(targets):
+            try:
+                if self.cached(*target) is None:
+                    pending.append(target)
+            except socket.gaierror as exc:
+                failures[target] = exc
+        if not pending:
+            return failures
+        queue = iter(pending)
+        lock = threading.Lock()
+        remaining = [len(pending)]
+        finished = threading.Event()
+
+        def _work() -> None:
+            while True:
+                with lock:
+                    target = next(queue, None)
+                if target is None:
+                    return
+                begin = time.monotonic()
+                try:
+                    self.lookup(*target)
+                except (OSError, UnicodeError):
+                    pass
+                if timed:
+                    with self._lock:
+                        self._prefetched[target] = (begin, time.monotonic() - begin)
+                with lock:
+                    remaining[0] -= 1
+                    if not remaining[0]:
+                        finished.set()
+
+        # Daemon threads: a wedged resolver must not hold up interpreter exit.
+        for _ in range(min(self.WORKERS, len(pending))):
+            threading.Thread(target=_work, name='ssh-commander-resolve', daemon=True).start()
+        finished.wait(timeout)
+        for target in pending:
+            try:
+                if self.cached(*target) is None:
+                    exc = socket.gaierror(
+                        socket.EAI_AGAIN, f"Name resolution timed out after {timeout:g}s"
+                    )
+                    self.store(*target, exc)
+                    failures[target] = exc
+            except socket.gaierror as exc:
+                failures[target] = exc
+        return failures
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in data.items() if isinstance(data, dict) else ():
+            host, _, port = key.rpartition(':')
+            try:
+                expires = float(entry['expires'])
+                infos = [
+                    (family, socktype, proto, canon, tuple(addr))
+                    for family, socktype, proto, canon, addr in entry['addrs']
+                ]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if expires > now and port.isdigit():
+                self._entries[(host, int(port))] = (expires, infos)
+
+    def save(self) -> None:
+        """Write unexpired successful lookups back to ``cache_file``."""
+        if not self.cache_file or not self._dirty:
+            return
+        now = time.time()
+        with self._lock:
+            data = {
+                f"{host}:{port}": {
+                    'expires': expires,
+                    'addrs': [[int(f), int(t), p, c, list(a)] for f, t, p, c, a in result],
+                }
+                for (host, port), (expires, result) in self._entries.items()
+                if isinstance(result, list) and expires > now
+            }
+            self._dirty = False
+        directory = os.path.dirname(self.cache_file)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix='.dns.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as exc:
+            _verbose(f"Could not save DNS cache {self.cache_file}: {exc}")
+
+
+class _KnownHosts:
+    """Parse-once, shared view of ``~/.ssh/known_hosts``.
+
+    The file is read on first use (and again only if it changes on disk) and
+    indexed by host name. Hashed ``|1|`` entries can only be matched by HMAC,
+    so they are scanned per name and the result is cached. Each new client is
+    primed with just its own host's keys instead of re-parsing the file.
+
+    The object also acts as paramiko's missing host key policy for
+    auto-add mode: accepted keys are queued and :meth:`save` appends them to
+    the file in one write.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.path.expanduser('~/.ssh/known_hosts')
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[float, int]] = None
+        self._plain: Dict[str, List[str]] = {}
+        self._hashed: List[Tuple[bytes, bytes, str]] = []
+        self._matches: Dict[str, List[str]] = {}
+        self._pending: Dict[Tuple[str, str], str] = {}
+
+    def _refresh(self) -> None:
+        """(Re)load the file if it changed since the last load. Lock held."""
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime, st.st_size)
+        except OSError:
+            signature = (0.0, 0)
+        if signature == self._signature:
+            return
+        plain: Dict[str, List[str]] = {}
+        hashed: List[Tuple[bytes, bytes, str]] = []
+        try:
+            with open(self.path, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    # Markers (@cert-authority, @revoked) are not supported by
+                    # paramiko either.
+                    if not line or line[0] in '#@':
+                        continue
+                    for name in line.split(None, 1)[0].split(','):
+                        if name.startswith('|1|'):
+                            try:
+                                _, _, salt, digest = name.split('|')
+                                hashed.append(
+                                    (base64.b64decode(salt), base64.b64decode(digest), line)
+                                )
+                            except (ValueError, binascii.Error):
+                                continue
+                        else:
+                            plain.setdefault(name, []).append(line)
+        except OSError:
+            pass
+        self._plain, self._hashed, self._signature = plain, hashed, signature
+        self._matches = {}
+
+    def lines_for(self, name: str) -> List[str]:
+        """Return the known_hosts lines for ``name`` (``host`` or ``[host]:port``)."""
+        with self._lock:
+            self._refresh()
+            lines = self._matches.get(name)
+            if lines is not None:
+                return lines + [l for (n, _), l in self._pending.items() if n == name]
+            lines = list(self._plain.get(name, ()))
+            hashed = self._hashed
+        encoded = name.encode()
+        lines.extend(
+            line for salt, digest, line in hashed
+            if hmac.new(salt, encoded, hashlib.sha1).digest() == digest
+        )
+        with self._lock:
+            self._matches[name] = lines
+            return lines + [l for (n, _), l in self._pending.items() if n == name]
+
+    def prime(self, client, hostname: str, port: int) -> None:
+        """Add the known keys for ``hostname:port`` to ``client``'s host keys."""
+        HostKeyEntry = get_paramiko().hostkeys.HostKeyEntry
+        name = hostname if port == 22 else f"[{hostname}]:{port}"
+        host_keys = client.get_host_keys()
+        for line in self.lines_for(name):
+            try:
+                entry = HostKeyEntry.from_line(line)
+            except Exception:
+                continue
+            if entry is not None and entry.key is not None:
+                host_keys.add(name, entry.key.get_name(), entry.key)
+
+    def missing_host_key(self, client, hostname: str, key) -> None:
+        """paramiko policy hook: accept ``key`` and queue it for :meth:`save`."""
+        client.get_host_keys().add(hostname, key.get_name(), key)
+        with self._lock:
+            self._pending[(hostname, key.get_name())] = (
+                f"{hostname} {key.get_name()} {key.get_base64()}"
+            )
+
+    def save(self) -> None:
+        """Append keys accepted since the last save to the known_hosts file."""
+        with self._lock:
+            if not self._pending:
+                return
+            lines = list(self._pending.values())
+            directory = os.path.dirname(self.path)
+            try:
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory, mode=0o700, exist_ok=True)
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                with os.fdopen(fd, 'a') as f:
+                    f.write(''.join(line + '\n' for line in lines))
+            except OSError as exc:
+                _verbose(f"Could not update {self.path}: {exc}")
+                return
+            # Fold the new lines into the index instead of re-reading the file.
+            for (name, _), line in self._pending.items():
+                self._plain.setdefault(name, []).append(line)
+                if name in self._matches:
+                    self._matches[name].append(line)
+            self._pending.clear()
+            try:
+                st = os.stat(self.path)
+                self._signature = (st.st_mtime, st.st_size)
+            except OSError:
+                pass
+
+
+class _KeyCache:
+    """Process-wide cache of loaded private keys, keyed by path and mtime.
+
+    Most of an inventory shares a handful of keys, so each file is read,
+    parsed and (if encrypted) unlocked once per run instead of once per
+    connection. A key is reloaded only when its file changes on disk.
+    Passphrases come from ``$SSH_COMMANDER_KEY_PASSPHRASE`` or, on a
+    terminal, a single prompt per key.
+    """
+
+    PASSPHRASE_ENV = 'SSH_COMMANDER_KEY_PASSPHRASE'
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._prompt_lock = threading.Lock()
+        self._keys: Dict[str, Tuple[float, object]] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def load(self, path: str):
+        """Return the ``PKey`` for ``path``, loading it on first use."""
+        path = os.path.realpath(os.path.expanduser(path))
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            raise FileNotFoundError(f"SSH key file not found: {path}") from None
+        with self._lock:
+            entry = self._keys.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+            loading = self._loading.setdefault(path, threading.Lock())
+        # Hosts sharing a key wait here for the first one to parse it rather
+        # than all running the KDF at once.
+        with loading:
+            with self._lock:
+                entry = self._keys.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+            key = self._parse(path)
+            with self._lock:
+                self._keys[path] = (mtime, key)
+            return key
+
+    def _parse(self, path: str):
+        paramiko = get_paramiko()
+        try:
+            return paramiko.PKey.from_path(path)
+        except (paramiko.PasswordRequiredException, TypeError):
+            # from_path lets cryptography's "password was not given" TypeError
+            # through rather than PasswordRequiredException.
+            passphrase = os.environ.get(self.PASSPHRASE_ENV)
+            if passphrase is None:
+                if not sys.stdin.isatty():
+                    raise SSHCommanderError(
+                        f"SSH key {path} is encrypted; set {self.PASSPHRASE_ENV} "
+                        f"or load it into ssh-agent and use --agent"
+                    ) from None
+                with self._prompt_lock:
+                    passphrase = getpass(f"Enter passphrase for key '{path}': ")
+            return paramiko.PKey.from_path(path, passphrase.encode())
+
+
+class _TransportProfiles:
+    """Per-tag and per-server SSH transport tuning.
+
+    Tag profiles live in ``transport.yaml`` next to the server config, as a
+    mapping of tag name to settings. A server's effective settings are the
+    profiles of its tags applied in tag order, then its own ``transport:``
+    mapping on top.
+    """
+
+    # Algorithm preference lists, mapped to paramiko SecurityOptions names.
+    ALGORITHMS = {'ciphers': 'ciphers', 'kex': 'kex', 'macs': 'digests'}
+    SIZES = ('window_size', 'max_packet_size')
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._profiles: Optional[Dict[str, Dict]] = None
+
+    @classmethod
+    def check(cls, settings, where: str) -> Dict:
+        """Validate a transport settings mapping; raise ValueError if invalid."""
+        if not isinstance(settings, dict):
+            raise ValueError(f"{where}: 'transport' must be a mapping")
+        for key, value in settings.items():
+            if key in cls.ALGORITHMS:
+                if not (isinstance(value, list) and value
+                        and all(isinstance(v, str) for v in value)):
+                    raise ValueError(f"{where}: '{key}' must be a non-empty list of names")
+            elif key == 'compression':
+                if not isinstance(value, bool):
+                    raise ValueError(f"{where}: 'compression' must be true or false")
+            elif key in cls.SIZES:
+                if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                    raise ValueError(f"{where}: '{key}' must be a positive integer")
+            elif key == 'keepalive':
+                if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                    raise ValueError(f"{where}: 'keepalive' must be seconds (0 disables)")
+            else:
+                raise ValueError(f"{where}: unknown transport setting '{key}'")
+        return settings
+
+    @property
+    def profiles(self) -> Dict[str, Dict]:
+        """Tag profiles from ``transport.yaml`` (loaded on first use)."""
+        return self.load()
+
+    def load(self) -> Dict[str, Dict]:
+        """Load and validate ``transport.yaml`` if not done yet; return the profiles.
+
+        Raises :class:`SSHCommanderError` if the file is unreadable or invalid.
+        """
+        with self._lock:
+            if self._profiles is None:
+                self._profiles = self._load()
+            return self._profiles
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as exc:
+            raise SSHCommanderError(f"Could not read {self.path}: {exc}") from exc
+        if data is None:
+            return {}
+        if not isinstance(data, dict):
+            raise SSHCommanderError(
+                f"Invalid {self.path}: expected a mapping of tag to transport settings"
+            )
+        try:
+            return {
+                str(tag): self.check(settings, f"profile '{tag}'")
+                for tag, settings in data.items()
+            }
+        except ValueError as exc:
+            raise SSHCommanderError(f"Invalid {self.path}: {exc}") from None
+
+    def settings_for(self, server: Dict) -> Dict:
+        """Return the merged transport settings for ``server``."""
+        merged: Dict = {}
+        profiles = self.profiles
+        for tag in server.get('tags') or ():
+            merged.update(profiles.get(str(tag), {}))
+        if 'transport' in server:
+            merged.update(self.check(server['transport'], server['hostname']))
+        return merged
+
+
+class _TagExpression:
+    """Boolean tag filter such as ``prod & web & !canary``.
+
+    ``&`` is AND, ``|`` or ``,`` is OR, ``!`` is NOT and parentheses group;
+    ``!`` binds tightest, then ``&``, then ``|``/``,``, so a plain comma list
+    keeps its old meaning (any of the tags); as before, empty comma list items
+    are ignored and an expression of nothing but commas matches every server.
+    Expressions are evaluated as
+    set operations over an inverted tag index rather than a scan of every
+    server.
+    """
+
+    OPERATORS = frozenset('&|,!()')
+    _TOKEN = re.compile(r'\s*([&|,!()]|[^\s&|,!()]+)')
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._tokens = self._drop_empty_items(self._TOKEN.findall(text))
+        self._pos = 0
+        self.tree: Optional[tuple] = None
+        if self._tokens:
+            self.tree = self._parse_or()
+        if self._pos < len(self._tokens):
+            self._fail(f"unexpected '{self._tokens[self._pos]}'")
+
+    @staticmethod
+    def _drop_empty_items(tokens: List[str]) -> List[str]:
+        """Remove commas that separate nothing (``web,,db``, ``web,``, ``,,``)."""
+        kept: List[str] = []
+        for token in tokens:
+            if token == ',' and (not kept or kept[-1] in (',', '(')):
+                continue
+            if token == ')' and kept and kept[-1] == ',':
+                kept.pop()
+            kept.append(token)
+        while kept and kept[-1] == ',':
+            kept.pop()
+        return kept
+
+    def _fail(self, reason: str) -> None:
+        raise SSHCommanderError(f"Invalid tag expression '{self.text}': {reason}")
+
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _parse_or(self) -> tuple:
+        terms = [self._parse_and()]
+        while self._peek() in ('|', ','):
+            self._pos += 1
+            terms.append(self._parse_and())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def _parse_and(self) -> tuple:
+        terms = [self._parse_not()]
+        while self._peek() == '&':
+            self._pos += 1
+            terms.append(self._parse_not())
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    def _parse_not(self) -> tuple:
+        token = self._peek()
+        if token is None:
+            self._fail('unexpected end of expression')
+        self._pos += 1
+        if token == '!':
+            return ('not', self._parse_not())
+        if token == '(':
+            node = self._parse_or()
+            if self._peek() != ')':
+                self._fail("missing ')'")
+            self._pos += 1
+            return node
+        if token in self.OPERATORS:
+            self._fail(f"unexpected '{token}'")
+        return ('tag', token)
+
+    def evaluate(self, index: Dict[str, set], size: int) -> set:
+        """Return the positions (0..size-1) of the servers that match."""
+        if self.tree is None:
+            return set(range(size))
+        universe: Optional[set] = None
+
+        def _all() -> set:
+            nonlocal universe
+            if universe is None:
+                universe = set(range(size))
+            return universe
+
+        def _eval(node: tuple) -> set:
+            kind = node[0]
+            if kind == 'tag':
+                return index.get(node[1], set())
+            if kind == 'not':
+                return _all() - _eval(node[1])
+            if kind == 'or':
+                return set().union(*(_eval(term) for term in node[1]))
+            # AND: intersect the positive terms smallest first, then subtract
+            # the negated ones, so '!x' never materialises the complement.
+            include = [_eval(t) for t in node[1] if t[0] != 'not']
+            exclude = [_eval(t[1]) for t in node[1] if t[0] == 'not']
+            if include:
+                include.sort(key=len)
+                result = include[0].intersection(*include[1:])
+            else:
+                result = _all()
+            return result.difference(*exclude) if exclude else set(result)
+
+        return _eval(self.tree)
+
+
+class _PhaseTimer:
+    """Phase durations (seconds) for one host, filled in as the run proceeds.
+
+    ``channel``, ``exit`` and ``close`` accumulate across the commands run on
+    a host; ``first_byte`` and ``exit`` are measured from the command's exec
+    request, so ``first_byte`` is the time to the first output of the first
+    command.
+    """
+
+    def __init__(self, hostname: str, tracer: Optional['SpanTracer'] = None) -> None:
+        self.hostname = hostname
+        self.phases: Dict[str, float] = {}
+        self.tracer = tracer
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float, started: Optional[float] = None) -> None:
+        """Add ``seconds`` to ``phase``; the span ends now unless ``started`` is given."""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        if self.tracer is not None:
+            if started is None:
+                started = time.monotonic() - seconds
+            self.tracer.add(phase, self.hostname, started, seconds)
+
+    def first(self, phase: str, seconds: float) -> None:
+        """Record ``phase`` only if it has not been recorded yet."""
+        with self._lock:
+            if phase in self.phases:
+                return
+            self.phases[phase] = seconds
+        if self.tracer is not None:
+            self.tracer.instant(phase, self.hostname)
+
+    def span(self, name: str, started: float, **args) -> None:
+        """Trace a span from ``started`` until now without recording a phase."""
+        if self.tracer is not None:
+            self.tracer.add(name, self.hostname, started, time.monotonic() - started, **args)
+
+
+class TimingReport:
+    """Per-host phase timings for a run, summarised as p50/p95/max per phase.
+
+    Assign an instance to :attr:`SSHCommander.timings` before a run; every
+    host then records its resolve, TCP connect, key exchange, authentication
+    (including the host key check), channel open, first output byte, exit
+    and close times.
+    """
+
+    PHASES = ('resolve', 'tcp', 'kex', 'auth', 'channel', 'first_byte', 'exit', 'close')
+
+    def __init__(self) -> None:
+        self.hosts: List[_PhaseTimer] = []
+        self._lock = threading.Lock()
+
+    def start(self, hostname: str, tracer: Optional['SpanTracer'] = None) -> _PhaseTimer:
+        timer = _PhaseTimer(hostname, tracer)
+        with self._lock:
+            self.hosts.append(timer)
+        return timer
+
+    @staticmethod
+    def _percentile(ordered: List[float], pct: float) -> float:
+        # Nearest-rank percentile of an already sorted list.
+        index = max(0, -(-len(ordered) * pct // 100) - 1)
+        return ordered[int(index)]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Return ``{phase: {count, p50, p95, max, slowest}}`` for recorded phases."""
+        result = {}
+        for phase in self.PHASES:
+            samples = [(t.phases[phase], t.hostname) for t in self.hosts if phase in t.phases]
+            if not samples:
+                continue
+            ordered = sorted(value for value, _ in samples)
+            worst, slowest = max(samples)
+            result[phase] = {
+                'count': len(samples),
+                'p50': self._percentile(ordered, 50),
+                'p95': self._percentile(ordered, 95),
+                'max': worst,
+                'slowest': slowest,
+            }
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            'hosts': [{'hostname': t.hostname, 'phases': dict(t.phases)} for t in self.hosts],
+            'summary': self.summary(),
+        }
+
+    def print_table(self, stream=None) -> None:
+        stream = stream or sys.stderr
+        summary = self.summary()
+        if not summary:
+            return
+        print(
+            f"\n{Fore.CYAN}{'phase':<11}{'hosts':>6}{'p50':>11}{'p95':>11}{'max':>11}  slowest{Style.RESET_ALL}",
+            file=stream,
+        )
+        for phase, row in summary.items():
+            print(
+                f"{phase:<11}{row['count']:>6}"
+                f"{row['p50'] * 1000:>9.1f}ms{row['p95'] * 1000:>9.1f}ms{row['max'] * 1000:>9.1f}ms"
+                f"  {row['slowest']}",
+                file=stream,
+            )
+
+
+class SpanTracer:
+    """Record spans per host and write them as Chrome trace event JSON.
+
+    Assign an instance to :attr:`SSHCommander.tracer` before a run. Each host
+    gets its own lane (shown as a thread named after the host) holding a
+    ``host`` span for its whole turn, ``connect`` with the resolve, tcp, kex
+    and auth phases inside it, ``exec`` per command with its ``channel`` and
+    ``exit`` phases, a ``first_byte`` marker, ``close`` and finally ``print``
+    for reporting the result. The file opens in ``chrome://tracing`` or
+    Perfetto.
+    """
+
+    def __init__(self) -> None:
+        self._origin = time.monotonic()
+        self._pid = os.getpid()
+        self._lanes: Dict[str, int] = {}
+        self._events: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _lane(self, host: str) -> int:
+        # Called with the lock held.
+        lane = self._lanes.get(host)
+        if lane is None:
+            lane = self._lanes[host] = len(self._lanes) + 1
+        return lane
+
+    def _micros(self, monotonic: float) -> float:
+        return round((monotonic - self._origin) * 1e6, 1)
+
+    def add(self, name: str, host: str, started: float, seconds: float, **args) -> None:
+        """Record a complete span that began at monotonic time ``started``."""
+        event = {
+            'name': name, 'cat': 'ssh', 'ph': 'X',
+            'ts': self._micros(started), 'dur': round(seconds * 1e6, 1), 'pid': self._pid,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            event['tid'] = self._lane(host)
+            self._events.append(event)
+
+    def instant(self, name: str, host: str) -> None:
+        event = {'name': name, 'cat': 'ssh', 'ph': 'i', 's': 't',
+                 'ts': self._micros(time.monotonic()), 'pid': self._pid}
+        with self._lock:
+            event['tid'] = self._lane(host)
+            self._events.append(event)
+
+    def span(self, name: str, host: str, **args):
+        """Context manager recording a span around its body."""
+        return _TracedSpan(self, name, host, args)
+
+    def write(self, path: str) -> None:
+        with self._lock:
+            events = list(self._events)
+            lanes = dict(self._lanes)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': lane, 'args': {'name': host}}
+            for host, lane in lanes.items()
+        ]
+        metadata.append(
+            {'name': 'process_name', 'ph': 'M', 'pid': self._pid, 'args': {'name': 'ssh-commander'}}
+        )
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+
+
+class _TracedSpan:
+    def __init__(self, tracer: SpanTracer, name: str, host: str, args: Dict) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._host = host
+        self._args = args
+
+    def __enter__(self) -> None:
+        self._started = time.monotonic()
+
+    def __exit__(self, *exc) -> None:
+        self._tracer.add(
+            self._name, self._host, self._started, time.monotonic() - self._started, **self._args
+        )
+
+
+class RunMetrics:
+    """Run statistics for a Prometheus node_exporter textfile collector.
+
+    Assign an instance to :attr:`SSHCommander.metrics` before an ``exec`` or
+    ``test`` run, then call :meth:`write`. The file describes the last run:
+    connect and exec duration histograms, host results by tag, connect
+    errors by tag and class, connect retries, output bytes per stream, the
+    peak number of hosts in flight, the run's duration and when it finished.
+    """
+
+    PREFIX = 'ssh_commander'
+    CONNECT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    EXEC_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._histograms = {
+            'connect': [[0] * len(self.CONNECT_BUCKETS), 0.0, 0],
+            'exec': [[0] * len(self.EXEC_BUCKETS), 0.0, 0],
+        }
+        self._hosts: Dict[Tuple[str, str], int] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._failed_connects: Dict[str, str] = {}
+        self._bytes = {'stdout': 0, 'stderr': 0}
+        self._retries = 0
+        self._in_flight = 0
+        self.peak_in_flight = 0
+
+    def _observe(self, name: str, seconds: float) -> None:
+        buckets = self.CONNECT_BUCKETS if name == 'connect' else self.EXEC_BUCKETS
+        with self._lock:
+            histogram = self._histograms[name]
+            for i, bound in enumerate(buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def observe_connect(self, server: Dict, seconds: float, exc: Optional[BaseException]) -> None:
+        self._observe('connect', seconds)
+        if exc is None:
+            with self._lock:
+                # A retry got through.
+                self._failed_connects.pop(server['hostname'], None)
+            return
+        cls = _connect_error_class(exc)
+        with self._lock:
+            self._failed_connects[server['hostname']] = cls
+            for tag in server.get('tags', ['default']):
+                key = (str(tag), cls)
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def observe_retry(self) -> None:
+        with self._lock:
+            self._retries += 1
+
+    def observe_exec(self, seconds: float) -> None:
+        self._observe('exec', seconds)
+
+    def add_bytes(self, nbytes: int, is_stderr: bool) -> None:
+        with self._lock:
+            self._bytes['stderr' if is_stderr else 'stdout'] += nbytes
+
+    def host_started(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+
+    def host_finished(self, server: Dict, failed: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if not failed:
+                result = 'ok'
+            elif server['hostname'] in self._failed_connects:
+                result = 'unreachable'
+            else:
+                result = 'failed'
+            self._count_host(server, result)
+
+    def hosts_skipped(self, servers: Iterable[Dict]) -> None:
+        with self._lock:
+            for server in servers:
+                self._count_host(server, 'skipped')
+
+    def _count_host(self, server: Dict, result: str) -> None:
+        # Called with the lock held.
+        for tag in server.get('tags', ['default']):
+            key = (str(tag), result)
+            self._hosts[key] = self._hosts.get(key, 0) + 1
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        def _escape(value) -> str:
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        p, command = self.PREFIX, self.command
+        lines: List[str] = []
+
+        def _header(name: str, kind: str, text: str) -> None:
+            lines.append(f"# HELP {p}_{name} {text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        with self._lock:
+            for name, buckets, text in (
+                ('connect', self.CONNECT_BUCKETS,
+                 'Time to open SSH connections (resolve, TCP, key exchange, authentication).'),
+                ('exec', self.EXEC_BUCKETS, 'Time from opening a channel to command exit.'),
+            ):
+                counts, total, count = self._histograms[name]
+                _header(f"{name}_duration_seconds", 'histogram', text)
+                for bound, value in zip(buckets, counts):
+                    lines.append(
+                        f"{p}_{name}_duration_seconds_bucket"
+                        f"{self._labels(command=command, le=f'{bound:g}')} {value}"
+                    )
+                lines.append(
+                    f"{p}_{name}_duration_seconds_bucket{self._labels(command=command, le='+Inf')} {count}"
+                )
+                lines.append(f"{p}_{name}_duration_seconds_sum{self._labels(command=command)} {total:.6f}")
+                lines.append(f"{p}_{name}_duration_seconds_count{self._labels(command=command)} {count}")
+
+            _header('hosts_total', 'counter',
+                    'Hosts by tag and result (ok, failed, unreachable, skipped).')
+            for (tag, result), value in sorted(self._hosts.items()):
+                lines.append(f"{p}_hosts_total{self._labels(command=command, tag=tag, result=result)} {value}")
+            _header('connect_errors_total', 'counter', 'Failed connection attempts by tag and error class.')
+            for (tag, cls), value in sorted(self._errors.items()):
+                lines.append(
+                    f"{p}_connect_errors_total{self._labels(command=command, tag=tag, **{'class': cls})} {value}"
+                )
+            _header('connect_retries_total', 'counter', 'Connects retried after a transient error.')
+            lines.append(f"{p}_connect_retries_total{self._labels(command=command)} {self._retries}")
+            _header('output_bytes_total', 'counter', 'Command output received, by stream.')
+            for stream, value in self._bytes.items():
+                lines.append(f"{p}_output_bytes_total{self._labels(command=command, stream=stream)} {value}")
+            _header('peak_concurrency', 'gauge', 'Most hosts in flight at once.')
+            lines.append(f"{p}_peak_concurrency{self._labels(command=command)} {self.peak_in_flight}")
+        _header('run_duration_seconds', 'gauge', 'Wall-clock duration of the run.')
+        lines.append(
+            f"{p}_run_duration_seconds{self._labels(command=command)} {time.monotonic() - self._started:.6f}"
+        )
+        _header('last_run_timestamp_seconds', 'gauge', 'Unix time the run finished.')
+        lines.append(f"{p}_last_run_timestamp_seconds{self._labels(command=command)} {time.time():.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Atomically replace ``path`` so the collector never reads a partial file."""
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix='.ssh-commander-metrics-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.render())
+            # node_exporter usually runs as another user.
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
 class SSHCommander:
     DEFAULT_CONNECT_TIMEOUT = 10  # seconds
-
-    def __init__(self, config_file: Optional[str] = None, connect_timeout: Optional[float] = None):
+    # Upper bound on threads doing blocking handshakes for ``engine='async'``.
+    ASYNC_HANDSHAKE_WORKERS = 32
+    # Per-host output buffered beyond this many bytes spills to a temp file.
+    DEFAULT_SPOOL_THRESHOLD = 1024 * 1024
+    # Remote interpreter fed the command file on stdin by ``exec -f --batch``.
+    BATCH_SHELL = '/bin/sh -s'
+    # Ceiling for ``parallel='auto'``.
+    DEFAULT_MAX_PARALLEL = 256
+    # Bumped whenever the compiled inventory cache layout changes.
+    CACHE_FORMAT = 1
+    # Exit status recorded for a command cut off by a timeout (as timeout(1)).
+    TIMEOUT_STATUS = 124
+    # SFTP channel window for push/pull, so pipelined writes and prefetched
+    # reads are not held back by flow control on fast, high-latency links.
+    TRANSFER_WINDOW = 64 * 1024 * 1024
+    # Paths per remote ``sha256sum`` when checking which files changed.
+    DIGEST_BATCH = 200
+
+    def __init__(
+        self,
+        config_file: Optional[str] = None,
+        connect_timeout: Optional[float] = None,
+        pool_socket: Optional[str] = None,
+    ):
         self.config_file = self._find_config_file(config_file)
         self.connect_timeout = (
             connect_timeout if connect_timeout is not None else self.DEFAULT_CONNECT_TIMEOUT
         )
+        # When set, connections are borrowed from the pool daemon on this socket.
+        self.pool_socket = pool_socket
         self.servers: List[Dict] = self._load_servers()
+        # Tag / hostname -> positions in ``self.servers``; reset whenever the
+        # list is saved.
+        self._tag_index: Optional[Dict[str, set]] = None
+        self._host_index: Optional[Dict[str, int]] = None
         self._active_sessions: List[Dict] = []
         self._sessions_lock = threading.Lock()
         self._output_lock = threading.Lock()
+        self._mux: Optional[_ChannelMultiplexer] = None
+        self.spool_threshold = self.DEFAULT_SPOOL_THRESHOLD
+        self.max_parallel = self.DEFAULT_MAX_PARALLEL
+        # When set, every host records its phase timings here.
+        self.timings: Optional[TimingReport] = None
+        # When set, per-host spans are recorded here (see SpanTracer).
+        self.tracer: Optional[SpanTracer] = None
+        # When set, exec and test runs feed their statistics here (see RunMetrics).
+        self.metrics: Optional[RunMetrics] = None
+        self.resolver = _HostResolver()
+        self.known_hosts = _KnownHosts()
+        self.keys = _KeyCache()
+        self.transport_profiles = _TransportProfiles(
+            os.path.join(os.path.dirname(self.config_file), 'transport.yaml')
+        )
+        # Offer ssh-agent identities to every server, not only those with
+        # ``agent: true`` in the config.
+        self.use_agent = False
+        # Connect attempts; see RetryPolicy.
+        self.retry = RetryPolicy()
+        # Most handshakes (TCP connect through authentication) in flight at
+        # once during a fan-out, independent of how many hosts run commands.
+        self.connect_parallel: Optional[int] = None
+        self._connect_slots: Optional[threading.BoundedSemaphore] = None
+        self._async_connect_slots: Optional[asyncio.Semaphore] = None
+        # When set, new direct connections are paced by it (see ConnectRateLimiter).
+        self.connect_rate: Optional[ConnectRateLimiter] = None
+        # Seconds a remote command may run before its channel is closed.
+        self.command_timeout: Optional[float] = None
+        # time.monotonic() by which the run must end: no host starts after
+        # it, and commands still running then are cut off.
+        self.deadline: Optional[float] = None
+        # Called as (server, seconds, exception_or_None) after each direct connect.
+        self._connect_observer: Optional[Callable[[Dict, float, Optional[BaseException]], None]] = None
 
     # -- config discovery / IO -------------------------------------------------
 
@@ -178,22 +2066,83 @@ class SSHCommander:
                 raise ValueError(f"Entry #{idx}: missing required 'hostname'")
             if 'username' not in server or not str(server['username']).strip():
                 raise ValueError(f"Entry #{idx} ({server['hostname']}): missing required 'username'")
-            if 'key_file' not in server and 'password' not in server:
+            if 'key_file' not in server and 'password' not in server and not server.get('agent'):
                 raise ValueError(
-                    f"Entry #{idx} ({server['hostname']}): must have either 'key_file' or 'password'"
+                    f"Entry #{idx} ({server['hostname']}): must have 'key_file', 'password' "
+                    f"or 'agent: true'"
                 )
+            if 'transport' in server:
+                _TransportProfiles.check(server['transport'], f"Entry #{idx} ({server['hostname']})")
             host = str(server['hostname']).strip().lower()
             if host in seen_hosts:
                 raise ValueError(f"Duplicate hostname in config: {server['hostname']}")
             seen_hosts.add(host)
 
+    def _cache_file(self) -> str:
+        """Path of the compiled inventory cache kept next to the config file."""
+        directory, name = os.path.split(self.config_file)
+        return os.path.join(directory, f'.{name}.cache')
+
+    def _read_cache(self, signature: Tuple[int, int]) -> Optional[List[Dict]]:
+        """Return the cached server list if it matches ``signature``."""
+        try:
+            # loads() on the whole file: marshal.load() on a file object
+            # is several times slower.
+            with open(self._cache_file(), 'rb') as f:
+                cached = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if (
+            not isinstance(cached, tuple) or len(cached) != 4
+            or cached[:3] != (self.CACHE_FORMAT, tuple(sys.version_info[:2]), signature)
+        ):
+            return None
+        return cached[3]
+
+    def _write_cache(self, signature: Tuple[int, int], servers: List[Dict]) -> None:
+        """Atomically replace the compiled cache with ``servers``."""
+        try:
+            payload = marshal.dumps(
+                (self.CACHE_FORMAT, tuple(sys.version_info[:2]), signature, servers)
+            )
+        except ValueError:
+            # Something marshal cannot represent (e.g. a YAML timestamp).
+            return
+        path = self._cache_file()
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                prefix='.servers-cache-', dir=os.path.dirname(path) or '.'
+            )
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IWUSR)  # 0600
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            _verbose(f"Could not write inventory cache {path}: {exc}")
+
     def _load_servers(self) -> List[Dict]:
-        """Load server configurations from YAML file."""
-        if not os.path.exists(self.config_file):
+        """Load server configurations from YAML file (or its compiled cache)."""
+        try:
+            st = os.stat(self.config_file)
+        except FileNotFoundError:
             return []
+        except OSError as exc:
+            raise SSHCommanderError(
+                f"Could not read config file {self.config_file}: {exc}"
+            ) from exc
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._read_cache(signature)
+        if cached is not None:
+            return cached
         try:
             with open(self.config_file, 'r') as f:
-                data = yaml.safe_load(f)
+                data = yaml.load(f, Loader=_YAML_LOADER)
         except (IOError, OSError) as exc:
             raise SSHCommanderError(
                 f"Could not read config file {self.config_file}: {exc}"
@@ -208,6 +2157,7 @@ class SSHCommander:
             raise SSHCommanderError(
                 f"Invalid config: expected a list of servers, got {type(data).__name__}"
             )
+        self._write_cache(signature, data)
         return data
 
     def _save_servers(self) -> None:
@@ -220,7 +2170,9 @@ class SSHCommander:
         fd, tmp_path = tempfile.mkstemp(prefix='.servers-', suffix='.yaml', dir=target_dir)
         try:
             with os.fdopen(fd, 'w') as f:
-                yaml.safe_dump(self.servers, f, default_flow_style=False, sort_keys=False)
+                yaml.dump(
+                    self.servers, f, Dumper=_YAML_DUMPER, default_flow_style=False, sort_keys=False
+                )
             os.chmod(tmp_path, stat.S_IRUSR | stat.S_IWUSR)  # 0600
             os.replace(tmp_path, self.config_file)
         except Exception:
@@ -229,6 +2181,9 @@ class SSHCommander:
             except OSError:
                 pass
             raise
+        self._tag_index = self._host_index = None
+        st = os.stat(self.config_file)
+        self._write_cache((st.st_mtime_ns, st.st_size), self.servers)
 
     # -- sync helpers ---------------------------------------------------------
 
@@ -274,8 +2229,7 @@ class SSHCommander:
         transport = paramiko.Transport((hostname, port))
         try:
             if key_file:
-                key = paramiko.RSAKey.from_private_key_file(os.path.expanduser(key_file))
-                transport.connect(username=username, pkey=key)
+                transport.connect(username=username, pkey=self.keys.load(key_file))
             elif password is not None:
                 transport.connect(username=username, password=password)
             else:
@@ -409,105 +2363,498 @@ class SSHCommander:
 
     # -- ssh execution --------------------------------------------------------
 
-    def _build_client(self, strict_host_key_checking: bool = False):
+    def _build_client(self, server: Dict, strict_host_key_checking: bool = False):
         paramiko = get_paramiko()
         client = paramiko.SSHClient()
-        # Always load known_hosts so authentic prior fingerprints take effect.
-        try:
-            client.load_system_host_keys()
-        except (IOError, OSError):
-            pass
+        # Always apply known_hosts so authentic prior fingerprints take effect;
+        # the shared database hands over just this host's keys.
+        self.known_hosts.prime(client, server['hostname'], int(server.get('port', 22)))
         if strict_host_key_checking:
             client.set_missing_host_key_policy(paramiko.RejectPolicy())
         else:
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            # Accepts and queues new keys; written back by known_hosts.save().
+            client.set_missing_host_key_policy(self.known_hosts)
         return client
 
+    def _new_timer(self, server: Dict) -> Optional[_PhaseTimer]:
+        """Start recording phase timings for ``server`` if timings or tracing are enabled."""
+        if self.timings is not None:
+            return self.timings.start(server['hostname'], self.tracer)
+        if self.tracer is not None:
+            return _PhaseTimer(server['hostname'], self.tracer)
+        return None
+
+    def _open_socket(
+        self, hostname: str, port: int, timer: Optional[_PhaseTimer] = None
+    ) -> socket.socket:
+        """Resolve ``hostname`` and open a TCP connection to it."""
+        begin = time.monotonic()
+        try:
+            infos = self.resolver.lookup(hostname, port)
+        finally:
+            resolved = time.monotonic()
+            if timer is not None:
+                self._record_resolve(timer, hostname, port, resolved - begin)
+        last_exc: Optional[OSError] = None
+        for family, socktype, proto, _, addr in infos:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(self.connect_timeout)
+            try:
+                sock.connect(addr)
+            except OSError as exc:
+                sock.close()
+                last_exc = exc
+                continue
+            if timer is not None:
+                timer.add('tcp', time.monotonic() - resolved)
+            _set_nodelay(sock)
+            return sock
+        raise last_exc or OSError(f"No addresses found for {hostname}")
+
+    def _record_resolve(self, timer: _PhaseTimer, hostname: str, port: int, seconds: float) -> None:
+        """Record the resolve phase, charging the host its up-front prefetch lookup."""
+        prefetched = self.resolver.prefetch_time(hostname, port)
+        if prefetched is not None:
+            timer.add('resolve', prefetched[1], started=prefetched[0])
+        timer.add('resolve', seconds)
+
+    @staticmethod
+    def _transport_factory(settings: Dict, timer: Optional[_PhaseTimer] = None) -> Callable:
+        """Return a paramiko ``transport_factory`` applying ``settings``.
+
+        ``settings`` are the :class:`_TransportProfiles` window/packet sizes
+        and algorithm preferences (compression and keepalive are applied by
+        the caller). When ``timer`` is given, key exchange is timed too.
+        """
+        paramiko = get_paramiko()
+
+        def _factory(*args, **kwargs):
+            if 'window_size' in settings:
+                kwargs['default_window_size'] = settings['window_size']
+            if 'max_packet_size' in settings:
+                kwargs['default_max_packet_size'] = settings['max_packet_size']
+            transport = paramiko.Transport(*args, **kwargs)
+            options = transport.get_security_options()
+            for key, attr in _TransportProfiles.ALGORITHMS.items():
+                if key in settings:
+                    setattr(options, attr, settings[key])
+            if timer is None:
+                return transport
+            start_client = transport.start_client
+
+            def _start_client(*a, **kw):
+                begin = time.monotonic()
+                try:
+                    return start_client(*a, **kw)
+                finally:
+                    timer.add('kex', time.monotonic() - begin)
+
+            transport.start_client = _start_client
+            return transport
+
+        return _factory
+
     def _connect_to_server(
         self,
         server: Dict,
         strict_host_key_checking: bool = False,
+        sock: Optional[socket.socket] = None,
+        pooled: bool = True,
+        started: Optional[float] = None,
+        timer: Optional[_PhaseTimer] = None,
     ) -> Tuple[Optional[object], Optional[str]]:
-        """Connect to a server and return (client, error_message)."""
-        client = self._build_client(strict_host_key_checking=strict_host_key_checking)
+        """Connect to a server and return (client, error_message).
+
+        ``sock`` may be an already-connected TCP socket, in which case only the
+        SSH handshake and authentication happen here (``started`` is then the
+        monotonic time the TCP connect began) and a failure is not retried.
+        Otherwise transient failures are retried as :attr:`retry` allows, and
+        at most :attr:`connect_parallel` handshakes run at once. When
+        ``pool_socket`` is configured and ``pooled`` is true the connection is
+        borrowed from the pool daemon instead. ``timer`` receives the connect
+        phase timings.
+        """
+        if pooled and self.pool_socket:
+            return self._connect_via_pool(server, strict_host_key_checking, timer)
+        if sock is not None:
+            client, error, _ = self._connect_once(
+                server, strict_host_key_checking, sock, started, timer
+            )
+            return client, error
         try:
-            connect_kwargs = {
-                'hostname': server['hostname'],
-                'username': server['username'],
-                'port': int(server.get('port', 22)),
-                'timeout': self.connect_timeout,
-                'banner_timeout': self.connect_timeout,
-                'auth_timeout': self.connect_timeout,
-            }
-            if 'key_file' in server:
-                key_file = os.path.expanduser(server['key_file'])
-                if not os.path.exists(key_file):
-                    raise FileNotFoundError(f"SSH key file not found: {key_file}")
-                connect_kwargs['key_filename'] = key_file
-                connect_kwargs['look_for_keys'] = False
-                connect_kwargs['allow_agent'] = False
+            pkey = self._load_key(server)
+        except SSHCommanderError as exc:
+            return None, self._key_error(server, exc, timer)
+        attempt = 0
+        while True:
+            slots = self._connect_slots
+            if slots is None:
+                client, error, exc = self._connect_once(
+                    server, strict_host_key_checking, timer=timer, pkey=pkey
+                )
             else:
-                connect_kwargs['password'] = server['password']
-                connect_kwargs['look_for_keys'] = False
-                connect_kwargs['allow_agent'] = False
+                with slots:
+                    client, error, exc = self._connect_once(
+                        server, strict_host_key_checking, timer=timer, pkey=pkey
+                    )
+            if not self.retry.should_retry(exc, attempt) or self._past_deadline():
+                return client, self._attempts_note(error, attempt)
+            time.sleep(self._retry_delay(server, exc, attempt))
+            attempt += 1
 
+    def _load_key(self, server: Dict):
+        """Return the private key for ``server`` (None without ``key_file``).
+
+        Raises :class:`SSHCommanderError` for a missing, unreadable or
+        unparseable key, so the connect fails as a config error and is not
+        retried.
+        """
+        if 'key_file' not in server:
+            return None
+        paramiko = get_paramiko()
+        try:
+            return self.keys.load(server['key_file'])
+        except OSError as exc:
+            raise SSHCommanderError(str(exc)) from exc
+        except (paramiko.SSHException, ValueError) as exc:
+            raise SSHCommanderError(f"Cannot load SSH key {server['key_file']}: {exc}") from exc
+
+    def _key_error(self, server: Dict, exc: SSHCommanderError, timer: Optional[_PhaseTimer]) -> str:
+        """Record a key that failed to load as a failed connect; return the message."""
+        self._observe_connect(server, time.monotonic(), exc, timer)
+        return f"{Fore.RED}Error connecting to {server['hostname']}: {exc}{Style.RESET_ALL}"
+
+    def _connect_wait(self, server: Dict, addresses: Optional[List[str]] = None) -> float:
+        """Reserve connect tokens for ``server``; return how long to wait first."""
+        if addresses is None:
+            addresses = self._connect_addresses(server)
+        return self.connect_rate.reserve(server, addresses)
+
+    def _connect_addresses(self, server: Dict) -> List[str]:
+        """Resolve ``server`` for subnet rate limits (re-resolving expired entries)."""
+        if not self.connect_rate.by_address:
+            return []
+        try:
+            infos = self.resolver.lookup(server['hostname'], int(server.get('port', 22)))
+        except (OSError, UnicodeError):
+            # The connect itself reports the failure.
+            return []
+        return [addr[0] for *_, addr in infos]
+
+    def _retry_delay(self, server: Dict, exc: BaseException, attempt: int) -> float:
+        """Note a retry of ``server`` and return how long to wait before it."""
+        delay = self.retry.delay(attempt)
+        if self.metrics is not None:
+            self.metrics.observe_retry()
+        _verbose(
+            f"{Fore.YELLOW}{server['hostname']}: {exc}; retrying connect in {delay:.1f}s "
+            f"({attempt + 1}/{self.retry.retries}){Style.RESET_ALL}"
+        )
+        return delay
+
+    @staticmethod
+    def _attempts_note(error: Optional[str], attempt: int) -> Optional[str]:
+        if error is None or not attempt:
+            return error
+        reset = Style.RESET_ALL
+        if error.endswith(reset):
+            return f"{error[:-len(reset)]} (after {attempt + 1} attempts){reset}"
+        return f"{error} (after {attempt + 1} attempts)"
+
+    def _connect_once(
+        self,
+        server: Dict,
+        strict_host_key_checking: bool = False,
+        sock: Optional[socket.socket] = None,
+        started: Optional[float] = None,
+        timer: Optional[_PhaseTimer] = None,
+        pkey=None,
+    ) -> Tuple[Optional[object], Optional[str], Optional[BaseException]]:
+        """One direct connect attempt; returns (client, error_message, exception).
+
+        ``pkey`` is the already loaded key for ``server``; without it the key
+        file (if any) is loaded here.
+        """
+        if sock is None and self.connect_rate is not None:
+            begin = time.monotonic()
+            time.sleep(self._connect_wait(server))
+            if timer is not None:
+                timer.span('rate_limit', begin)
+        if started is None:
+            started = time.monotonic()
+        client = self._build_client(server, strict_host_key_checking=strict_host_key_checking)
+        try:
+            port = int(server.get('port', 22))
+            if sock is None:
+                sock = self._open_socket(server['hostname'], port, timer)
+            connect_kwargs = {
+                'hostname': server['hostname'],
+                'username': server['username'],
+                'port': port,
+                'timeout': self.connect_timeout,
+                'banner_timeout': self.connect_timeout,
+                'auth_timeout': self.connect_timeout,
+                'sock': sock,
+            }
+            tuning = self.transport_profiles.settings_for(server)
+            if tuning or timer is not None:
+                connect_kwargs['transport_factory'] = self._transport_factory(tuning, timer)
+            connect_kwargs['compress'] = tuning.get('compression', False)
+            if 'key_file' in server:
+                connect_kwargs['pkey'] = pkey if pkey is not None else self._load_key(server)
+            elif 'password' in server:
+                connect_kwargs['password'] = server['password']
+            connect_kwargs['look_for_keys'] = False
+            connect_kwargs['allow_agent'] = self.use_agent or bool(server.get('agent'))
+
+            handshake = time.monotonic()
+            kex_before = timer.phases.get('kex', 0.0) if timer is not None else 0.0
             client.connect(**connect_kwargs)
-            return client, None
+            if timer is not None:
+                # Whatever connect() spent outside key exchange: host key
+                # check and authentication.
+                kex = timer.phases.get('kex', 0.0) - kex_before
+                timer.add('auth', time.monotonic() - handshake - kex)
+            if tuning.get('keepalive'):
+                client.get_transport().set_keepalive(tuning['keepalive'])
+            self._observe_connect(server, started, timer=timer)
+            return client, None, None
         except Exception as exc:
+            self._observe_connect(server, started, exc, timer)
             try:
                 client.close()
             except Exception:
                 pass
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+            return None, (
+                f"{Fore.RED}Error connecting to {server['hostname']}: {exc}{Style.RESET_ALL}"
+            ), exc
+
+    def _connect_via_pool(
+        self,
+        server: Dict,
+        strict_host_key_checking: bool = False,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> Tuple[Optional[object], Optional[str]]:
+        """Ask the pool daemon to connect (or reuse a connection) to ``server``.
+
+        The round trip is observed like a direct connect, so ``--parallel
+        auto``, metrics and traces see pooled connects too.
+        """
+        started = time.monotonic()
+        request = dict(server)
+        if self.use_agent:
+            request['agent'] = True
+        try:
+            # Resolve tag profiles here: the daemon may use another config.
+            tuning = self.transport_profiles.settings_for(server)
+            if tuning:
+                request['transport'] = tuning
+            _pool_call(self.pool_socket, {
+                'op': 'connect',
+                'server': request,
+                'strict': strict_host_key_checking,
+            })
+        except ValueError as exc:
+            self._observe_connect(server, started, exc, timer)
             return None, (
                 f"{Fore.RED}Error connecting to {server['hostname']}: {exc}{Style.RESET_ALL}"
             )
+        except SSHCommanderError as exc:
+            self._observe_connect(server, started, exc, timer)
+            # The daemon already formatted the connect error for display.
+            return None, str(exc)
+        except (OSError, EOFError) as exc:
+            self._observe_connect(server, started, exc, timer)
+            return None, (
+                f"{Fore.RED}Error connecting to {server['hostname']} via pool: "
+                f"{exc}{Style.RESET_ALL}"
+            )
+        self._observe_connect(server, started, timer=timer)
+        # Channels carry the same request so a daemon-side reconnect keeps
+        # the agent and transport settings.
+        return _PooledClient(self.pool_socket, request, strict_host_key_checking), None
 
-    def _stream_output(self, channel, prefix: str = "", out_buffer=None) -> None:
-        """Stream output from a channel until EOF.
+    async def _connect_to_server_async(
+        self,
+        server: Dict,
+        executor: ThreadPoolExecutor,
+        strict_host_key_checking: bool = False,
+        pooled: bool = True,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> Tuple[Optional[object], Optional[str]]:
+        """Async counterpart of :meth:`_connect_to_server`.
 
-        If ``out_buffer`` is provided the data is captured there instead of
-        being written to the live terminal, which allows safe parallel
-        execution without interleaving.
+        The TCP connect runs on the event loop; only the blocking key exchange
+        and authentication are pushed to ``executor``. Retries back off on the
+        loop, and handshakes are capped by the slots :meth:`_run_async` sets up
+        for :attr:`connect_parallel`.
         """
+        loop = asyncio.get_running_loop()
+        if pooled and self.pool_socket:
+            return await loop.run_in_executor(
+                executor,
+                functools.partial(
+                    self._connect_to_server,
+                    server,
+                    strict_host_key_checking=strict_host_key_checking,
+                    timer=timer,
+                ),
+            )
         try:
-            while True:
-                if channel.exit_status_ready() and not (
-                    channel.recv_ready() or channel.recv_stderr_ready()
-                ):
-                    break
+            # Parsing (or unlocking) a key blocks; keep it off the loop.
+            pkey = await loop.run_in_executor(executor, self._load_key, server)
+        except SSHCommanderError as exc:
+            return None, self._key_error(server, exc, timer)
+        attempt = 0
+        while True:
+            slots = self._async_connect_slots
+            if slots is None:
+                client, error, exc = await self._connect_once_async(
+                    server, executor, strict_host_key_checking, timer, pkey
+                )
+            else:
+                async with slots:
+                    client, error, exc = await self._connect_once_async(
+                        server, executor, strict_host_key_checking, timer, pkey
+                    )
+            if not self.retry.should_retry(exc, attempt) or self._past_deadline():
+                return client, self._attempts_note(error, attempt)
+            await asyncio.sleep(self._retry_delay(server, exc, attempt))
+            attempt += 1
 
-                wrote = False
-                if channel.recv_ready():
-                    data = channel.recv(4096)
-                    if data:
-                        text = data.decode(errors='replace')
-                        if out_buffer is not None:
-                            out_buffer.write(text)
-                        else:
-                            with self._output_lock:
-                                sys.stdout.write(prefix + text if prefix else text)
-                                sys.stdout.flush()
-                        wrote = True
-
-                if channel.recv_stderr_ready():
-                    data = channel.recv_stderr(4096)
-                    if data:
-                        text = data.decode(errors='replace')
-                        if out_buffer is not None:
-                            out_buffer.write(text)
-                        else:
-                            with self._output_lock:
-                                sys.stderr.write(
-                                    f"{Fore.RED}{prefix + text if prefix else text}{Style.RESET_ALL}"
-                                )
-                                sys.stderr.flush()
-                        wrote = True
+    async def _connect_once_async(
+        self,
+        server: Dict,
+        executor: ThreadPoolExecutor,
+        strict_host_key_checking: bool = False,
+        timer: Optional[_PhaseTimer] = None,
+        pkey=None,
+    ) -> Tuple[Optional[object], Optional[str], Optional[BaseException]]:
+        """Async counterpart of :meth:`_connect_once`."""
+        loop = asyncio.get_running_loop()
+        if self.connect_rate is not None:
+            begin = time.monotonic()
+            addresses = None
+            if self.connect_rate.by_address:
+                # An expired entry means a blocking lookup; keep it off the loop.
+                addresses = await loop.run_in_executor(executor, self._connect_addresses, server)
+            await asyncio.sleep(self._connect_wait(server, addresses))
+            if timer is not None:
+                timer.span('rate_limit', begin)
+        hostname = server['hostname']
+        port = int(server.get('port', 22))
+        sock: Optional[socket.socket] = None
+        started = time.monotonic()
+        try:
+            try:
+                infos = self.resolver.cached(hostname, port)
+                if infos is None:
+                    try:
+                        infos = await asyncio.wait_for(
+                            loop.getaddrinfo(hostname, port, type=socket.SOCK_STREAM),
+                            self.connect_timeout,
+                        )
+                    except socket.gaierror as exc:
+                        self.resolver.store(hostname, port, exc)
+                        raise
+                    self.resolver.store(hostname, port, infos)
+            finally:
+                resolved = time.monotonic()
+                if timer is not None:
+                    self._record_resolve(timer, hostname, port, resolved - started)
+            last_exc: Optional[BaseException] = None
+            for family, socktype, proto, _, addr in infos:
+                candidate = socket.socket(family, socktype, proto)
+                candidate.setblocking(False)
+                try:
+                    await asyncio.wait_for(
+                        loop.sock_connect(candidate, addr), self.connect_timeout
+                    )
+                except (OSError, asyncio.TimeoutError) as exc:
+                    candidate.close()
+                    last_exc = exc
+                    continue
+                sock = candidate
+                if timer is not None:
+                    timer.add('tcp', time.monotonic() - resolved)
+                break
+            if sock is None:
+                if isinstance(last_exc, asyncio.TimeoutError) or last_exc is None:
+                    raise socket.timeout('timed out')
+                raise last_exc
+            sock.setblocking(True)
+            _set_nodelay(sock)
+        except Exception as exc:
+            self._observe_connect(server, started, exc, timer)
+            return None, (
+                f"{Fore.RED}Error connecting to {hostname}: {exc}{Style.RESET_ALL}"
+            ), exc
+        return await loop.run_in_executor(
+            executor,
+            functools.partial(
+                self._connect_once,
+                server,
+                strict_host_key_checking=strict_host_key_checking,
+                sock=sock,
+                started=started,
+                timer=timer,
+                pkey=pkey,
+            ),
+        )
 
-                if not wrote:
-                    time.sleep(0.05)
-        except Exception:
-            # Best-effort streaming: if the channel dies mid-read we just stop.
+    def _observe_connect(
+        self,
+        server: Dict,
+        started: float,
+        exc: Optional[BaseException] = None,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> None:
+        if timer is not None:
+            timer.span('connect', started)
+        if self.metrics is not None:
+            self.metrics.observe_connect(server, time.monotonic() - started, exc)
+        observer = self._connect_observer
+        if observer is not None:
+            observer(server, time.monotonic() - started, exc)
+
+    def _get_multiplexer(self) -> '_ChannelMultiplexer':
+        """Return the shared channel multiplexer, creating it on first use."""
+        with self._sessions_lock:
+            if self._mux is None:
+                self._mux = _ChannelMultiplexer()
+            return self._mux
+
+    def _close_multiplexer(self) -> None:
+        """Stop the multiplexer thread once a run is over; the next run starts another."""
+        with self._sessions_lock:
+            mux, self._mux = self._mux, None
+        if mux is not None:
+            mux.close()
+
+    def _write_output(self, text: str, is_stderr: bool, prefix: str = "", out_buffer=None) -> None:
+        """Deliver decoded channel output to ``out_buffer`` or the live terminal.
+
+        If ``out_buffer`` is provided the data is captured there instead of
+        being written to the live terminal, which allows safe parallel
+        execution without interleaving.
+        """
+        if out_buffer is not None:
+            out_buffer.write(text)
             return
+        with self._output_lock:
+            if is_stderr:
+                sys.stderr.write(
+                    f"{Fore.RED}{prefix + text if prefix else text}{Style.RESET_ALL}"
+                )
+                sys.stderr.flush()
+            else:
+                sys.stdout.write(prefix + text if prefix else text)
+                sys.stdout.flush()
 
     def _register_session(self, session: Dict) -> None:
         with self._sessions_lock:
@@ -518,6 +2865,15 @@ class SSHCommander:
             if session in self._active_sessions:
                 self._active_sessions.remove(session)
 
+    def _close_client(self, client, timer: Optional[_PhaseTimer] = None) -> None:
+        begin = time.monotonic()
+        try:
+            client.close()
+        except Exception:
+            pass
+        if timer is not None:
+            timer.add('close', time.monotonic() - begin)
+
     def cleanup_sessions(self) -> None:
         """Close all active SSH sessions and channels."""
         with self._sessions_lock:
@@ -525,6 +2881,8 @@ class SSHCommander:
             self._active_sessions.clear()
         for session in sessions:
             for channel in session.get('channels', []):
+                if channel is not None and self._mux is not None:
+                    self._mux.discard(channel)
                 try:
                     if channel and not channel.closed:
                         channel.close()
@@ -540,77 +2898,744 @@ class SSHCommander:
             except Exception:
                 pass
 
-    def _run_one_command(
+    def _start_command(
         self,
         client,
         command: str,
         prefix: str = "",
         out_buffer=None,
-    ) -> int:
-        """Run a single command on an already-connected client."""
+        on_done: Optional[Callable[[], None]] = None,
+        pty: bool = True,
+        stdin_data: Optional[bytes] = None,
+        writer: Optional[Callable[[str, bool], None]] = None,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> Tuple[object, threading.Event, Callable[[], int]]:
+        """Exec ``command`` on a new channel and hand it to the multiplexer.
+
+        ``stdin_data`` is sent to the command followed by EOF. ``writer``
+        replaces the default delivery of decoded output to ``out_buffer`` or
+        the terminal. ``timer`` receives channel, first byte and exit times.
+
+        Returns ``(channel, done, complete)``: ``done`` is set once the command
+        has exited and its output was delivered, and ``complete()`` releases
+        the channel and returns the exit status.
+        """
+        begin = time.monotonic()
         transport = client.get_transport()
         channel = transport.open_session()
         try:
-            channel.get_pty()
+            if pty:
+                channel.get_pty()
             channel.set_combine_stderr(False)
             channel.exec_command(command)
-
-            session = {'client': client, 'channels': [channel]}
-            self._register_session(session)
+            started = time.monotonic()
+            if timer is not None:
+                timer.add('channel', started - begin)
+        except Exception:
             try:
-                output_thread = threading.Thread(
-                    target=self._stream_output,
-                    args=(channel, prefix, out_buffer),
-                )
-                output_thread.daemon = True
-                output_thread.start()
-
-                while not channel.exit_status_ready():
-                    try:
-                        time.sleep(0.1)
-                    except KeyboardInterrupt:
-                        _info(
-                            f"\n{Fore.YELLOW}Interrupted. Sending Ctrl+C...{Style.RESET_ALL}"
-                        )
-                        try:
-                            channel.send('\x03')
-                        except Exception:
-                            pass
-                        raise
+                channel.close()
+            except Exception:
+                pass
+            raise
 
-                output_thread.join()
+        session = {'client': client, 'channels': [channel]}
+        self._register_session(session)
+        mux = self._get_multiplexer()
+        decoders = {
+            False: codecs.getincrementaldecoder('utf-8')(errors='replace'),
+            True: codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        }
+
+        if writer is None:
+            def writer(text: str, is_stderr: bool) -> None:
+                self._write_output(text, is_stderr, prefix, out_buffer)
+
+        metrics = self.metrics
+
+        def _on_data(data: bytes, is_stderr: bool) -> None:
+            if timer is not None:
+                timer.first('first_byte', time.monotonic() - started)
+            if metrics is not None:
+                metrics.add_bytes(len(data), is_stderr)
+            text = decoders[is_stderr].decode(data)
+            if text:
+                writer(text, is_stderr)
+
+        def _on_done() -> None:
+            if timer is not None:
+                timer.add('exit', time.monotonic() - started)
+            if on_done is not None:
+                on_done()
+
+        def _complete() -> int:
+            if timer is not None:
+                timer.span('exec', begin, command=command)
+            if metrics is not None:
+                metrics.observe_exec(time.monotonic() - begin)
+            try:
+                mux.discard(channel)
+                self._unregister_session(session)
+                for is_stderr, decoder in decoders.items():
+                    tail = decoder.decode(b'', final=True)
+                    if tail:
+                        writer(tail, is_stderr)
                 return channel.recv_exit_status()
             finally:
-                self._unregister_session(session)
-        finally:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+
+        try:
+            done = mux.register(channel, _on_data, _on_done)
+        except Exception:
+            _complete()
+            raise
+        if stdin_data is not None:
+            # Only now that the multiplexer drains the channel: a large script
+            # whose output fills the remote window would otherwise stall
+            # sendall for good.
             try:
+                channel.sendall(stdin_data)
+                channel.shutdown_write()
+            except Exception:
                 channel.close()
+                _complete()
+                raise
+        return channel, done, _complete
+
+    def _run_one_command(
+        self,
+        client,
+        command: str,
+        prefix: str = "",
+        out_buffer=None,
+        **start_kwargs,
+    ) -> int:
+        """Run a single command on an already-connected client.
+
+        Extra keyword arguments (``pty``, ``stdin_data``, ``writer``) are
+        passed through to :meth:`_start_command`. Raises
+        :class:`CommandTimeout` once ``command_timeout`` or the run's
+        ``deadline`` passes.
+        """
+        channel, done, complete = self._start_command(
+            client, command, prefix, out_buffer, **start_kwargs
+        )
+        limit, reason = self._command_limit()
+        try:
+            # The multiplexer signals completion; the timeout only keeps
+            # Ctrl+C responsive and guards against channels closed under us.
+            while True:
+                wait = 0.5
+                if limit is not None:
+                    wait = min(wait, limit - time.monotonic())
+                    if wait <= 0:
+                        self._abort_command(channel, complete)
+                        raise CommandTimeout(reason)
+                if done.wait(wait) or channel.closed:
+                    break
+        except KeyboardInterrupt:
+            _info(f"\n{Fore.YELLOW}Interrupted. Sending Ctrl+C...{Style.RESET_ALL}")
+            try:
+                channel.send('\x03')
             except Exception:
                 pass
+            complete()
+            raise
+        return complete()
+
+    async def _run_one_command_async(
+        self,
+        client,
+        command: str,
+        executor: ThreadPoolExecutor,
+        prefix: str = "",
+        out_buffer=None,
+        **start_kwargs,
+    ) -> int:
+        """Async counterpart of :meth:`_run_one_command`.
+
+        No thread is held while the command runs: the multiplexer resolves a
+        future on the event loop once the exit status arrives.
+        """
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def _resolve() -> None:
+            if not finished.done():
+                finished.set_result(None)
+
+        def _on_done() -> None:
+            loop.call_soon_threadsafe(_resolve)
+
+        channel, _, complete = await loop.run_in_executor(
+            executor,
+            functools.partial(
+                self._start_command, client, command, prefix, out_buffer, _on_done, **start_kwargs
+            ),
+        )
+        limit, reason = self._command_limit()
+        try:
+            if limit is None:
+                await finished
+            else:
+                await asyncio.wait_for(asyncio.shield(finished), max(0.0, limit - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._abort_command(channel, complete)
+            raise CommandTimeout(reason) from None
+        except BaseException:
+            complete()
+            raise
+        return complete()
+
+    def _command_limit(self) -> Tuple[Optional[float], str]:
+        """Return when a command starting now must end, and the reason to give."""
+        limit, reason = None, ''
+        if self.command_timeout:
+            limit = time.monotonic() + self.command_timeout
+            reason = f"Timed out after {self.command_timeout:g}s; channel closed"
+        if self.deadline is not None and (limit is None or self.deadline < limit):
+            limit, reason = self.deadline, "Run deadline reached; channel closed"
+        return limit, reason
+
+    def _abort_command(self, channel, complete: Callable[[], int]) -> None:
+        """Close a command's channel under it and release it."""
+        self._get_multiplexer().discard(channel)
+        try:
+            channel.close()
+        except Exception:
+            pass
+        complete()
+
+    def _past_deadline(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @staticmethod
+    def _note_unrun(sink: _OutputSink, remaining: int) -> None:
+        if remaining:
+            sink.note(f"Run deadline reached; {remaining} command{'s' if remaining != 1 else ''} not run")
+
+    def _timed_out(self, sink: _OutputSink, exc: CommandTimeout) -> int:
+        """Record a timed-out command on ``sink``; returns :attr:`TIMEOUT_STATUS`."""
+        sink.timed_out = True
+        sink.note(str(exc))
+        return self.TIMEOUT_STATUS
+
+    @staticmethod
+    def _build_batch_script(commands: List[str], stop_on_error: bool = False) -> Tuple[str, bytes]:
+        """Render ``commands`` as one POSIX sh script; returns ``(nonce, script)``.
+
+        Each command runs in a subshell with stdin from ``/dev/null`` (so it
+        cannot swallow the rest of the script) and is bracketed by markers
+        understood by :class:`_BatchOutputParser`.
+        """
+        nonce = secrets.token_hex(8)
+        lines = []
+        for index, command in enumerate(commands):
+            lines.append(f"printf '\\036%s:B:%d\\036' {nonce} {index}")
+            # The newline before ')' keeps a trailing '# comment' from eating it.
+            lines.append(f"( {command}\n) </dev/null")
+            lines.append("__sshc_rc=$?")
+            lines.append(f"printf '\\036%s:X:%d:%d\\036' {nonce} {index} \"$__sshc_rc\"")
+            if stop_on_error:
+                lines.append('[ "$__sshc_rc" -eq 0 ] || exit "$__sshc_rc"')
+        return nonce, ('\n'.join(lines) + '\n').encode()
+
+    def _prepare_batch(
+        self,
+        commands: List[str],
+        stop_on_error: bool = False,
+        sink: Optional[_OutputSink] = None,
+    ) -> Tuple[bytes, Callable[[str, bool], None], Callable[[int], int]]:
+        """Build a batch script plus the output writer and result collector.
+
+        Output and per-command markers go to ``sink``, or to the terminal when
+        none is given. Returns ``(script, writer, finish)``;
+        ``finish(shell_status)`` flushes the parser and returns the number of
+        failed commands.
+        """
+        nonce, script = self._build_batch_script(commands, stop_on_error)
+        if sink is None:
+            sink = _LiveOutput(self)
+        state = {'current': None, 'failures': 0}
+
+        def _on_text(text: str) -> None:
+            sink.write(text, False)
 
-    def filter_servers(self, tags: Optional[Iterable[str]] = None) -> List[Dict]:
-        """Return the subset of servers matching any of the given tags."""
-        if not tags:
+        def _on_begin(index: int) -> None:
+            state['current'] = index
+            sink.begin(commands[index])
+
+        def _on_exit(index: int, status: int) -> None:
+            state['current'] = None
+            if status != 0:
+                state['failures'] += 1
+            sink.exited(status)
+
+        parser = _BatchOutputParser(nonce, _on_text, _on_begin, _on_exit)
+
+        def _writer(text: str, is_stderr: bool) -> None:
+            if is_stderr:
+                sink.write(text, True)
+            else:
+                parser.feed(text)
+
+        def _finish(shell_status: int) -> int:
+            parser.flush()
+            if state['current'] is not None:
+                # The shell died mid-command (killed, lost connection, ...).
+                _on_exit(state['current'], shell_status if shell_status != 0 else -1)
+            elif shell_status != 0 and state['failures'] == 0:
+                state['failures'] += 1
+                sink.note(f"Batch shell exited with status {shell_status}")
+            return state['failures']
+
+        return script, _writer, _finish
+
+    def _run_batch(
+        self,
+        client,
+        commands: List[str],
+        stop_on_error: bool = False,
+        sink: Optional[_OutputSink] = None,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> int:
+        """Run ``commands`` as one remote script; returns the failed command count."""
+        sink = sink or _LiveOutput(self)
+        script, writer, finish = self._prepare_batch(commands, stop_on_error, sink)
+        try:
+            status = self._run_one_command(
+                client, self.BATCH_SHELL, pty=False, stdin_data=script, writer=writer, timer=timer
+            )
+        except CommandTimeout as exc:
+            status = self._timed_out(sink, exc)
+        return finish(status)
+
+    async def _run_batch_async(
+        self,
+        client,
+        commands: List[str],
+        executor: ThreadPoolExecutor,
+        stop_on_error: bool = False,
+        sink: Optional[_OutputSink] = None,
+        timer: Optional[_PhaseTimer] = None,
+    ) -> int:
+        """Async counterpart of :meth:`_run_batch`."""
+        sink = sink or _LiveOutput(self)
+        script, writer, finish = self._prepare_batch(commands, stop_on_error, sink)
+        try:
+            status = await self._run_one_command_async(
+                client, self.BATCH_SHELL, executor, pty=False, stdin_data=script, writer=writer,
+                timer=timer,
+            )
+        except CommandTimeout as exc:
+            status = self._timed_out(sink, exc)
+        return finish(status)
+
+    def _run_async(
+        self,
+        servers: List[Dict],
+        worker: Callable,
+        parallel: Union[int, str],
+        on_result: Callable,
+        should_stop: Optional[Callable[[], bool]] = None,
+        controller: Optional[_AdaptiveConcurrency] = None,
+    ) -> List[Dict]:
+        """Fan ``worker(server, executor)`` coroutines out over one event loop.
+
+        At most ``parallel`` hosts (or ``controller.limit``) are in flight;
+        blocking handshakes share an executor of at most
+        ``ASYNC_HANDSHAKE_WORKERS`` threads. ``on_result`` is called on the
+        loop thread as each host finishes. Hosts that have not started once
+        ``should_stop()`` is true are skipped and returned.
+        """
+        ceiling = controller.ceiling if controller else parallel
+        poll = controller.POLL_INTERVAL if controller else None
+        queue = iter(servers)
+
+        async def _main() -> None:
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, min(ceiling, self.ASYNC_HANDSHAKE_WORKERS)),
+                thread_name_prefix='ssh-commander-handshake',
+            )
+            if self.connect_parallel:
+                self._async_connect_slots = asyncio.Semaphore(self.connect_parallel)
+            running = set()
+            try:
+                while True:
+                    width = controller.limit if controller else parallel
+                    while len(running) < width and not (should_stop and should_stop()):
+                        server = next(queue, None)
+                        if server is None:
+                            break
+                        if controller:
+                            controller.begin(server)
+                        running.add(asyncio.ensure_future(worker(server, executor)))
+                    if not running:
+                        break
+                    done, running = await asyncio.wait(
+                        running, timeout=poll, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        on_result(task.result())
+            finally:
+                self._async_connect_slots = None
+                executor.shutdown(wait=False)
+
+        asyncio.run(_main())
+        return list(queue)
+
+    def _get_tag_index(self) -> Dict[str, set]:
+        """Return the tag -> server positions index, building it on first use."""
+        if self._tag_index is None:
+            index: Dict[str, set] = {}
+            for pos, server in enumerate(self.servers):
+                for tag in server.get('tags', ['default']):
+                    index.setdefault(str(tag), set()).add(pos)
+            self._tag_index = index
+        return self._tag_index
+
+    def filter_servers(self, tags: Optional[Union[str, Iterable[str]]] = None) -> List[Dict]:
+        """Return the servers matching a tag expression, in config order.
+
+        ``tags`` is an expression such as ``'prod & web & !canary'`` (see
+        :class:`_TagExpression`), or an iterable of them matched as
+        alternatives.
+        """
+        if tags is None:
             return list(self.servers)
-        wanted = {t.strip() for t in tags if t and t.strip()}
-        if not wanted:
+        text = tags if isinstance(tags, str) else ','.join(t for t in tags if t and t.strip())
+        if not text.strip():
             return list(self.servers)
-        return [
-            s for s in self.servers
-            if any(tag in s.get('tags', ['default']) for tag in wanted)
-        ]
+        matched = _TagExpression(text).evaluate(self._get_tag_index(), len(self.servers))
+        return [self.servers[pos] for pos in sorted(matched)]
+
+    def _fan_out(
+        self,
+        servers: List[Dict],
+        worker: Callable,
+        async_worker: Optional[Callable],
+        parallel: Union[int, str],
+        engine: str,
+        on_result: Callable,
+        rollout: Optional[Rollout] = None,
+    ) -> List[Dict]:
+        """Run ``worker`` for every server and feed results to ``on_result``.
+
+        Results arrive in completion order. ``engine='async'`` runs
+        ``async_worker`` on one event loop instead of a thread pool (it may be
+        None for thread-only callers).
+        ``parallel`` is a host count or ``'auto'`` to adapt it between 1 and
+        ``max_parallel`` from connect latency and errors; ``connect_parallel``
+        separately caps how many of those hosts are mid-handshake, and
+        ``connect_rate`` paces how fast new connections start.
+        ``on_result`` returns true for a failed host; with a ``rollout`` the
+        servers run batch by batch and no new host is started once its failure
+        budget is spent; likewise once :attr:`deadline` passes. Returns the
+        servers that were skipped.
+        """
+        rollout = rollout or Rollout()
+        batches = rollout.batches(servers)
+        if self.tracer is not None:
+            worker, async_worker, on_result = self._traced(worker, async_worker, on_result)
+        if self.metrics is not None:
+            worker, async_worker, on_result = self._metered(worker, async_worker, on_result)
+        controller = _AdaptiveConcurrency(self.max_parallel) if parallel == 'auto' else None
+        failures = 0
+        skipped: List[Dict] = []
+
+        def _record(result) -> None:
+            nonlocal failures
+            if on_result(result):
+                failures += 1
+
+        def _exhausted() -> bool:
+            return rollout.exhausted(failures) or self._past_deadline()
+
+        # Resolve every target up front so DNS is off each host's critical
+        # path and unresolvable hosts fail at once when their turn comes. The
+        # pool daemon resolves names itself.
+        unresolved = {}
+        if not self.pool_socket:
+            unresolved = self.resolver.prefetch(
+                ((s['hostname'], int(s.get('port', 22))) for s in servers),
+                self.connect_timeout,
+                timed=self.timings is not None or self.tracer is not None,
+            )
+        if unresolved:
+            names = sorted({host for host, _ in unresolved})
+            print(
+                f"{Fore.YELLOW}Could not resolve {len(names)} host{'s' if len(names) != 1 else ''}: "
+                f"{_fold_hostnames(names)}{Style.RESET_ALL}",
+                file=sys.stderr,
+            )
+
+        if controller is not None:
+            self._connect_observer = controller.observe
+        if self.connect_parallel:
+            self._connect_slots = threading.BoundedSemaphore(self.connect_parallel)
+        try:
+            for index, batch in enumerate(batches):
+                if _exhausted():
+                    skipped.extend(batch)
+                    continue
+                if index and rollout.pause > 0:
+                    _info(f"{Fore.CYAN}Pausing {rollout.pause:g}s before the next batch...{Style.RESET_ALL}")
+                    pause = rollout.pause
+                    if self.deadline is not None:
+                        pause = max(0.0, min(pause, self.deadline - time.monotonic()))
+                    time.sleep(pause)
+                    if _exhausted():
+                        skipped.extend(batch)
+                        continue
+                if len(batches) > 1:
+                    label = 'Canary' if index == 0 and rollout.canary else f"Batch {index + 1}/{len(batches)}"
+                    _info(
+                        f"\n{Fore.CYAN}{label}: {len(batch)} host{'s' if len(batch) != 1 else ''} "
+                        f"({_fold_hostnames(s['hostname'] for s in batch)}){Style.RESET_ALL}"
+                    )
+                skipped.extend(self._fan_out_batch(
+                    batch, worker, async_worker, parallel, engine, _record, _exhausted, controller,
+                ))
+        finally:
+            self._connect_observer = None
+            self._connect_slots = None
+            self._close_multiplexer()
+            self.resolver.save()
+            self.known_hosts.save()
+        if self.metrics is not None:
+            self.metrics.hosts_skipped(skipped)
+
+        if controller is not None:
+            _info(
+                f"\n{Fore.CYAN}Adaptive concurrency settled at {controller.limit} "
+                f"(peak {controller.peak}, max {controller.ceiling}, "
+                f"{controller.backoffs} back-off{'s' if controller.backoffs != 1 else ''}){Style.RESET_ALL}"
+            )
+        if skipped:
+            reason = (
+                "Run deadline reached" if self._past_deadline()
+                else f"Failure budget of {rollout.max_failures} spent"
+            )
+            print(
+                f"\n{Fore.YELLOW}{reason}; skipped "
+                f"{len(skipped)} host{'s' if len(skipped) != 1 else ''}: "
+                f"{_fold_hostnames(s['hostname'] for s in skipped)}{Style.RESET_ALL}",
+                file=sys.stderr,
+            )
+        return skipped
+
+    def _traced(
+        self, worker: Callable, async_worker: Callable, on_result: Callable
+    ) -> Tuple[Callable, Callable, Callable]:
+        """Wrap fan-out callables in ``host`` and ``print`` spans."""
+        tracer = self.tracer
+
+        def _worker(server: Dict):
+            with tracer.span('host', server['hostname']):
+                return worker(server)
+
+        async def _async_worker(server: Dict, executor: ThreadPoolExecutor):
+            with tracer.span('host', server['hostname']):
+                return await async_worker(server, executor)
+
+        def _on_result(result) -> bool:
+            # Every worker returns the server as the first item.
+            with tracer.span('print', result[0]['hostname']):
+                return on_result(result)
+
+        return _worker, _async_worker, _on_result
+
+    def _metered(
+        self, worker: Callable, async_worker: Callable, on_result: Callable
+    ) -> Tuple[Callable, Callable, Callable]:
+        """Wrap fan-out callables to count hosts in flight and host results."""
+        metrics = self.metrics
+
+        def _worker(server: Dict):
+            metrics.host_started()
+            return worker(server)
+
+        async def _async_worker(server: Dict, executor: ThreadPoolExecutor):
+            metrics.host_started()
+            return await async_worker(server, executor)
+
+        def _on_result(result) -> bool:
+            failed = on_result(result)
+            metrics.host_finished(result[0], bool(failed))
+            return failed
+
+        return _worker, _async_worker, _on_result
+
+    def _fan_out_batch(
+        self,
+        servers: List[Dict],
+        worker: Callable,
+        async_worker: Callable,
+        parallel: Union[int, str],
+        engine: str,
+        on_result: Callable,
+        should_stop: Callable[[], bool],
+        controller: Optional[_AdaptiveConcurrency] = None,
+    ) -> List[Dict]:
+        """Run one batch; hosts not started once ``should_stop()`` holds are returned."""
+        if engine == 'async':
+            return self._run_async(servers, async_worker, parallel, on_result, should_stop, controller)
+        ceiling = controller.ceiling if controller else parallel
+        poll = controller.POLL_INTERVAL if controller else None
+        pool_size = max(1, min(ceiling, len(servers)))
+        if pool_size == 1:
+            # Serial runs stay on the main thread so Ctrl+C reaches the remote.
+            for index, server in enumerate(servers):
+                if should_stop():
+                    return servers[index:]
+                on_result(worker(server))
+            return []
+        # Hosts are submitted as slots free up (not all at once) so a spent
+        # failure budget or a lowered adaptive limit takes effect promptly.
+        queue = iter(servers)
+        running = set()
+        with ThreadPoolExecutor(max_workers=pool_size) as pool:
+            while True:
+                width = controller.limit if controller else parallel
+                while len(running) < width and not should_stop():
+                    server = next(queue, None)
+                    if server is None:
+                        break
+                    if controller:
+                        controller.begin(server)
+                    running.add(pool.submit(worker, server))
+                if not running:
+                    break
+                done, running = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    on_result(future.result())
+        return list(queue)
+
+    def _output_mode(self, output: str, engine: str, parallel: Union[int, str], count: int) -> str:
+        """Pick how per-host output is handled.
+
+        Returns ``live``, ``buffer``, ``stream``, ``collate`` or ``ndjson``.
+        """
+        if output in ('stream', 'collate', 'ndjson'):
+            return output
+        if engine == 'async' or ((parallel == 'auto' or parallel > 1) and count > 1):
+            return 'buffer'
+        return 'live'
+
+    def _new_output(self, server: Dict, mode: str, timer: Optional[_PhaseTimer] = None):
+        if mode == 'ndjson':
+            return _RecordOutput(self.spool_threshold, timer)
+        if mode == 'stream':
+            return _HostLineWriter(server['hostname'], self._output_lock)
+        if mode in ('buffer', 'collate'):
+            return _BufferedOutput(self.spool_threshold, hashed=(mode == 'collate'))
+        return _LiveOutput(self)
+
+    def _write_record(self, server: Dict, timer: Optional[_PhaseTimer] = None, **fields) -> None:
+        """Write one host's result to stdout as a single JSON line and flush it.
+
+        The line carries the host's ``hostname`` and ``tags``, then ``fields``
+        (colour codes stripped from ``error``), then its phase ``timings``.
+        """
+        record = {'hostname': server['hostname'], 'tags': list(server.get('tags', ['default']))}
+        record.update(fields)
+        if record.get('error'):
+            record['error'] = _strip_ansi(record['error'])
+        record['timings'] = dict(timer.phases) if timer is not None else None
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._output_lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def _report_record(self, server: Dict, status: Optional[int], sink, err: str) -> None:
+        """Emit the NDJSON record for a finished exec host and release its sink."""
+        errors = ([err] if err else []) + sink.notes
+        self._write_record(
+            server, sink.timer, status=status, ok=status == 0 and not errors,
+            error='\n'.join(errors) or None, timed_out=sink.timed_out, **sink.record(),
+        )
+        sink.close()
+
+    def _report_skipped(self, skipped: List[Dict], mode: str) -> None:
+        """Emit a record for each host skipped by the rollout or deadline (NDJSON mode only)."""
+        if mode != 'ndjson':
+            return
+        reason = 'run deadline reached' if self._past_deadline() else 'failure budget spent'
+        for server in skipped:
+            self._write_record(
+                server, status=None, ok=False, error=f'skipped: {reason}',
+                timed_out=False, stdout='', stderr='',
+            )
+
+    # Stands in for the hostname in collated error messages.
+    _COLLATE_HOST = '\x00host\x00'
+
+    def _collate(self, groups: Dict[tuple, Dict], server: Dict, sink, status: int, err: str) -> None:
+        """Add a finished host to ``groups``, keeping one sink per distinct result.
+
+        Errors name the host they happened on; that name is swapped for a
+        placeholder so, say, every host refusing connections lands in one group.
+        """
+        if err:
+            err = err.replace(server['hostname'], self._COLLATE_HOST)
+        key = (sink.digest(), status, err)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {'hosts': [server['hostname']], 'sink': sink, 'status': status, 'err': err}
+            return
+        group['hosts'].append(server['hostname'])
+        sink.close()
+
+    def _print_collated(self, groups: Dict[tuple, Dict], status_label: str = 'Exited with status') -> None:
+        """Print each distinct result once, largest host group first."""
+        ordered = sorted(groups.values(), key=lambda g: (-len(g['hosts']), g['hosts'][0]))
+        with self._output_lock:
+            for group in ordered:
+                count = len(group['hosts'])
+                folded = _fold_hostnames(group['hosts'])
+                print(
+                    f"\n{Fore.LIGHTBLUE_EX}=== {folded} "
+                    f"({count} host{'s' if count != 1 else ''}) ==={Style.RESET_ALL}"
+                )
+                group['sink'].copy_to(sys.stdout)
+                if group['err']:
+                    print(group['err'].replace(self._COLLATE_HOST, folded))
+                if group['status'] != 0 and status_label:
+                    print(f"{Fore.RED}{status_label} {group['status']}{Style.RESET_ALL}")
+                group['sink'].close()
 
     def run_command_on_all(
         self,
         command: str,
-        tags: Optional[List[str]] = None,
-        parallel: int = 1,
+        tags: Optional[Union[str, List[str]]] = None,
+        parallel: Union[int, str] = 1,
         strict_host_key_checking: bool = False,
+        engine: str = 'thread',
+        output: str = 'text',
+        rollout: Optional[Rollout] = None,
     ) -> int:
         """Execute a command on servers matching the given tags.
 
-        Returns the number of servers that exited with a non-zero status (or
-        could not be reached). 0 means every target succeeded.
+        ``engine`` selects the fan-out implementation: ``'thread'`` uses a
+        worker thread per in-flight host, ``'async'`` drives every host from a
+        single event loop (output is always buffered per host).
+
+        ``output='stream'`` prints complete lines as they arrive, prefixed with
+        the hostname, instead of one block per host. ``output='collate'``
+        waits for every host and prints each distinct result once, headed by
+        a folded host list such as ``web[001-480]``. ``output='ndjson'`` writes
+        one JSON object per host to stdout as soon as it finishes (the command
+        then runs without a PTY so stdout and stderr stay separate).
+
+        ``parallel`` caps the hosts in flight; ``'auto'`` adapts it at run time
+        (up to ``max_parallel``). ``rollout`` runs the targets in batches (see
+        :class:`Rollout`).
+
+        Returns the number of servers that exited with a non-zero status, could
+        not be reached, or were skipped once the rollout's failure budget was
+        spent. 0 means every target succeeded.
         """
         if not self.servers:
             print(
@@ -623,257 +3648,910 @@ class SSHCommander:
             if tags:
                 print(
                     f"{Fore.YELLOW}No servers found with tags: "
-                    f"{', '.join(tags)}{Style.RESET_ALL}"
+                    f"{_tags_label(tags)}{Style.RESET_ALL}"
                 )
             return 0
 
         _info(f"{Fore.CYAN}Executing command: {Fore.WHITE}{command}{Style.RESET_ALL}")
+        mode = self._output_mode(output, engine, parallel, len(target_servers))
+        # NDJSON keeps stdout and stderr apart, which a PTY would merge.
+        pty = mode != 'ndjson'
 
-        def _run_for_server(server: Dict) -> Tuple[Dict, int, str, str]:
-            buffer = StringIO() if parallel > 1 else None
+        def _run_for_server(server: Dict) -> Tuple[Dict, int, object, str]:
+            timer = self._new_timer(server)
+            sink = self._new_output(server, mode, timer)
             client, error = self._connect_to_server(
-                server, strict_host_key_checking=strict_host_key_checking
+                server, strict_host_key_checking=strict_host_key_checking, timer=timer
             )
             if error:
-                return server, 1, "", error
+                return server, 1, sink, error
             session = {'client': client, 'channels': []}
             self._register_session(session)
             try:
-                exit_status = self._run_one_command(client, command, out_buffer=buffer)
-                return server, exit_status, buffer.getvalue() if buffer else "", ""
+                try:
+                    exit_status = self._run_one_command(
+                        client, command, writer=sink.write, pty=pty, timer=timer
+                    )
+                except CommandTimeout as exc:
+                    exit_status = self._timed_out(sink, exc)
+                sink.flush()
+                return server, exit_status, sink, ""
             finally:
                 self._unregister_session(session)
-                try:
-                    client.close()
-                except Exception:
-                    pass
+                self._close_client(client, timer)
+
+        async def _run_for_server_async(
+            server: Dict, executor: ThreadPoolExecutor
+        ) -> Tuple[Dict, int, object, str]:
+            timer = self._new_timer(server)
+            sink = self._new_output(server, mode, timer)
+            client, error = await self._connect_to_server_async(
+                server, executor, strict_host_key_checking=strict_host_key_checking, timer=timer
+            )
+            if error:
+                return server, 1, sink, error
+            session = {'client': client, 'channels': []}
+            self._register_session(session)
+            try:
+                exit_status = await self._run_one_command_async(
+                    client, command, executor, writer=sink.write, pty=pty, timer=timer
+                )
+                sink.flush()
+                return server, exit_status, sink, ""
+            except CommandTimeout as exc:
+                exit_status = self._timed_out(sink, exc)
+                sink.flush()
+                return server, exit_status, sink, ""
+            except Exception as exc:
+                sink.flush()
+                return server, 1, sink, (
+                    f"{Fore.RED}Error on {server['hostname']}: {exc}{Style.RESET_ALL}"
+                )
+            finally:
+                self._unregister_session(session)
+                self._close_client(client, timer)
 
         failures = 0
-        try:
-            if parallel > 1 and len(target_servers) > 1:
-                with ThreadPoolExecutor(max_workers=min(parallel, len(target_servers))) as pool:
-                    futures = {pool.submit(_run_for_server, s): s for s in target_servers}
-                    for future in as_completed(futures):
-                        server, status, output, err = future.result()
-                        header = (
-                            f"\n{Fore.LIGHTBLUE_EX}=== {server['hostname']} "
-                            f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
-                        )
-                        with self._output_lock:
-                            print(header)
-                            if output:
-                                sys.stdout.write(output)
-                                if not output.endswith('\n'):
-                                    sys.stdout.write('\n')
-                            if err:
-                                print(err)
-                            if status != 0:
-                                print(
-                                    f"{Fore.RED}Exited with status {status}{Style.RESET_ALL}"
-                                )
-                        if status != 0 or err:
-                            failures += 1
-            else:
-                for server in target_servers:
+        groups: Dict[tuple, Dict] = {}
+
+        def _run_live(server: Dict) -> Tuple[Dict, int, object, str]:
+            print(
+                f"\n{Fore.LIGHTBLUE_EX}Executing on {server['hostname']} "
+                f"({', '.join(server.get('tags', ['default']))}){Style.RESET_ALL}"
+            )
+            return _run_for_server(server)
+
+        def _report(result: Tuple[Dict, int, object, str]) -> bool:
+            nonlocal failures
+            server, status, sink, err = result
+            failed = status != 0 or bool(err)
+            if failed:
+                failures += 1
+            if mode == 'live':
+                if err:
+                    print(err)
+                elif status != 0:
+                    print(f"{Fore.RED}Command exited with status {status}{Style.RESET_ALL}")
+                return failed
+            if mode == 'collate':
+                self._collate(groups, server, sink, status, err)
+                return failed
+            if mode == 'ndjson':
+                self._report_record(server, None if err else status, sink, err)
+                return failed
+            if mode == 'stream':
+                lines = _HostLineWriter(server['hostname'], self._output_lock)
+                if err:
+                    lines.write(err + '\n', True)
+                elif status != 0:
+                    lines.write(f"{Fore.RED}Exited with status {status}{Style.RESET_ALL}\n")
+                return failed
+            header = (
+                f"\n{Fore.LIGHTBLUE_EX}=== {server['hostname']} "
+                f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
+            )
+            with self._output_lock:
+                print(header)
+                sink.copy_to(sys.stdout)
+                if err:
+                    print(err)
+                if status != 0:
                     print(
-                        f"\n{Fore.LIGHTBLUE_EX}Executing on {server['hostname']} "
-                        f"({', '.join(server.get('tags', ['default']))}){Style.RESET_ALL}"
+                        f"{Fore.RED}Exited with status {status}{Style.RESET_ALL}"
                     )
-                    _, status, _, err = _run_for_server(server)
-                    if err:
-                        print(err)
-                    if status != 0:
-                        failures += 1
-                        if not err:
-                            print(
-                                f"{Fore.RED}Command exited with status {status}{Style.RESET_ALL}"
-                            )
+            sink.close()
+            return failed
+
+        try:
+            skipped = self._fan_out(
+                target_servers, _run_live if mode == 'live' else _run_for_server,
+                _run_for_server_async, parallel, engine, _report, rollout,
+            )
+            self._report_skipped(skipped, mode)
+            if mode == 'collate':
+                self._print_collated(groups)
         except KeyboardInterrupt:
             _info(f"\n{Fore.YELLOW}Command execution interrupted. Cleaning up...{Style.RESET_ALL}")
             raise
-        return failures
+        return failures + len(skipped)
 
     def run_commands_from_file(
         self,
         command_file: str,
-        tags: Optional[List[str]] = None,
-        parallel: int = 1,
+        tags: Optional[Union[str, List[str]]] = None,
+        parallel: Union[int, str] = 1,
         strict_host_key_checking: bool = False,
         stop_on_error: bool = False,
+        engine: str = 'thread',
+        batch: bool = False,
+        output: str = 'text',
+        rollout: Optional[Rollout] = None,
+    ) -> int:
+        """Execute commands from a file on servers matching the given tags.
+
+        With ``batch`` the whole file is sent to each server as one script over
+        a single channel instead of opening a channel per command; per-command
+        exit statuses and ``stop_on_error`` still apply. ``engine``, ``output``
+        and ``rollout`` behave as in :meth:`run_command_on_all`; a server
+        counts against the failure budget if any of its commands failed. NDJSON
+        records carry the failed command count as ``status`` and a
+        ``commands`` list with each command's status and output.
+        """
+        if not self.servers:
+            print(
+                f"{Fore.YELLOW}No servers configured. Use 'ssh-commander add' to add servers.{Style.RESET_ALL}"
+            )
+            return 0
+
+        try:
+            with open(command_file, 'r') as f:
+                commands = [
+                    line.strip()
+                    for line in f
+                    if line.strip() and not line.lstrip().startswith('#')
+                ]
+        except FileNotFoundError:
+            print(f"{Fore.RED}Error: Command file {command_file} not found{Style.RESET_ALL}")
+            return 1
+
+        if not commands:
+            print(f"{Fore.YELLOW}Warning: No commands found in {command_file}{Style.RESET_ALL}")
+            print("File should contain one command per line. Lines starting with # are ignored.")
+            return 0
+
+        target_servers = self.filter_servers(tags)
+        if not target_servers:
+            if tags:
+                print(
+                    f"{Fore.YELLOW}No servers found with tags: "
+                    f"{_tags_label(tags)}{Style.RESET_ALL}"
+                )
+            return 0
+
+        mode = self._output_mode(output, engine, parallel, len(target_servers))
+        pty = mode != 'ndjson'
+
+        def _run_for_server(server: Dict) -> Tuple[Dict, int, object, str]:
+            timer = self._new_timer(server)
+            sink = self._new_output(server, mode, timer)
+            client, error = self._connect_to_server(
+                server, strict_host_key_checking=strict_host_key_checking, timer=timer
+            )
+            if error:
+                return server, 1, sink, error
+            session = {'client': client, 'channels': []}
+            self._register_session(session)
+            failures = 0
+            try:
+                if batch:
+                    failures = self._run_batch(
+                        client, commands, stop_on_error, sink=sink, timer=timer
+                    )
+                    sink.flush()
+                    return server, failures, sink, ""
+                for index, command in enumerate(commands):
+                    sink.begin(command)
+                    try:
+                        status = self._run_one_command(
+                            client, command, writer=sink.write, pty=pty, timer=timer
+                        )
+                    except CommandTimeout as exc:
+                        status = self._timed_out(sink, exc)
+                    sink.exited(status)
+                    if status != 0:
+                        failures += 1
+                        if stop_on_error:
+                            break
+                    if self._past_deadline():
+                        self._note_unrun(sink, len(commands) - index - 1)
+                        break
+                sink.flush()
+                return server, failures, sink, ""
+            finally:
+                self._unregister_session(session)
+                self._close_client(client, timer)
+
+        async def _run_for_server_async(
+            server: Dict, executor: ThreadPoolExecutor
+        ) -> Tuple[Dict, int, object, str]:
+            timer = self._new_timer(server)
+            sink = self._new_output(server, mode, timer)
+            client, error = await self._connect_to_server_async(
+                server, executor, strict_host_key_checking=strict_host_key_checking, timer=timer
+            )
+            if error:
+                return server, 1, sink, error
+            session = {'client': client, 'channels': []}
+            self._register_session(session)
+            failures = 0
+            try:
+                if batch:
+                    failures = await self._run_batch_async(
+                        client, commands, executor, stop_on_error, sink=sink, timer=timer
+                    )
+                    sink.flush()
+                    return server, failures, sink, ""
+                for index, command in enumerate(commands):
+                    sink.begin(command)
+                    try:
+                        status = await self._run_one_command_async(
+                            client, command, executor, writer=sink.write, pty=pty, timer=timer
+                        )
+                    except CommandTimeout as exc:
+                        status = self._timed_out(sink, exc)
+                    sink.exited(status)
+                    if status != 0:
+                        failures += 1
+                        if stop_on_error:
+                            break
+                    if self._past_deadline():
+                        self._note_unrun(sink, len(commands) - index - 1)
+                        break
+                sink.flush()
+                return server, failures, sink, ""
+            except Exception as exc:
+                sink.flush()
+                return server, failures + 1, sink, (
+                    f"{Fore.RED}Error on {server['hostname']}: {exc}{Style.RESET_ALL}"
+                )
+            finally:
+                self._unregister_session(session)
+                self._close_client(client, timer)
+
+        total_failures = 0
+        groups: Dict[tuple, Dict] = {}
+
+        def _run_live(server: Dict) -> Tuple[Dict, int, object, str]:
+            print(
+                f"\n{Fore.CYAN}=== Executing commands on {server['hostname']} "
+                f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
+            )
+            return _run_for_server(server)
+
+        def _report(result: Tuple[Dict, int, object, str]) -> bool:
+            nonlocal total_failures
+            server, failures, sink, err = result
+            total_failures += failures
+            failed = failures != 0 or bool(err)
+            if mode == 'live':
+                if err:
+                    print(err)
+                return failed
+            if mode == 'collate':
+                self._collate(groups, server, sink, failures, err)
+                return failed
+            if mode == 'ndjson':
+                self._report_record(server, failures, sink, err)
+                return failed
+            if mode == 'stream':
+                if err:
+                    _HostLineWriter(server['hostname'], self._output_lock).write(err + '\n', True)
+                return failed
+            header = (
+                f"\n{Fore.CYAN}=== {server['hostname']} "
+                f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
+            )
+            with self._output_lock:
+                print(header)
+                sink.copy_to(sys.stdout)
+                if err:
+                    print(err)
+            sink.close()
+            return failed
+
+        try:
+            skipped = self._fan_out(
+                target_servers, _run_live if mode == 'live' else _run_for_server,
+                _run_for_server_async, parallel, engine, _report, rollout,
+            )
+            self._report_skipped(skipped, mode)
+            if mode == 'collate':
+                # Per-command failures are already part of each output.
+                self._print_collated(groups, status_label='')
+        except KeyboardInterrupt:
+            _info(f"\n{Fore.YELLOW}Cleaning up...{Style.RESET_ALL}")
+            raise
+        finally:
+            self.cleanup_sessions()
+        return total_failures + len(skipped)
+
+    def _probe(
+        self, server: Dict, client, timer: Optional[_PhaseTimer] = None
+    ) -> Tuple[Dict, bool, str]:
+        """Confirm exec works on a connected client, then close it."""
+        try:
+            # Probe with a trivial command to confirm exec works.
+            begin = time.monotonic()
+            _, stdout, stderr = client.exec_command('true', timeout=self.connect_timeout)
+            started = time.monotonic()
+            stdout.channel.recv_exit_status()
+            if timer is not None:
+                timer.add('channel', started - begin)
+                timer.add('exit', time.monotonic() - started)
+            if self.metrics is not None:
+                self.metrics.observe_exec(time.monotonic() - begin)
+            return server, True, ""
+        except Exception as exc:
+            return server, False, f"{Fore.RED}{server['hostname']}: {exc}{Style.RESET_ALL}"
+        finally:
+            self._close_client(client, timer)
+
+    def test_connectivity(
+        self,
+        tags: Optional[Union[str, List[str]]] = None,
+        parallel: Union[int, str] = 4,
+        strict_host_key_checking: bool = False,
+        engine: str = 'thread',
+        output: str = 'text',
     ) -> int:
-        """Execute commands from a file on servers matching the given tags."""
+        """Test SSH connectivity to each target server. Returns failure count.
+
+        ``output='ndjson'`` writes one JSON object per host as it finishes
+        instead of the OK/FAIL lines.
+        """
         if not self.servers:
             print(
                 f"{Fore.YELLOW}No servers configured. Use 'ssh-commander add' to add servers.{Style.RESET_ALL}"
             )
             return 0
 
+        target_servers = self.filter_servers(tags)
+        if not target_servers:
+            if tags:
+                print(
+                    f"{Fore.YELLOW}No servers found with tags: "
+                    f"{_tags_label(tags)}{Style.RESET_ALL}"
+                )
+            return 0
+
+        timers: Dict[str, _PhaseTimer] = {}
+
+        def _new_timer(server: Dict) -> Optional[_PhaseTimer]:
+            timer = self._new_timer(server)
+            if timer is not None and output == 'ndjson':
+                timers[server['hostname']] = timer
+            return timer
+
+        def _check(server: Dict) -> Tuple[Dict, bool, str]:
+            timer = _new_timer(server)
+            # Always dial directly: a pooled connection proves nothing new.
+            client, error = self._connect_to_server(
+                server, strict_host_key_checking=strict_host_key_checking, pooled=False,
+                timer=timer,
+            )
+            if error:
+                return server, False, error
+            return self._probe(server, client, timer)
+
+        async def _check_async(
+            server: Dict, executor: ThreadPoolExecutor
+        ) -> Tuple[Dict, bool, str]:
+            timer = _new_timer(server)
+            client, error = await self._connect_to_server_async(
+                server, executor, strict_host_key_checking=strict_host_key_checking, pooled=False,
+                timer=timer,
+            )
+            if error:
+                return server, False, error
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, self._probe, server, client, timer)
+
+        failures = 0
+
+        def _report(result: Tuple[Dict, bool, str]) -> bool:
+            nonlocal failures
+            server, ok, message = result
+            if not ok:
+                failures += 1
+            if output == 'ndjson':
+                self._write_record(
+                    server, timers.pop(server['hostname'], None), ok=ok, error=message or None
+                )
+                return not ok
+            tags_str = ', '.join(server.get('tags', ['default']))
+            if ok:
+                print(
+                    f"{Fore.GREEN}OK    {Style.RESET_ALL}{server['hostname']} "
+                    f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}"
+                )
+            else:
+                print(
+                    f"{Fore.RED}FAIL  {Style.RESET_ALL}{server['hostname']} "
+                    f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}\n      {message}"
+                )
+            return not ok
+
+        self._fan_out(target_servers, _check, _check_async, parallel, engine, _report)
+        return failures
+
+    def benchmark_transport(
+        self,
+        hostname: str,
+        profiles: Optional[List[str]] = None,
+        size: int = 16 * 1024 * 1024,
+        repeat: int = 3,
+        payload: str = 'random',
+        strict_host_key_checking: bool = False,
+    ) -> List[Dict]:
+        """Measure handshake time and throughput to ``hostname`` per transport profile.
+
+        Compares paramiko's defaults, the server's configured settings and
+        each ``transport.yaml`` profile (or only those named in ``profiles``).
+        Every profile connects ``repeat`` times (the median handshake is
+        reported), then streams ``size`` bytes of ``payload`` (``random`` or
+        ``zeros``) from the server over its last connection.
+        """
+        server = self._find_server(hostname)
+        if server is None:
+            raise SSHCommanderError(f"Server '{hostname}' not found in configuration")
+        available = self.transport_profiles.profiles
+        candidates: List[Tuple[str, Dict]] = [('default', {})]
+        configured = self.transport_profiles.settings_for(server)
+        if configured:
+            candidates.append(('configured', configured))
+        for name in (profiles if profiles else available):
+            if name not in available:
+                raise SSHCommanderError(
+                    f"No transport profile '{name}' in {self.transport_profiles.path}"
+                )
+            candidates.append((name, available[name]))
+        source = '/dev/urandom' if payload == 'random' else '/dev/zero'
+        command = f"head -c {int(size)} {source}"
+
+        results: List[Dict] = []
+        try:
+            for name, settings in candidates:
+                # Apply this profile alone, not the ones the server's tags pull in.
+                probe = {k: v for k, v in server.items() if k not in ('tags', 'transport')}
+                probe['transport'] = settings
+                row: Dict = {'profile': name, 'settings': settings}
+                results.append(row)
+                handshakes: List[float] = []
+                client = None
+                for _ in range(max(1, repeat)):
+                    if client is not None:
+                        self._close_client(client)
+                    begin = time.monotonic()
+                    client, error = self._connect_to_server(
+                        probe, strict_host_key_checking=strict_host_key_checking, pooled=False,
+                    )
+                    if error:
+                        row['error'] = error
+                        break
+                    handshakes.append(time.monotonic() - begin)
+                if 'error' in row:
+                    continue
+                try:
+                    transport = client.get_transport()
+                    row['handshake'] = sorted(handshakes)[len(handshakes) // 2]
+                    row['cipher'] = transport.local_cipher
+                    row['mac'] = transport.local_mac
+                    row['compression'] = transport.local_compression
+                    channel = transport.open_session()
+                    channel.exec_command(command)
+                    begin = time.monotonic()
+                    received = 0
+                    while True:
+                        data = channel.recv(65536)
+                        if not data:
+                            break
+                        received += len(data)
+                    row['seconds'] = time.monotonic() - begin
+                    row['bytes'] = received
+                    channel.recv_exit_status()
+                except Exception as exc:
+                    row['error'] = f"{Fore.RED}{hostname} ({name}): {exc}{Style.RESET_ALL}"
+                finally:
+                    self._close_client(client)
+        finally:
+            self.known_hosts.save()
+        return results
+
+    # -- file transfer --------------------------------------------------------
+
+    def _open_sftp(self, client):
+        """Open an SFTP session with a :attr:`TRANSFER_WINDOW` channel window."""
+        paramiko = get_paramiko()
+        return paramiko.SFTPClient.from_transport(
+            client.get_transport(), window_size=self.TRANSFER_WINDOW
+        )
+
+    def _remote_digests(self, client, paths: List[str]) -> Dict[str, str]:
+        """Return the sha256 of each remote path ``sha256sum`` could read."""
+        digests: Dict[str, str] = {}
+        for i in range(0, len(paths), self.DIGEST_BATCH):
+            chunk = paths[i:i + self.DIGEST_BATCH]
+            wanted = set(chunk)
+            command = 'sha256sum -- ' + ' '.join(shlex.quote(p) for p in chunk) + ' 2>/dev/null'
+            _, stdout, _ = client.exec_command(command, timeout=self.command_timeout)
+            for line in stdout.read().decode('utf-8', errors='replace').splitlines():
+                # "<digest>  <path>"; escaped names (a leading backslash) just
+                # fail to match and get transferred.
+                digest, sep, path = line.partition('  ')
+                if sep and len(digest) == 64 and path in wanted:
+                    digests[path] = digest
+        return digests
+
+    @staticmethod
+    def _sftp_sizes(sftp, paths: Iterable[str]) -> Dict[str, int]:
+        """Sizes of the regular files among ``paths``, one listing per directory."""
+        sizes: Dict[str, int] = {}
+        by_dir: Dict[str, Dict[str, str]] = {}
+        for path in paths:
+            by_dir.setdefault(posixpath.dirname(path) or '.', {})[posixpath.basename(path)] = path
+        for directory, names in by_dir.items():
+            try:
+                entries = sftp.listdir_attr(directory)
+            except IOError:
+                continue
+            for entry in entries:
+                path = names.get(entry.filename)
+                if path is not None and stat.S_ISREG(entry.st_mode or 0):
+                    sizes[path] = entry.st_size
+        return sizes
+
+    @staticmethod
+    def _sftp_makedirs(sftp, path: str, known: set) -> None:
+        """Create remote directory ``path`` and any missing parents."""
+        missing = []
+        while path and path not in ('/', '.') and path not in known:
+            try:
+                sftp.stat(path)
+                break
+            except IOError:
+                missing.append(path)
+                path = posixpath.dirname(path)
+        for directory in reversed(missing):
+            sftp.mkdir(directory)
+            known.add(directory)
+        known.add(path)
+
+    @staticmethod
+    def _sftp_walk(sftp, root: str) -> List[Tuple[str, str, object]]:
+        """List remote ``root`` (a file or a tree) as (path, relative path, attributes)."""
+        attr = sftp.stat(root)
+        if not stat.S_ISDIR(attr.st_mode or 0):
+            return [(root, '', attr)]
+        files = []
+        pending = [(root, '')]
+        while pending:
+            directory, prefix = pending.pop()
+            for entry in sorted(sftp.listdir_attr(directory), key=lambda e: e.filename):
+                if not entry.filename or '/' in entry.filename or entry.filename in ('.', '..'):
+                    # The server picks these names; never let one climb out of the tree.
+                    raise SSHCommanderError(f"{directory}: server sent unsafe name {entry.filename!r}")
+                path = posixpath.join(directory, entry.filename)
+                rel = f"{prefix}{entry.filename}"
+                if stat.S_ISDIR(entry.st_mode or 0):
+                    pending.append((path, rel + '/'))
+                elif stat.S_ISREG(entry.st_mode or 0):
+                    files.append((path, rel, entry))
+        return files
+
+    @staticmethod
+    def _local_walk(root: str) -> List[Tuple[str, str, os.stat_result]]:
+        """List local ``root`` (a file or a tree) as (path, relative path, stat)."""
+        st = os.stat(root)
+        if not stat.S_ISDIR(st.st_mode):
+            return [(root, '', st)]
+        files = []
+        for directory, dirs, names in os.walk(root):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                st = os.stat(path)
+                if stat.S_ISREG(st.st_mode):
+                    files.append((path, os.path.relpath(path, root).replace(os.sep, '/'), st))
+        return files
+
+    @staticmethod
+    def _sftp_upload(sftp, local: str, remote: str, st: os.stat_result) -> None:
+        """Upload ``local`` next to ``remote`` and rename it into place."""
+        tmp = posixpath.join(
+            posixpath.dirname(remote), f".{posixpath.basename(remote)}.ssh-commander-{secrets.token_hex(4)}"
+        )
+        try:
+            with open(local, 'rb') as f:
+                # putfo pipelines the writes instead of waiting on each one.
+                sftp.putfo(f, tmp, file_size=st.st_size)
+            sftp.chmod(tmp, stat.S_IMODE(st.st_mode))
+            sftp.utime(tmp, (st.st_atime, st.st_mtime))
+            try:
+                sftp.posix_rename(tmp, remote)
+            except IOError:
+                # No posix-rename@openssh.com; plain SFTP rename won't overwrite.
+                try:
+                    sftp.remove(remote)
+                except IOError:
+                    pass
+                sftp.rename(tmp, remote)
+        except BaseException:
+            try:
+                sftp.remove(tmp)
+            except (IOError, OSError):
+                pass
+            raise
+
+    @staticmethod
+    def _sftp_download(sftp, remote: str, local: str, attr) -> None:
+        """Download ``remote`` next to ``local`` and rename it into place."""
+        directory = os.path.dirname(local) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.ssh-commander-', dir=directory)
         try:
-            with open(command_file, 'r') as f:
-                commands = [
-                    line.strip()
-                    for line in f
-                    if line.strip() and not line.lstrip().startswith('#')
-                ]
-        except FileNotFoundError:
-            print(f"{Fore.RED}Error: Command file {command_file} not found{Style.RESET_ALL}")
-            return 1
-
-        if not commands:
-            print(f"{Fore.YELLOW}Warning: No commands found in {command_file}{Style.RESET_ALL}")
-            print("File should contain one command per line. Lines starting with # are ignored.")
-            return 0
+            with os.fdopen(fd, 'wb') as f:
+                # getfo prefetches: many reads in flight instead of one at a time.
+                sftp.getfo(remote, f)
+            if attr.st_mode is not None:
+                os.chmod(tmp_path, stat.S_IMODE(attr.st_mode))
+            if attr.st_mtime is not None:
+                os.utime(tmp_path, (attr.st_atime or attr.st_mtime, attr.st_mtime))
+            os.replace(tmp_path, local)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
 
-        target_servers = self.filter_servers(tags)
-        if not target_servers:
-            if tags:
-                print(
-                    f"{Fore.YELLOW}No servers found with tags: "
-                    f"{', '.join(tags)}{Style.RESET_ALL}"
-                )
-            return 0
+    def _transfer(
+        self,
+        verb: str,
+        servers: List[Dict],
+        worker: Callable[[Dict, object, Dict], None],
+        parallel: Union[int, str],
+        strict_host_key_checking: bool,
+    ) -> int:
+        """Fan ``worker(server, client, stats)`` out for push/pull and report it.
 
-        def _run_for_server(server: Dict) -> Tuple[Dict, int, str, str]:
-            buffer = StringIO() if parallel > 1 else None
+        Prints an OK/FAIL line per host and a total; returns the failed host count.
+        """
+        def _run(server: Dict) -> Tuple[Dict, Dict, str]:
+            stats = {'sent': 0, 'bytes': 0, 'unchanged': 0, 'started': time.monotonic()}
             client, error = self._connect_to_server(
-                server, strict_host_key_checking=strict_host_key_checking
+                server, strict_host_key_checking=strict_host_key_checking, pooled=False
             )
             if error:
-                return server, 1, "", error
+                return server, stats, error
             session = {'client': client, 'channels': []}
             self._register_session(session)
-            failures = 0
             try:
-                for command in commands:
-                    if buffer is not None:
-                        buffer.write(f"{Fore.YELLOW}>>> {command}{Style.RESET_ALL}\n")
-                    else:
-                        with self._output_lock:
-                            print(f"{Fore.YELLOW}>>> {command}{Style.RESET_ALL}", flush=True)
-                    status = self._run_one_command(client, command, out_buffer=buffer)
-                    if status != 0:
-                        failures += 1
-                        msg = f"{Fore.RED}Command exited with status {status}{Style.RESET_ALL}"
-                        if buffer is not None:
-                            buffer.write(msg + "\n")
-                        else:
-                            print(msg)
-                        if stop_on_error:
-                            break
-                return server, failures, buffer.getvalue() if buffer else "", ""
+                worker(server, client, stats)
+                return server, stats, ""
+            except Exception as exc:
+                return server, stats, f"{Fore.RED}{server['hostname']}: {exc}{Style.RESET_ALL}"
             finally:
                 self._unregister_session(session)
-                try:
-                    client.close()
-                except Exception:
-                    pass
+                self._close_client(client)
+
+        failures = 0
+        totals = {'sent': 0, 'bytes': 0, 'unchanged': 0}
+        started = time.monotonic()
+
+        def _report(result: Tuple[Dict, Dict, str]) -> bool:
+            nonlocal failures
+            server, stats, error = result
+            for key in totals:
+                totals[key] += stats[key]
+            tags_str = ', '.join(server.get('tags', ['default']))
+            if error:
+                failures += 1
+                print(
+                    f"{Fore.RED}FAIL  {Style.RESET_ALL}{server['hostname']} "
+                    f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}\n      {error}"
+                )
+                return True
+            print(
+                f"{Fore.GREEN}OK    {Style.RESET_ALL}{server['hostname']} "
+                f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}  "
+                f"{stats['sent']} {verb} ({_format_size(stats['bytes'])}), "
+                f"{stats['unchanged']} unchanged in {time.monotonic() - stats['started']:.1f}s"
+            )
+            return False
 
-        total_failures = 0
         try:
-            if parallel > 1 and len(target_servers) > 1:
-                with ThreadPoolExecutor(max_workers=min(parallel, len(target_servers))) as pool:
-                    futures = {pool.submit(_run_for_server, s): s for s in target_servers}
-                    for future in as_completed(futures):
-                        server, failures, output, err = future.result()
-                        header = (
-                            f"\n{Fore.CYAN}=== {server['hostname']} "
-                            f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
-                        )
-                        with self._output_lock:
-                            print(header)
-                            if output:
-                                sys.stdout.write(output)
-                                if not output.endswith('\n'):
-                                    sys.stdout.write('\n')
-                            if err:
-                                print(err)
-                        total_failures += failures
-            else:
-                for server in target_servers:
-                    print(
-                        f"\n{Fore.CYAN}=== Executing commands on {server['hostname']} "
-                        f"({', '.join(server.get('tags', ['default']))}) ==={Style.RESET_ALL}"
-                    )
-                    _, failures, _, err = _run_for_server(server)
-                    if err:
-                        print(err)
-                    total_failures += failures
-        except KeyboardInterrupt:
-            _info(f"\n{Fore.YELLOW}Cleaning up...{Style.RESET_ALL}")
-            raise
+            self._fan_out(servers, _run, None, parallel, 'thread', _report)
         finally:
             self.cleanup_sessions()
-        return total_failures
+        elapsed = time.monotonic() - started
+        rate = totals['bytes'] / elapsed if elapsed > 0 else 0.0
+        _info(
+            f"\n{Fore.CYAN}{len(servers) - failures}/{len(servers)} hosts: {totals['sent']} "
+            f"file{'s' if totals['sent'] != 1 else ''} {verb} ({_format_size(totals['bytes'])}), "
+            f"{totals['unchanged']} unchanged in {elapsed:.1f}s "
+            f"({_format_size(rate)}/s){Style.RESET_ALL}"
+        )
+        return failures
 
-    def test_connectivity(
-        self,
-        tags: Optional[List[str]] = None,
-        parallel: int = 4,
-        strict_host_key_checking: bool = False,
-    ) -> int:
-        """Test SSH connectivity to each target server. Returns failure count."""
+    def _transfer_targets(self, tags: Optional[Union[str, List[str]]]) -> List[Dict]:
         if not self.servers:
             print(
                 f"{Fore.YELLOW}No servers configured. Use 'ssh-commander add' to add servers.{Style.RESET_ALL}"
             )
-            return 0
-
+            return []
         target_servers = self.filter_servers(tags)
+        if not target_servers and tags:
+            print(
+                f"{Fore.YELLOW}No servers found with tags: "
+                f"{_tags_label(tags)}{Style.RESET_ALL}"
+            )
+        return target_servers
+
+    def push_files(
+        self,
+        source: str,
+        destination: str,
+        tags: Optional[Union[str, List[str]]] = None,
+        parallel: Union[int, str] = 4,
+        strict_host_key_checking: bool = False,
+        force: bool = False,
+    ) -> int:
+        """Copy a local file or directory tree to ``destination`` on every target.
+
+        A file goes to ``destination``, or into it if it is an existing remote
+        directory or ends with ``/``; a directory's contents are copied under
+        ``destination``, creating directories as needed. Files whose remote
+        size and sha256 already match are skipped unless ``force``. Each file
+        is uploaded with pipelined writes to a temporary name, given the local
+        mode and mtime, then renamed into place. Returns the failed host count.
+        """
+        source = os.path.expanduser(source)
+        if not os.path.exists(source):
+            raise SSHCommanderError(f"Local path '{source}' not found")
+        files = self._local_walk(source)
+        single = not os.path.isdir(source)
+        target_servers = self._transfer_targets(tags)
         if not target_servers:
-            if tags:
-                print(
-                    f"{Fore.YELLOW}No servers found with tags: "
-                    f"{', '.join(tags)}{Style.RESET_ALL}"
-                )
             return 0
+        # Hash each local file at most once, whichever host needs it first.
+        local_digest = functools.lru_cache(maxsize=None)(_file_sha256)
 
-        def _check(server: Dict) -> Tuple[Dict, bool, str]:
-            client, error = self._connect_to_server(
-                server, strict_host_key_checking=strict_host_key_checking
-            )
-            if error:
-                return server, False, error
+        def _push(server: Dict, client, stats: Dict) -> None:
+            sftp = self._open_sftp(client)
             try:
-                # Probe with a trivial command to confirm exec works.
-                _, stdout, stderr = client.exec_command('true', timeout=self.connect_timeout)
-                stdout.channel.recv_exit_status()
-                return server, True, ""
-            except Exception as exc:
-                return server, False, f"{Fore.RED}{server['hostname']}: {exc}{Style.RESET_ALL}"
+                root = destination
+                if single:
+                    try:
+                        is_dir = stat.S_ISDIR(sftp.stat(destination).st_mode or 0)
+                    except IOError:
+                        is_dir = False
+                    if is_dir or destination.endswith('/'):
+                        root = posixpath.join(destination, os.path.basename(source))
+                targets = [
+                    (local, posixpath.join(root, rel) if rel else root, st)
+                    for local, rel, st in files
+                ]
+                unchanged = set()
+                if not force:
+                    sizes = self._sftp_sizes(sftp, (remote for _, remote, _ in targets))
+                    same_size = [remote for _, remote, st in targets if sizes.get(remote) == st.st_size]
+                    remote_digests = self._remote_digests(client, same_size)
+                    unchanged = {
+                        remote for local, remote, _ in targets
+                        if remote in remote_digests and remote_digests[remote] == local_digest(local)
+                    }
+                made: set = set()
+                for local, remote, st in targets:
+                    if remote in unchanged:
+                        stats['unchanged'] += 1
+                        continue
+                    self._sftp_makedirs(sftp, posixpath.dirname(remote), made)
+                    try:
+                        self._sftp_upload(sftp, local, remote, st)
+                    except (IOError, OSError) as exc:
+                        raise SSHCommanderError(f"{local} -> {remote}: {exc}") from exc
+                    stats['sent'] += 1
+                    stats['bytes'] += st.st_size
             finally:
+                sftp.close()
+
+        _info(
+            f"{Fore.CYAN}Pushing {source} ({len(files)} file{'s' if len(files) != 1 else ''}, "
+            f"{_format_size(sum(st.st_size for _, _, st in files))}) to {destination}{Style.RESET_ALL}"
+        )
+        return self._transfer('sent', target_servers, _push, parallel, strict_host_key_checking)
+
+    def pull_files(
+        self,
+        source: str,
+        destination: str,
+        tags: Optional[Union[str, List[str]]] = None,
+        parallel: Union[int, str] = 4,
+        strict_host_key_checking: bool = False,
+        force: bool = False,
+    ) -> int:
+        """Copy a remote file or directory tree from every target into per-host directories.
+
+        ``source`` from host ``h`` lands in ``destination/h/<basename of
+        source>``. Local files whose size and sha256 already match are
+        skipped unless ``force``. Reads are prefetched, and each file is
+        written to a temporary name, given the remote mode and mtime, then
+        renamed into place. Returns the failed host count.
+        """
+        destination = os.path.expanduser(destination)
+        name = posixpath.basename(source.rstrip('/')) or 'root'
+        target_servers = self._transfer_targets(tags)
+        if not target_servers:
+            return 0
+
+        def _pull(server: Dict, client, stats: Dict) -> None:
+            sftp = self._open_sftp(client)
+            try:
+                base = os.path.join(destination, server['hostname'], name)
                 try:
-                    client.close()
-                except Exception:
-                    pass
+                    listing = self._sftp_walk(sftp, source)
+                except IOError as exc:
+                    raise SSHCommanderError(f"{source}: {exc}") from exc
+                targets = [
+                    (remote, os.path.join(base, *rel.split('/')) if rel else base, attr)
+                    for remote, rel, attr in listing
+                ]
+                root = os.path.realpath(base)
+                for remote, local, _ in targets:
+                    real = os.path.realpath(local)
+                    if real != root and not real.startswith(root + os.sep):
+                        raise SSHCommanderError(f"{remote}: refusing to write outside {base}")
+                unchanged = set()
+                if not force:
+                    same_size = [
+                        remote for remote, local, attr in targets
+                        if os.path.isfile(local) and os.path.getsize(local) == attr.st_size
+                    ]
+                    remote_digests = self._remote_digests(client, same_size)
+                    unchanged = {
+                        remote for remote, local, _ in targets
+                        if remote in remote_digests and remote_digests[remote] == _file_sha256(local)
+                    }
+                for remote, local, attr in targets:
+                    if remote in unchanged:
+                        stats['unchanged'] += 1
+                        continue
+                    try:
+                        self._sftp_download(sftp, remote, local, attr)
+                    except (IOError, OSError) as exc:
+                        raise SSHCommanderError(f"{remote} -> {local}: {exc}") from exc
+                    stats['sent'] += 1
+                    stats['bytes'] += attr.st_size or 0
+            finally:
+                sftp.close()
 
-        failures = 0
-        worker_count = max(1, min(parallel, len(target_servers)))
-        with ThreadPoolExecutor(max_workers=worker_count) as pool:
-            futures = {pool.submit(_check, s): s for s in target_servers}
-            for future in as_completed(futures):
-                server, ok, message = future.result()
-                tags_str = ', '.join(server.get('tags', ['default']))
-                if ok:
-                    print(
-                        f"{Fore.GREEN}OK    {Style.RESET_ALL}{server['hostname']} "
-                        f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}"
-                    )
-                else:
-                    failures += 1
-                    print(
-                        f"{Fore.RED}FAIL  {Style.RESET_ALL}{server['hostname']} "
-                        f"{Fore.LIGHTBLACK_EX}({tags_str}){Style.RESET_ALL}\n      {message}"
-                    )
-        return failures
+        _info(f"{Fore.CYAN}Pulling {source} into {os.path.join(destination, '<host>')}{Style.RESET_ALL}")
+        return self._transfer('received', target_servers, _pull, parallel, strict_host_key_checking)
 
     # -- server management ----------------------------------------------------
 
+    def _get_host_index(self) -> Dict[str, int]:
+        """Return the lowercased hostname -> position index, building it on first use."""
+        if self._host_index is None:
+            self._host_index = {
+                str(server.get('hostname', '')).strip().lower(): pos
+                for pos, server in reversed(list(enumerate(self.servers)))
+            }
+        return self._host_index
+
     def _find_server(self, hostname: str) -> Optional[Dict]:
-        host_l = hostname.strip().lower()
-        for server in self.servers:
-            if str(server.get('hostname', '')).strip().lower() == host_l:
-                return server
-        return None
+        pos = self._get_host_index().get(hostname.strip().lower())
+        return self.servers[pos] if pos is not None else None
 
     def add_server(
         self,
@@ -991,9 +4669,9 @@ class SSHCommander:
         if tags is not None:
             server['tags'] = tags if tags else ['default']
 
-        if 'key_file' not in server and 'password' not in server:
+        if 'key_file' not in server and 'password' not in server and not server.get('agent'):
             raise SSHCommanderError(
-                f"Server '{server['hostname']}' must have either a key_file or password."
+                f"Server '{server['hostname']}' must have a key_file, password or 'agent: true'."
             )
 
         self._save_servers()
@@ -1023,21 +4701,22 @@ class SSHCommander:
         removed, _ = self.remove_servers([hostname])
         return bool(removed)
 
-    def list_servers(self, tags: Optional[List[str]] = None, output: str = 'pretty') -> None:
+    def list_servers(
+        self, tags: Optional[Union[str, List[str]]] = None, output: str = 'pretty'
+    ) -> None:
         """List all configured servers."""
         servers = self.filter_servers(tags)
         if not servers:
             if tags:
                 print(
                     f"{Fore.LIGHTYELLOW_EX}No servers match tags: "
-                    f"{', '.join(tags)}{Style.RESET_ALL}"
+                    f"{_tags_label(tags)}{Style.RESET_ALL}"
                 )
             else:
                 print(f"{Fore.LIGHTYELLOW_EX}No servers configured.{Style.RESET_ALL}")
             return
 
         if output == 'json':
-            import json
             print(json.dumps(servers, indent=2, default=str))
             return
         if output == 'yaml':
@@ -1064,6 +4743,859 @@ class SSHCommander:
             tags_value = server.get('tags', ['default'])
             print(f"   {Fore.LIGHTBLUE_EX}Tags:{Style.RESET_ALL} {', '.join(tags_value)}")
 
+    def import_servers(
+        self,
+        path: str,
+        fmt: Optional[str] = None,
+        mode: str = 'merge',
+        username: Optional[str] = None,
+        key_file: Optional[str] = None,
+        dry_run: bool = False,
+    ) -> Dict[str, int]:
+        """Import servers from a CSV, JSON lines or Ansible INI inventory.
+
+        ``merge`` adds new hosts and updates existing ones field by field;
+        ``replace`` makes the file the complete inventory. ``username`` and
+        ``key_file`` fill in records that lack them. Every record is
+        validated before anything changes, and the config is saved once.
+        Returns counts of added, updated, unchanged and removed servers.
+        """
+        fmt = _inventory_format(path, fmt)
+        label = '<stdin>' if path == '-' else path
+        imported: List[Tuple[str, Dict]] = []
+        seen: Dict[str, str] = {}
+        stream = sys.stdin if path == '-' else open(path, 'r', newline='', encoding='utf-8')
+        try:
+            for line, record in _INVENTORY_READERS[fmt](stream):
+                where = f"{label}: {line}"
+                server = _import_record(record, where)
+                if username and 'username' not in server:
+                    server['username'] = username
+                if key_file and not {'key_file', 'password', 'agent'} & server.keys():
+                    server['key_file'] = key_file
+                host = server['hostname'].lower()
+                if host in seen:
+                    raise SSHCommanderError(
+                        f"{where}: duplicate hostname '{server['hostname']}' "
+                        f"(first seen at {seen[host]})"
+                    )
+                seen[host] = line
+                imported.append((where, server))
+        except SSHCommanderError as exc:
+            if str(exc).startswith(label):
+                raise
+            raise SSHCommanderError(f"{label}: {exc}") from None
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        index = self._get_host_index()
+        result = list(self.servers) if mode == 'merge' else []
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+        for where, server in imported:
+            pos = index.get(server['hostname'].lower())
+            existing = self.servers[pos] if pos is not None else None
+            if existing is not None and mode == 'merge':
+                entry = dict(existing)
+                # A new credential replaces the old one, as with 'edit'.
+                if 'key_file' in server:
+                    entry.pop('password', None)
+                if 'password' in server:
+                    entry.pop('key_file', None)
+                entry.update(server)
+            else:
+                entry = dict(server)
+                entry.setdefault('tags', ['default'])
+            if entry.get('port') == 22:
+                del entry['port']
+            if 'username' not in entry:
+                raise SSHCommanderError(f"{where}: missing username (or pass --username)")
+            if 'key_file' not in entry and 'password' not in entry and not entry.get('agent'):
+                raise SSHCommanderError(
+                    f"{where}: needs a key_file, password or agent (or pass --key-file)"
+                )
+            if existing is None:
+                counts['added'] += 1
+            elif entry == existing:
+                counts['unchanged'] += 1
+            else:
+                counts['updated'] += 1
+            if mode == 'merge' and pos is not None:
+                result[pos] = entry
+            else:
+                result.append(entry)
+        if mode == 'replace':
+            counts['removed'] = len(self.servers) - counts['updated'] - counts['unchanged']
+
+        if not dry_run and (counts['added'] or counts['updated'] or counts['removed']):
+            self.servers = result
+            self._save_servers()
+        return counts
+
+    def export_servers(
+        self, stream, fmt: str = 'jsonl', tags: Optional[Union[str, List[str]]] = None
+    ) -> int:
+        """Write the (optionally tag-filtered) servers to ``stream``. Returns the count.
+
+        Rows are written one at a time. ``jsonl`` keeps every field; ``csv``
+        and ``ini`` carry the connection fields and tags only.
+        """
+        servers = self.filter_servers(tags)
+        _INVENTORY_WRITERS[fmt](servers, stream)
+        return len(servers)
+
+
+# ---------------------------------------------------------------------------
+# Inventory import / export
+# ---------------------------------------------------------------------------
+
+_INVENTORY_EXTENSIONS = {
+    '.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.ini': 'ini', '.cfg': 'ini',
+}
+# Columns written by ``export --format csv``; ``import`` accepts any subset.
+_CSV_FIELDS = ('hostname', 'username', 'port', 'key_file', 'password', 'agent', 'tags')
+# Host variables understood by the INI reader and writer: Ansible's
+# connection variables plus our own for settings Ansible has no name for.
+_INI_VARS = {
+    'ansible_host': 'hostname',
+    'ansible_user': 'username',
+    'ansible_ssh_user': 'username',
+    'ansible_port': 'port',
+    'ansible_ssh_port': 'port',
+    'ansible_ssh_private_key_file': 'key_file',
+    'ansible_private_key_file': 'key_file',
+    'ansible_password': 'password',
+    'ansible_ssh_pass': 'password',
+    'ssh_commander_agent': 'agent',
+}
+
+
+def _inventory_format(path: str, fmt: Optional[str]) -> str:
+    """Return ``fmt`` or the format implied by ``path``'s extension."""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if path != '-' and ext in _INVENTORY_EXTENSIONS:
+        return _INVENTORY_EXTENSIONS[ext]
+    raise SSHCommanderError(
+        f"Cannot tell the inventory format of '{path}'; pass --format csv, jsonl or ini"
+    )
+
+
+def _expand_host_pattern(pattern: str) -> List[str]:
+    """Expand Ansible numeric ranges such as ``web[01:20].example.com``."""
+    match = re.search(r'\[(\d+):(\d+)\]', pattern)
+    if not match:
+        return [pattern]
+    start, end = match.groups()
+    width = len(start) if start.startswith('0') else 0
+    prefix, suffix = pattern[:match.start()], pattern[match.end():]
+    hosts: List[str] = []
+    for n in range(int(start), int(end) + 1):
+        hosts.extend(_expand_host_pattern(f"{prefix}{str(n).zfill(width)}{suffix}"))
+    return hosts
+
+
+def _read_csv_inventory(stream) -> Iterable[Tuple[str, Dict]]:
+    """Yield ``(location, record)`` for each row of a CSV file with a header."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {
+            key.strip(): value.strip() for key, value in row.items()
+            if isinstance(key, str) and isinstance(value, str) and value.strip()
+        }
+        if record:
+            yield f"line {reader.line_num}", record
+
+
+def _read_jsonl_inventory(stream) -> Iterable[Tuple[str, Dict]]:
+    """Yield ``(location, record)`` for each JSON object line."""
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise SSHCommanderError(f"line {lineno}: invalid JSON: {exc}") from None
+        if not isinstance(record, dict):
+            raise SSHCommanderError(f"line {lineno}: expected a JSON object")
+        yield f"line {lineno}", record
+
+
+def _read_ini_inventory(stream) -> Iterable[Tuple[str, Dict]]:
+    """Yield ``(location, record)`` per host of an Ansible-style INI inventory.
+
+    Groups (including those inherited through ``[group:children]``) become
+    tags; ``ansible_*`` connection variables from ``[group:vars]`` and host
+    lines map onto server fields, host variables winning.
+    """
+    hosts: Dict[str, Dict] = {}
+    group_vars: Dict[str, Dict[str, str]] = {}
+    children: Dict[str, List[str]] = {}
+    section, kind = 'ungrouped', 'hosts'
+    for lineno, raw in enumerate(stream, 1):
+        line = raw.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section, _, kind = line[1:-1].strip().partition(':')
+            kind = kind or 'hosts'
+            if kind not in ('hosts', 'vars', 'children'):
+                raise SSHCommanderError(f"line {lineno}: unsupported section {line}")
+            continue
+        if kind == 'children':
+            children.setdefault(section, []).append(line.split()[0])
+            continue
+        if kind == 'vars':
+            key, sep, value = line.partition('=')
+            if not sep:
+                raise SSHCommanderError(f"line {lineno}: expected key=value, got '{line}'")
+            group_vars.setdefault(section, {})[key.strip()] = value.strip().strip('\'"')
+            continue
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError as exc:
+            raise SSHCommanderError(f"line {lineno}: {exc}") from None
+        assignments: Dict[str, str] = {}
+        for word in words[1:]:
+            key, sep, value = word.partition('=')
+            if not sep:
+                raise SSHCommanderError(f"line {lineno}: expected key=value, got '{word}'")
+            assignments[key] = value
+        for name in _expand_host_pattern(words[0]):
+            entry = hosts.setdefault(name, {'vars': {}, 'groups': [], 'where': f"line {lineno}"})
+            entry['vars'].update(assignments)
+            if section not in ('all', 'ungrouped') and section not in entry['groups']:
+                entry['groups'].append(section)
+
+    parents: Dict[str, List[str]] = {}
+    for parent, kids in children.items():
+        for kid in kids:
+            parents.setdefault(kid, []).append(parent)
+    for name, entry in hosts.items():
+        groups = list(entry['groups'])
+        for group in groups:  # grows as parents are appended
+            for parent in parents.get(group, ()):
+                if parent not in groups and parent != 'all':
+                    groups.append(parent)
+        # 'all' first, then parents before the groups that inherit from them.
+        merged = dict(group_vars.get('all', {}))
+        for group in reversed(groups):
+            merged.update(group_vars.get(group, {}))
+        merged.update(entry['vars'])
+        record: Dict = {'hostname': name}
+        for var, value in merged.items():
+            if var in _INI_VARS:
+                record[_INI_VARS[var]] = value
+        if groups:
+            record['tags'] = groups
+        yield entry['where'], record
+
+
+def _import_record(record: Dict, where: str) -> Dict:
+    """Turn a raw inventory record into (possibly partial) server fields."""
+    server: Dict = {}
+    for field in ('hostname', 'username', 'key_file'):
+        value = record.get(field)
+        if value is not None and str(value).strip():
+            server[field] = str(value).strip()
+    if record.get('password') not in (None, ''):
+        server['password'] = str(record['password'])
+    if 'hostname' not in server:
+        raise SSHCommanderError(f"{where}: missing hostname")
+    if record.get('port') not in (None, ''):
+        try:
+            port = int(record['port'])
+        except (TypeError, ValueError):
+            port = 0
+        if not 1 <= port <= 65535:
+            raise SSHCommanderError(f"{where}: invalid port {record['port']!r}")
+        server['port'] = port
+    if record.get('agent') not in (None, ''):
+        agent = record['agent']
+        server['agent'] = (
+            agent if isinstance(agent, bool) else str(agent).strip().lower() in ('1', 'true', 'yes')
+        )
+    tags = record.get('tags')
+    if isinstance(tags, str):
+        tags = [t for t in re.split(r'[,;\s]+', tags) if t]
+    if tags:
+        if not isinstance(tags, list):
+            raise SSHCommanderError(f"{where}: 'tags' must be a list or a comma-separated string")
+        server['tags'] = [str(t) for t in tags]
+    if 'transport' in record:
+        try:
+            server['transport'] = _TransportProfiles.check(record['transport'], where)
+        except ValueError as exc:
+            raise SSHCommanderError(str(exc)) from None
+    return server
+
+
+def _write_csv_inventory(servers: Iterable[Dict], stream) -> None:
+    writer = csv.writer(stream, lineterminator='\n')
+    writer.writerow(_CSV_FIELDS)
+    for server in servers:
+        writer.writerow([
+            server['hostname'],
+            server.get('username', ''),
+            server.get('port', 22),
+            server.get('key_file', ''),
+            server.get('password', ''),
+            'true' if server.get('agent') else '',
+            ','.join(str(t) for t in server.get('tags', ['default'])),
+        ])
+
+
+def _write_jsonl_inventory(servers: Iterable[Dict], stream) -> None:
+    for server in servers:
+        stream.write(json.dumps(server, default=str) + '\n')
+
+
+def _write_ini_inventory(servers: Iterable[Dict], stream) -> None:
+    groups: Dict[str, List[Dict]] = {}
+    for server in servers:
+        for tag in server.get('tags', ['default']):
+            groups.setdefault(str(tag), []).append(server)
+    for tag, members in groups.items():
+        stream.write(f"[{tag}]\n")
+        for server in members:
+            words = [server['hostname'], f"ansible_user={shlex.quote(str(server.get('username', '')))}"]
+            if int(server.get('port', 22)) != 22:
+                words.append(f"ansible_port={server['port']}")
+            if 'key_file' in server:
+                words.append(f"ansible_ssh_private_key_file={shlex.quote(str(server['key_file']))}")
+            if 'password' in server:
+                words.append(f"ansible_password={shlex.quote(str(server['password']))}")
+            if server.get('agent'):
+                words.append('ssh_commander_agent=true')
+            stream.write(' '.join(words) + '\n')
+        stream.write('\n')
+
+
+_INVENTORY_READERS: Dict[str, Callable] = {
+    'csv': _read_csv_inventory,
+    'jsonl': _read_jsonl_inventory,
+    'ini': _read_ini_inventory,
+}
+_INVENTORY_WRITERS: Dict[str, Callable] = {
+    'csv': _write_csv_inventory,
+    'jsonl': _write_jsonl_inventory,
+    'ini': _write_ini_inventory,
+}
+
+
+# ---------------------------------------------------------------------------
+# Connection pool daemon
+# ---------------------------------------------------------------------------
+
+# Frames exchanged over the pool socket: a one-byte kind and a payload length.
+# Client -> daemon: Q (JSON request), I (stdin bytes for the remote channel),
+# W (shut down the channel's write side, i.e. send EOF on stdin).
+# Daemon -> client: K (ack, optional JSON), F (failure message), O / E
+# (stdout / stderr bytes) and X (exit status as a signed 32-bit int).
+_POOL_FRAME = struct.Struct('!cI')
+_POOL_EXIT = struct.Struct('!i')
+
+
+def _default_pool_socket() -> str:
+    """Return the Unix socket path used by the connection pool daemon."""
+    override = os.environ.get('SSH_COMMANDER_POOL_SOCKET')
+    if override:
+        return os.path.expanduser(override)
+    base = os.environ.get('XDG_RUNTIME_DIR') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'ssh-commander', 'pool.sock')
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("connection pool socket closed")
+        data += chunk
+    return bytes(data)
+
+
+def _pool_send(sock: socket.socket, kind: bytes, payload: bytes = b'') -> None:
+    sock.sendall(_POOL_FRAME.pack(kind, len(payload)) + payload)
+
+
+def _pool_recv(sock: socket.socket) -> Tuple[bytes, bytes]:
+    kind, size = _POOL_FRAME.unpack(_recv_exact(sock, _POOL_FRAME.size))
+    return kind, (_recv_exact(sock, size) if size else b'')
+
+
+def _pool_open(socket_path: str, request: Dict, timeout: Optional[float] = None) -> socket.socket:
+    """Connect to the pool daemon and send ``request``; returns the socket."""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise SSHCommanderError("The connection pool requires Unix domain sockets")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        _pool_send(sock, b'Q', json.dumps(request).encode())
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _pool_call(socket_path: str, request: Dict, timeout: Optional[float] = None):
+    """Send a one-shot request to the pool daemon and return its JSON reply."""
+    sock = _pool_open(socket_path, request, timeout)
+    try:
+        kind, payload = _pool_recv(sock)
+    finally:
+        sock.close()
+    if kind != b'K':
+        raise SSHCommanderError(payload.decode(errors='replace'))
+    return json.loads(payload) if payload else None
+
+
+def _pool_alive(socket_path: str) -> bool:
+    try:
+        _pool_call(socket_path, {'op': 'ping'}, timeout=2)
+        return True
+    except (OSError, EOFError, SSHCommanderError):
+        return False
+
+
+class _PooledChannel:
+    """Client-side stand-in for a paramiko channel served by the pool daemon.
+
+    Implements the part of the channel API used by ``_start_command`` and the
+    multiplexer. ``fileno()`` is the Unix socket to the daemon, which relays
+    the remote channel's output as frames.
+    """
+
+    def __init__(self, socket_path: str, server: Dict, strict_host_key_checking: bool) -> None:
+        self._socket_path = socket_path
+        self._server = server
+        self._strict = strict_host_key_checking
+        self._sock: Optional[socket.socket] = None
+        self._pty = False
+        self._combine_stderr = False
+        self._pending = bytearray()
+        self._buffers = {False: bytearray(), True: bytearray()}
+        self._exit_status: Optional[int] = None
+        self.eof_received = False
+        self.closed = False
+
+    def get_pty(self, *args, **kwargs) -> None:
+        self._pty = True
+
+    def set_combine_stderr(self, combine: bool) -> None:
+        self._combine_stderr = bool(combine)
+
+    def exec_command(self, command: str) -> None:
+        self._sock = _pool_open(self._socket_path, {
+            'op': 'exec',
+            'server': self._server,
+            'strict': self._strict,
+            'command': command,
+            'pty': self._pty,
+            'combine_stderr': self._combine_stderr,
+        })
+        kind, payload = _pool_recv(self._sock)
+        if kind != b'K':
+            self.close()
+            raise SSHCommanderError(payload.decode(errors='replace'))
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def _pump(self) -> None:
+        if self._sock is None or self.closed or self.eof_received:
+            return
+        while True:
+            try:
+                data = self._sock.recv(65536, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b''
+            if not data:
+                self.eof_received = True
+                break
+            self._pending += data
+        header = _POOL_FRAME.size
+        while len(self._pending) >= header:
+            kind, size = _POOL_FRAME.unpack_from(self._pending)
+            if len(self._pending) < header + size:
+                break
+            payload = bytes(self._pending[header:header + size])
+            del self._pending[:header + size]
+            if kind == b'O':
+                self._buffers[False] += payload
+            elif kind == b'E':
+                self._buffers[True] += payload
+            elif kind == b'X':
+                self._exit_status = _POOL_EXIT.unpack(payload)[0]
+
+    def _take(self, is_stderr: bool, nbytes: int) -> bytes:
+        buf = self._buffers[is_stderr]
+        data = bytes(buf[:nbytes])
+        del buf[:nbytes]
+        return data
+
+    def recv_ready(self) -> bool:
+        self._pump()
+        return bool(self._buffers[False])
+
+    def recv_stderr_ready(self) -> bool:
+        self._pump()
+        return bool(self._buffers[True])
+
+    def recv(self, nbytes: int) -> bytes:
+        return self._take(False, nbytes)
+
+    def recv_stderr(self, nbytes: int) -> bytes:
+        return self._take(True, nbytes)
+
+    def exit_status_ready(self) -> bool:
+        self._pump()
+        return self._exit_status is not None or self.eof_received or self.closed
+
+    def recv_exit_status(self) -> int:
+        while not self.exit_status_ready():
+            select.select([self._sock], [], [], 0.5)
+        return self._exit_status if self._exit_status is not None else -1
+
+    def send(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode()
+        _pool_send(self._sock, b'I', data)
+        return len(data)
+
+    def sendall(self, data) -> None:
+        self.send(data)
+
+    def shutdown_write(self) -> None:
+        _pool_send(self._sock, b'W')
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+
+
+class _PooledTransport:
+    """Minimal transport facade; every session is a new daemon request."""
+
+    active = True
+
+    def __init__(self, socket_path: str, server: Dict, strict_host_key_checking: bool) -> None:
+        self._args = (socket_path, server, strict_host_key_checking)
+
+    def open_session(self) -> _PooledChannel:
+        return _PooledChannel(*self._args)
+
+    def close(self) -> None:
+        # The real transport belongs to the daemon and outlives this process.
+        pass
+
+
+class _PooledClient:
+    """Stand-in for ``paramiko.SSHClient`` whose connection lives in the pool daemon."""
+
+    def __init__(self, socket_path: str, server: Dict, strict_host_key_checking: bool) -> None:
+        self._transport = _PooledTransport(socket_path, server, strict_host_key_checking)
+
+    def get_transport(self) -> _PooledTransport:
+        return self._transport
+
+    def close(self) -> None:
+        pass
+
+
+class _ConnectionPoolDaemon:
+    """Background server that keeps authenticated SSH connections open.
+
+    Clients talk to it over a Unix socket (see ``_POOL_FRAME``). Each ``exec``
+    request opens a fresh channel on a cached transport and relays its output
+    back, so repeated runs skip the TCP, key exchange and auth round trips.
+    Connections idle for longer than ``idle_ttl`` seconds are closed.
+    """
+
+    REAP_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        commander: 'SSHCommander',
+        socket_path: str,
+        idle_ttl: float = 300.0,
+        keepalive: int = 30,
+    ) -> None:
+        self._commander = commander
+        self.socket_path = socket_path
+        self.idle_ttl = idle_ttl
+        self.keepalive = keepalive
+        self._entries: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[socket.socket] = None
+
+    @staticmethod
+    def _key(server: Dict, strict_host_key_checking: bool) -> tuple:
+        # Agent use and transport tuning are part of the key: a request with
+        # other settings must not borrow a connection made with the old ones.
+        return (
+            str(server['hostname']).strip().lower(),
+            int(server.get('port', 22)),
+            server['username'],
+            server.get('key_file'),
+            server.get('password'),
+            bool(strict_host_key_checking),
+            bool(server.get('agent')),
+            json.dumps(server.get('transport') or {}, sort_keys=True),
+        )
+
+    def _acquire(self, server: Dict, strict_host_key_checking: bool) -> Tuple[Dict, object]:
+        key = self._key(server, strict_host_key_checking)
+        with self._lock:
+            entry = self._entries.setdefault(key, {
+                'hostname': server['hostname'],
+                'username': server['username'],
+                'port': int(server.get('port', 22)),
+                'client': None,
+                'active': 0,
+                'last_used': time.monotonic(),
+                'lock': threading.Lock(),
+            })
+            entry['active'] += 1
+        try:
+            with entry['lock']:
+                client = entry['client']
+                transport = client.get_transport() if client is not None else None
+                if transport is None or not transport.is_active():
+                    if client is not None:
+                        client.close()
+                    entry['client'] = None
+                    client, error = self._commander._connect_to_server(
+                        server,
+                        strict_host_key_checking=strict_host_key_checking,
+                        pooled=False,
+                    )
+                    if error:
+                        raise SSHCommanderError(error)
+                    self._commander.known_hosts.save()
+                    tuning = self._commander.transport_profiles.settings_for(server)
+                    if self.keepalive and 'keepalive' not in tuning:
+                        client.get_transport().set_keepalive(self.keepalive)
+                    entry['client'] = client
+            return entry, client
+        except Exception:
+            self._release(entry)
+            raise
+
+    def _release(self, entry: Dict) -> None:
+        with self._lock:
+            entry['active'] -= 1
+            entry['last_used'] = time.monotonic()
+
+    def _reap(self) -> None:
+        while not self._stop.wait(self.REAP_INTERVAL):
+            now = time.monotonic()
+            stale = []
+            with self._lock:
+                for key, entry in list(self._entries.items()):
+                    if entry['active']:
+                        continue
+                    client = entry['client']
+                    transport = client.get_transport() if client is not None else None
+                    alive = transport is not None and transport.is_active()
+                    if not alive or now - entry['last_used'] > self.idle_ttl:
+                        stale.append(self._entries.pop(key))
+            for entry in stale:
+                if entry['client'] is not None:
+                    try:
+                        entry['client'].close()
+                    except Exception:
+                        pass
+
+    def _status(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    'hostname': entry['hostname'],
+                    'username': entry['username'],
+                    'port': entry['port'],
+                    'active': entry['active'],
+                    'idle': round(now - entry['last_used'], 1),
+                }
+                for entry in self._entries.values()
+                if entry['client'] is not None
+            ]
+
+    def _relay(self, conn: socket.socket, channel) -> None:
+        """Forward channel output to ``conn`` and ``conn`` input to the channel."""
+        selector = selectors.DefaultSelector()
+        selector.register(channel.fileno(), selectors.EVENT_READ, 'channel')
+        selector.register(conn, selectors.EVENT_READ, 'client')
+        parked = False
+        try:
+            while True:
+                exited = channel.exit_status_ready()
+                while channel.recv_ready():
+                    data = channel.recv(_ChannelMultiplexer.READ_SIZE)
+                    if not data:
+                        break
+                    _pool_send(conn, b'O', data)
+                while channel.recv_stderr_ready():
+                    data = channel.recv_stderr(_ChannelMultiplexer.READ_SIZE)
+                    if not data:
+                        break
+                    _pool_send(conn, b'E', data)
+                if exited:
+                    _pool_send(conn, b'X', _POOL_EXIT.pack(channel.recv_exit_status()))
+                    return
+                if channel.eof_received and not parked:
+                    selector.unregister(channel.fileno())
+                    parked = True
+                timeout = _ChannelMultiplexer.DRAIN_INTERVAL if parked else None
+                for key, _ in selector.select(timeout):
+                    if key.data != 'client':
+                        continue
+                    try:
+                        kind, payload = _pool_recv(conn)
+                    except EOFError:
+                        # The CLI went away; closing the channel ends the command.
+                        return
+                    if kind == b'I':
+                        channel.sendall(payload)
+                    elif kind == b'W':
+                        channel.shutdown_write()
+        finally:
+            selector.close()
+
+    def _exec(self, conn: socket.socket, request: Dict) -> None:
+        entry, client = self._acquire(request['server'], bool(request.get('strict')))
+        try:
+            channel = client.get_transport().open_session()
+            try:
+                if request.get('pty'):
+                    channel.get_pty()
+                channel.set_combine_stderr(bool(request.get('combine_stderr')))
+                channel.exec_command(request['command'])
+                _pool_send(conn, b'K')
+                self._relay(conn, channel)
+            finally:
+                channel.close()
+        finally:
+            self._release(entry)
+
+    def _handle(self, conn: socket.socket) -> None:
+        try:
+            kind, payload = _pool_recv(conn)
+            request = json.loads(payload) if kind == b'Q' else {}
+            op = request.get('op')
+            if op == 'ping':
+                _pool_send(conn, b'K', json.dumps({'pid': os.getpid()}).encode())
+            elif op == 'status':
+                _pool_send(conn, b'K', json.dumps(self._status()).encode())
+            elif op == 'stop':
+                _pool_send(conn, b'K')
+                self._stop.set()
+            elif op == 'connect':
+                entry, _ = self._acquire(request['server'], bool(request.get('strict')))
+                self._release(entry)
+                _pool_send(conn, b'K')
+            elif op == 'exec':
+                self._exec(conn, request)
+            else:
+                _pool_send(conn, b'F', f"Unknown pool request: {op!r}".encode())
+        except EOFError:
+            pass
+        except Exception as exc:
+            try:
+                _pool_send(conn, b'F', str(exc).encode())
+            except OSError:
+                pass
+        finally:
+            conn.close()
+
+    def bind(self) -> None:
+        """Create the listening socket, refusing to replace a live daemon."""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise SSHCommanderError("The connection pool requires Unix domain sockets")
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if _pool_alive(self.socket_path):
+                raise SSHCommanderError(
+                    f"A connection pool is already running on {self.socket_path}"
+                )
+            os.unlink(self.socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(128)
+        # Wake up periodically so a 'stop' request is noticed promptly.
+        listener.settimeout(1.0)
+        self._listener = listener
+
+    def serve_forever(self) -> None:
+        if self._listener is None:
+            self.bind()
+        reaper = threading.Thread(target=self._reap, name='ssh-commander-pool-reaper', daemon=True)
+        reaper.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self._stop.set()
+            self._listener.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            with self._lock:
+                entries, self._entries = list(self._entries.values()), {}
+            for entry in entries:
+                if entry['client'] is not None:
+                    try:
+                        entry['client'].close()
+                    except Exception:
+                        pass
+
+
+def _start_pool_daemon(daemon: _ConnectionPoolDaemon, foreground: bool = False) -> None:
+    """Bind the pool socket and serve it, detaching unless ``foreground``."""
+    daemon.bind()
+    if foreground:
+        daemon.serve_forever()
+        return
+    if not hasattr(os, 'fork'):
+        raise SSHCommanderError("Background mode is not supported here; use --foreground")
+    if os.fork() != 0:
+        return
+    # Child: detach from the terminal and serve until asked to stop.
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        daemon.serve_forever()
+    finally:
+        os._exit(0)
+
 
 # ---------------------------------------------------------------------------
 # CLI
@@ -1077,6 +5609,27 @@ def _split_tags(value: Optional[str]) -> Optional[List[str]]:
     return parts or None
 
 
+def _tags_label(tags: Union[str, Iterable[str]]) -> str:
+    """Render a tag filter for messages."""
+    return tags if isinstance(tags, str) else ', '.join(tags)
+
+
+def _default_dns_cache() -> str:
+    """Return the file used by ``--dns-cache-ttl`` to persist resolved addresses."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'ssh-commander', 'dns.json')
+
+
+def _parallel_arg(value: str) -> Union[int, str]:
+    """argparse type for ``--parallel``: a host count or ``auto``."""
+    if value.strip().lower() == 'auto':
+        return 'auto'
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or 'auto', got {value!r}")
+
+
 def _confirm(prompt: str, assume_yes: bool = False) -> bool:
     if assume_yes:
         return True
@@ -1095,14 +5648,49 @@ def print_examples() -> None:
          "ssh-commander exec -c 'uptime' -t prod,web"),
         ("# Execute commands across servers in parallel",
          "ssh-commander exec -c 'uptime' --parallel 8"),
+        ("# Let ssh-commander find a safe level of concurrency",
+         "ssh-commander exec -c 'uptime' --parallel auto --max-parallel 200"),
+        ("# Start at most 50 connections a second, and 5 a second behind one bastion",
+         "ssh-commander exec -c 'uptime' -p 500 --connect-rate 50/s --connect-rate-per tag:bastion-eu=5/s"),
+        ("# Run 100 hosts at once but only 10 handshakes, retrying flaky connects",
+         "ssh-commander exec -c 'uptime' -p 100 --connect-parallel 10 --connect-retries 3"),
+        ("# Fan out to a large fleet from a single event loop",
+         "ssh-commander exec -c 'uptime' --parallel 500 --engine async"),
+        ("# Stream output line by line, prefixed with the hostname",
+         "ssh-commander exec -c 'journalctl -f -n 20' -p 50 -o stream"),
+        ("# One JSON object per host as it finishes, for jq or a log collector",
+         "ssh-commander exec -c 'uptime' -p 200 -o ndjson | jq -c '{hostname, status}'"),
+        ("# Roll out in batches of 10% after one canary, stopping after 3 failures",
+         "ssh-commander exec -c 'systemctl restart app' -p 20 --canary 1 "
+         "--batch-percent 10 --pause 30 --max-failures 3"),
+        ("# Give each command 30s and the whole run 5 minutes",
+         "ssh-commander exec -c 'df -h /mnt/shared' -p 50 --command-timeout 30 --deadline 300"),
+        ("# Show where the time goes (resolve, tcp, kex, auth, ... per host)",
+         "ssh-commander exec -c 'uptime' -p 50 --timings --timings-json timings.json"),
+        ("# Trace a run per host (open in chrome://tracing or Perfetto)",
+         "ssh-commander exec -c 'uptime' -p 200 --trace run.json"),
+        ("# Export run metrics for the node_exporter textfile collector",
+         "ssh-commander test -p auto --metrics-file /var/lib/node_exporter/textfile/ssh_commander.prom"),
         ("# Execute multiple commands from a file", "ssh-commander exec -f commands.txt"),
+        ("# Compare transport.yaml profiles (ciphers, compression, windows) on one host",
+         "ssh-commander transport-bench sat1.example.com --payload zeros"),
+        ("# Copy a file to every web server, skipping hosts that already have it",
+         "ssh-commander push ./app.conf /etc/app/ -t web -p 50"),
+        ("# Collect a directory from every server into ./logs/<hostname>/",
+         "ssh-commander pull /var/log/nginx ./logs -t web -p 20"),
         ("# Test SSH connectivity to all servers", "ssh-commander test"),
+        ("# Keep connections open between runs",
+         "ssh-commander pool start"),
+        (None, "ssh-commander --pool exec -c 'uptime' -t prod"),
         ("# Add a new server interactively", "ssh-commander add"),
         ("# Add a server non-interactively (scripting)",
          "ssh-commander add -y --hostname web1.example.com --username admin "
          "--key-file ~/.ssh/id_ed25519 --tags prod,web"),
         ("# List configured servers (with optional tag filter)",
          "ssh-commander list --tag prod --output hosts"),
+        ("# Bulk-load servers from an Ansible inventory, then export a subset",
+         "ssh-commander import hosts.ini --username deploy"),
+        (None, "ssh-commander export -t 'prod & db' --format csv -o prod-db.csv"),
         ("# Edit a server",
          "ssh-commander edit web1.example.com --tags prod,web,frontend --port 2222"),
         ("# Remove one or more servers",
@@ -1164,6 +5752,29 @@ def _build_parser() -> argparse.ArgumentParser:
         action='store_true',
         help='Reject unknown SSH host keys instead of auto-adding them',
     )
+    parser.add_argument(
+        '--pool',
+        action='store_true',
+        help="Reuse connections held open by the pool daemon (see 'pool start')",
+    )
+    parser.add_argument(
+        '--pool-socket',
+        metavar='PATH',
+        help='Unix socket of the pool daemon; implies --pool (default: '
+             '$SSH_COMMANDER_POOL_SOCKET or $XDG_RUNTIME_DIR/ssh-commander/pool.sock)',
+    )
+    parser.add_argument(
+        '--agent',
+        action='store_true',
+        help='Also offer ssh-agent identities when authenticating',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        dest='profile_file',
+        help='Profile the run with cProfile (all threads), write the stats to FILE '
+             'and print a summary to stderr',
+    )
 
     subparsers = parser.add_subparsers(
         dest='command',
@@ -1192,21 +5803,169 @@ def _build_parser() -> argparse.ArgumentParser:
     )
     exec_parser.add_argument(
         '-t', '--tags',
-        help='Comma-separated list of tags to filter servers (default: all)',
-        metavar='TAGS',
+        help="Tag filter: a comma list (any of) or an expression such as "
+             "'prod & web & !canary' (default: all)",
+        metavar='EXPR',
     )
     exec_parser.add_argument(
         '-p', '--parallel',
-        type=int,
+        type=_parallel_arg,
         default=1,
         metavar='N',
-        help='Run on up to N servers in parallel (default: 1, serial)',
+        help="Run on up to N servers in parallel, or 'auto' to adapt N to connect "
+             "latency and errors (default: 1, serial)",
+    )
+    exec_parser.add_argument(
+        '--max-parallel',
+        type=int,
+        default=SSHCommander.DEFAULT_MAX_PARALLEL,
+        metavar='N',
+        help=f'Upper limit for --parallel auto (default: {SSHCommander.DEFAULT_MAX_PARALLEL})',
+    )
+    exec_parser.add_argument(
+        '--connect-parallel',
+        type=int,
+        metavar='N',
+        help='Run at most N SSH handshakes at once, however many hosts run commands '
+             '(default: no separate limit)',
+    )
+    exec_parser.add_argument(
+        '--connect-rate',
+        metavar='RATE',
+        help='Start at most RATE new connections per second across the fleet, '
+             'e.g. 50/s or 300/m (default: unlimited)',
+    )
+    exec_parser.add_argument(
+        '--connect-rate-per',
+        action='append',
+        default=[],
+        metavar='KEY=RATE',
+        help='Also limit a group of hosts, e.g. tag:bastion-eu=5/s or '
+             'subnet:10.1.0.0/16=20/s (repeatable)',
+    )
+    exec_parser.add_argument(
+        '--connect-retries',
+        type=int,
+        default=0,
+        metavar='N',
+        help='Retry a connect that fails with a timeout, reset, refused port or '
+             'handshake error up to N times (default: 0)',
+    )
+    exec_parser.add_argument(
+        '--retry-backoff',
+        type=float,
+        default=1.0,
+        metavar='SECONDS',
+        help='Base delay before the first connect retry; doubles per retry, with '
+             f'jitter, up to {RetryPolicy.MAX_BACKOFF:g}s (default: 1)',
     )
     exec_parser.add_argument(
         '--stop-on-error',
         action='store_true',
         help='When using -f, stop running further commands on a server after the first failure',
     )
+    exec_parser.add_argument(
+        '-o', '--output',
+        choices=('text', 'stream', 'ndjson'),
+        default='text',
+        help='text: one block per host; stream: print lines as they arrive, '
+             'prefixed with the hostname; ndjson: one JSON object per host as it '
+             'finishes (default: text)',
+    )
+    exec_parser.add_argument(
+        '--collate',
+        action='store_true',
+        help='Print each distinct output once with a compact host list (e.g. web[001-480])',
+    )
+    exec_parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='With -f, send the whole file to each server as one script over a single channel',
+    )
+    exec_parser.add_argument(
+        '--engine',
+        choices=('thread', 'async'),
+        default='thread',
+        help='Fan-out engine: a thread per host, or one asyncio event loop (default: thread)',
+    )
+    exec_parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Print per-phase timings (p50/p95/max and slowest host) to stderr when done',
+    )
+    exec_parser.add_argument(
+        '--timings-json',
+        metavar='FILE',
+        help="Write per-host phase timings and the summary as JSON to FILE ('-' for stdout)",
+    )
+    exec_parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='Write per-host spans (connect, auth, exec, print, ...) as Chrome trace JSON '
+             'to FILE, for chrome://tracing or Perfetto',
+    )
+    exec_parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        help='Write run metrics to FILE in the Prometheus text format, for the '
+             'node_exporter textfile collector (e.g. .../textfile/ssh_commander.prom)',
+    )
+    exec_parser.add_argument(
+        '--dns-cache-ttl',
+        type=float,
+        default=0,
+        metavar='SECONDS',
+        help='Keep resolved addresses on disk for SECONDS and reuse them on later runs '
+             '(default: 0, cache in memory for this run only)',
+    )
+    rollout_group = exec_parser.add_argument_group('rolling execution')
+    batch_group = rollout_group.add_mutually_exclusive_group()
+    batch_group.add_argument(
+        '--batch-size',
+        type=int,
+        metavar='N',
+        help='Run hosts in successive batches of N (each batch finishes before the next starts)',
+    )
+    batch_group.add_argument(
+        '--batch-percent',
+        type=float,
+        metavar='PCT',
+        help='Run hosts in successive batches of PCT%% of the targets',
+    )
+    rollout_group.add_argument(
+        '--canary',
+        type=int,
+        default=0,
+        metavar='N',
+        help='Run a first batch of N canary hosts before the regular batches',
+    )
+    rollout_group.add_argument(
+        '--pause',
+        type=float,
+        default=0.0,
+        metavar='SECONDS',
+        help='Wait this long between batches (default: 0)',
+    )
+    rollout_group.add_argument(
+        '--max-failures',
+        type=int,
+        metavar='N',
+        help='Stop starting new hosts once N hosts have failed',
+    )
+    exec_parser.add_argument(
+        '--command-timeout',
+        type=float,
+        metavar='SECONDS',
+        help=f'Close the channel of a command still running after SECONDS and record '
+             f'status {SSHCommander.TIMEOUT_STATUS} (with -f, per command; with --batch, for the script)',
+    )
+    exec_parser.add_argument(
+        '--deadline',
+        type=float,
+        metavar='SECONDS',
+        help='Bound the whole run to SECONDS: start no host after it and cut off '
+             'commands still running',
+    )
 
     # add
     add_parser = subparsers.add_parser(
@@ -1263,7 +6022,10 @@ def _build_parser() -> argparse.ArgumentParser:
         help='List configured servers',
         description='Display configured servers, optionally filtered by tags',
     )
-    list_parser.add_argument('-t', '--tag', '--tags', dest='tags', help='Filter by tag(s) (comma-separated)')
+    list_parser.add_argument(
+        '-t', '--tag', '--tags', dest='tags', metavar='EXPR',
+        help="Filter by tags: a comma list (any of) or an expression such as 'prod & !canary'",
+    )
     list_parser.add_argument(
         '-o', '--output',
         choices=('pretty', 'hosts', 'yaml', 'json'),
@@ -1284,14 +6046,242 @@ def _build_parser() -> argparse.ArgumentParser:
         help='Do not prompt for confirmation',
     )
 
+    # import
+    import_parser = subparsers.add_parser(
+        'import',
+        help='Add or update servers in bulk from an inventory file',
+        description='Import servers from CSV (with a header row), JSON lines or an '
+                    'Ansible-style INI inventory in one pass and save the config once',
+    )
+    import_parser.add_argument('file', help="Inventory file ('-' for stdin)")
+    import_parser.add_argument(
+        '--format',
+        choices=('csv', 'jsonl', 'ini'),
+        help='Inventory format (default: from the file extension)',
+    )
+    import_parser.add_argument(
+        '--mode',
+        choices=('merge', 'replace'),
+        default='merge',
+        help='merge: add new and update existing servers; replace: the file becomes '
+             'the whole inventory (default: merge)',
+    )
+    import_parser.add_argument('--username', help='Username for records that have none')
+    import_parser.add_argument('--key-file', help='SSH key file for records with no credentials')
+    import_parser.add_argument('--dry-run', action='store_true', help='Report the changes without saving')
+    import_parser.add_argument(
+        '-y', '--yes',
+        action='store_true',
+        help='Do not prompt for confirmation (--mode replace)',
+    )
+
+    # export
+    export_parser = subparsers.add_parser(
+        'export',
+        help='Write servers as CSV, JSON lines or an Ansible INI inventory',
+        description='Stream the configured servers (optionally filtered by tags) in a '
+                    'format that import reads back',
+    )
+    export_parser.add_argument(
+        '-t', '--tags', metavar='EXPR',
+        help="Tag filter: a comma list (any of) or an expression such as 'prod & !canary'",
+    )
+    export_parser.add_argument(
+        '--format',
+        choices=('csv', 'jsonl', 'ini'),
+        default='jsonl',
+        help='Output format (default: jsonl, the only one that keeps every field)',
+    )
+    export_parser.add_argument(
+        '-o', '--output',
+        metavar='FILE',
+        default='-',
+        help="Write to FILE, created with 0600 permissions (default: '-', stdout)",
+    )
+
     # test
     test_parser = subparsers.add_parser(
         'test',
         help='Test SSH connectivity to servers',
         description='Connect to each target server and verify the SSH session works',
     )
-    test_parser.add_argument('-t', '--tags', help='Comma-separated tag filter')
-    test_parser.add_argument('-p', '--parallel', type=int, default=4, help='Parallel workers (default: 4)')
+    test_parser.add_argument(
+        '-t', '--tags', metavar='EXPR',
+        help="Tag filter: a comma list (any of) or an expression such as 'prod & !canary'",
+    )
+    test_parser.add_argument(
+        '-p', '--parallel',
+        type=_parallel_arg,
+        default=4,
+        help="Parallel workers, or 'auto' (default: 4)",
+    )
+    test_parser.add_argument(
+        '--max-parallel',
+        type=int,
+        default=SSHCommander.DEFAULT_MAX_PARALLEL,
+        metavar='N',
+        help=f'Upper limit for --parallel auto (default: {SSHCommander.DEFAULT_MAX_PARALLEL})',
+    )
+    test_parser.add_argument(
+        '--connect-parallel',
+        type=int,
+        metavar='N',
+        help='Run at most N SSH handshakes at once, however many hosts run commands '
+             '(default: no separate limit)',
+    )
+    test_parser.add_argument(
+        '--connect-rate',
+        metavar='RATE',
+        help='Start at most RATE new connections per second across the fleet, '
+             'e.g. 50/s or 300/m (default: unlimited)',
+    )
+    test_parser.add_argument(
+        '--connect-rate-per',
+        action='append',
+        default=[],
+        metavar='KEY=RATE',
+        help='Also limit a group of hosts, e.g. tag:bastion-eu=5/s or '
+             'subnet:10.1.0.0/16=20/s (repeatable)',
+    )
+    test_parser.add_argument(
+        '--connect-retries',
+        type=int,
+        default=0,
+        metavar='N',
+        help='Retry a connect that fails with a timeout, reset, refused port or '
+             'handshake error up to N times (default: 0)',
+    )
+    test_parser.add_argument(
+        '--retry-backoff',
+        type=float,
+        default=1.0,
+        metavar='SECONDS',
+        help='Base delay before the first connect retry; doubles per retry, with '
+             f'jitter, up to {RetryPolicy.MAX_BACKOFF:g}s (default: 1)',
+    )
+    test_parser.add_argument(
+        '-o', '--output',
+        choices=('text', 'ndjson'),
+        default='text',
+        help='text: an OK/FAIL line per host; ndjson: one JSON object per host as it '
+             'finishes (default: text)',
+    )
+    test_parser.add_argument(
+        '--engine',
+        choices=('thread', 'async'),
+        default='thread',
+        help='Fan-out engine: a thread per host, or one asyncio event loop (default: thread)',
+    )
+    test_parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Print per-phase timings (p50/p95/max and slowest host) to stderr when done',
+    )
+    test_parser.add_argument(
+        '--timings-json',
+        metavar='FILE',
+        help="Write per-host phase timings and the summary as JSON to FILE ('-' for stdout)",
+    )
+    test_parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='Write per-host spans (connect, auth, exec, print, ...) as Chrome trace JSON '
+             'to FILE, for chrome://tracing or Perfetto',
+    )
+    test_parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        help='Write run metrics to FILE in the Prometheus text format, for the '
+             'node_exporter textfile collector (e.g. .../textfile/ssh_commander.prom)',
+    )
+    test_parser.add_argument(
+        '--dns-cache-ttl',
+        type=float,
+        default=0,
+        metavar='SECONDS',
+        help='Keep resolved addresses on disk for SECONDS and reuse them on later runs '
+             '(default: 0, cache in memory for this run only)',
+    )
+
+    # push / pull
+    push_parser = subparsers.add_parser(
+        'push',
+        help='Copy a local file or directory to servers',
+        description='Copy a local file or directory tree to every target server over SFTP, '
+                    'skipping files whose size and sha256 already match',
+    )
+    push_parser.add_argument('source', help='Local file or directory')
+    push_parser.add_argument(
+        'destination',
+        help='Remote path; a file is copied into it if it is a directory or ends with /',
+    )
+    pull_parser = subparsers.add_parser(
+        'pull',
+        help='Copy a remote file or directory from servers',
+        description='Copy a remote file or directory tree from every target server over '
+                    'SFTP into DESTINATION/<hostname>/, skipping files that already match',
+    )
+    pull_parser.add_argument('source', help='Remote file or directory')
+    pull_parser.add_argument('destination', help='Local directory to create per-host directories in')
+    for transfer_parser in (push_parser, pull_parser):
+        transfer_parser.add_argument(
+            '-t', '--tags', metavar='EXPR',
+            help="Tag filter: a comma list (any of) or an expression such as 'prod & !canary'",
+        )
+        transfer_parser.add_argument(
+            '-p', '--parallel',
+            type=_parallel_arg,
+            default=4,
+            help="Servers to transfer to at once, or 'auto' (default: 4)",
+        )
+        transfer_parser.add_argument(
+            '--max-parallel',
+            type=int,
+            default=SSHCommander.DEFAULT_MAX_PARALLEL,
+            metavar='N',
+            help=f'Upper limit for --parallel auto (default: {SSHCommander.DEFAULT_MAX_PARALLEL})',
+        )
+        transfer_parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Transfer every file, even those whose size and checksum already match',
+        )
+
+    # transport-bench
+    bench_parser = subparsers.add_parser(
+        'transport-bench',
+        help='Compare transport profiles against a server',
+        description="Measure handshake time and throughput to one server with paramiko's "
+                    "defaults, the server's configured transport settings and each "
+                    "profile in transport.yaml",
+    )
+    bench_parser.add_argument('hostname', help='Configured server to benchmark against')
+    bench_parser.add_argument(
+        '--profile',
+        action='append',
+        metavar='NAME',
+        help='Only try this transport.yaml profile (repeatable; default: all)',
+    )
+    bench_parser.add_argument(
+        '--size',
+        type=int,
+        default=16 * 1024 * 1024,
+        metavar='BYTES',
+        help='Bytes to stream from the server per profile (default: 16 MiB)',
+    )
+    bench_parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        metavar='N',
+        help='Handshakes per profile; the median is reported (default: 3)',
+    )
+    bench_parser.add_argument(
+        '--payload',
+        choices=('random', 'zeros'),
+        default='random',
+        help='Stream incompressible or highly compressible data (default: random)',
+    )
 
     # sync
     sync_parser = subparsers.add_parser(
@@ -1316,6 +6306,40 @@ def _build_parser() -> argparse.ArgumentParser:
         help='Number of timestamped backups to retain (default: 5)',
     )
 
+    # pool
+    pool_parser = subparsers.add_parser(
+        'pool',
+        help='Manage the persistent connection pool daemon',
+        description='Start, stop or inspect a background daemon that keeps authenticated '
+                    'SSH connections open so repeated runs with --pool skip the handshake',
+    )
+    pool_parser.add_argument('action', choices=('start', 'stop', 'status'), help='Pool action')
+    pool_parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        help='Unix socket path (default: $SSH_COMMANDER_POOL_SOCKET or '
+             '$XDG_RUNTIME_DIR/ssh-commander/pool.sock)',
+    )
+    pool_parser.add_argument(
+        '--idle-ttl',
+        type=float,
+        default=300,
+        metavar='SECONDS',
+        help='Close connections unused for this long (default: 300)',
+    )
+    pool_parser.add_argument(
+        '--keepalive',
+        type=int,
+        default=30,
+        metavar='SECONDS',
+        help='SSH keepalive interval for pooled connections, 0 to disable (default: 30)',
+    )
+    pool_parser.add_argument(
+        '--foreground',
+        action='store_true',
+        help='Run the daemon in the foreground instead of detaching',
+    )
+
     # config-path
     subparsers.add_parser(
         'config-path',
@@ -1333,6 +6357,140 @@ def _build_parser() -> argparse.ArgumentParser:
     return parser
 
 
+def _print_transport_bench(results: List[Dict]) -> None:
+    """Print :meth:`SSHCommander.benchmark_transport` results as a table."""
+    print(
+        f"{Fore.CYAN}{'profile':<16}{'handshake':>11}{'throughput':>14}  "
+        f"{'cipher':<22}{'mac':<22}compression{Style.RESET_ALL}"
+    )
+    for row in results:
+        if 'error' in row:
+            print(f"{row['profile']:<16}{Fore.RED}failed{Style.RESET_ALL}  {row['error']}")
+            continue
+        rate = row['bytes'] / row['seconds'] / (1024 * 1024) if row['seconds'] else 0.0
+        print(
+            f"{row['profile']:<16}{row['handshake'] * 1000:>9.1f}ms{rate:>9.1f} MiB/s  "
+            f"{row['cipher']:<22}{row['mac']:<22}{row['compression']}"
+        )
+
+
+def _report_timings(report: Optional[TimingReport], args: argparse.Namespace) -> None:
+    """Print and/or write the run's phase timings as requested on the CLI."""
+    if report is None:
+        return
+    if args.timings:
+        report.print_table()
+    if args.timings_json:
+        if args.timings_json == '-':
+            json.dump(report.to_dict(), sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        else:
+            with open(os.path.expanduser(args.timings_json), 'w') as f:
+                json.dump(report.to_dict(), f, indent=2)
+
+
+def _write_trace(tracer: Optional[SpanTracer], args: argparse.Namespace) -> None:
+    if tracer is not None and args.trace:
+        tracer.write(os.path.expanduser(args.trace))
+
+
+def _write_metrics(metrics: Optional[RunMetrics], args: argparse.Namespace) -> None:
+    if metrics is not None and args.metrics_file:
+        metrics.write(os.path.expanduser(args.metrics_file))
+
+
+class _RunProfiler:
+    """cProfile the whole run, including worker and handshake threads.
+
+    ``cProfile`` only sees the thread that enabled it, so every thread
+    started during the run enables its own profiler and the results are
+    merged when the run ends. Profilers are clocked by per-thread CPU time,
+    so threads blocked on sockets or locks don't swamp the figures. Threads
+    still running at the end (after up to ``JOIN_TIMEOUT`` seconds for
+    closing transports to wind down) are left out: their open frames would
+    be closed on the main thread's clock and charged its CPU time.
+    """
+
+    # (label, path fragments) used to attribute time in the summary.
+    AREAS = (
+        ('crypto', ('cryptography', 'nacl', 'bcrypt', '_hashlib', '_ssl')),
+        ('paramiko', ('paramiko',)),
+        ('yaml', ('yaml',)),
+        ('colorama', ('colorama',)),
+        ('ssh-commander', ('ssh_commander',)),
+        ('asyncio', ('asyncio',)),
+    )
+    TOP = 25
+    JOIN_TIMEOUT = 1.0
+
+    def __init__(self) -> None:
+        self._main = cProfile.Profile(time.thread_time)
+        self._threads: List[Tuple[threading.Thread, cProfile.Profile]] = []
+        self._lock = threading.Lock()
+
+    def _thread_hook(self, frame, event, arg) -> None:
+        sys.setprofile(None)
+        profile = cProfile.Profile(time.thread_time)
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread from one profiler.
+            return
+        with self._lock:
+            self._threads.append((threading.current_thread(), profile))
+
+    def start(self) -> None:
+        threading.setprofile(self._thread_hook)
+        self._main.enable()
+
+    def stop(self, path: str) -> None:
+        self._main.disable()
+        threading.setprofile(None)
+        # Rendered into a buffer and written once: colorama appends a reset
+        # code to every write on a wrapped stream.
+        report = io.StringIO()
+        stats = pstats.Stats(self._main, stream=report)
+        with self._lock:
+            threads = list(self._threads)
+        running = 0
+        deadline = time.monotonic() + self.JOIN_TIMEOUT
+        for thread, profile in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                running += 1
+                continue
+            stats.add(profile)
+        stats.dump_stats(path)
+        self._print_summary(stats, report)
+        if running:
+            report.write(
+                f"Left out {running} thread{'s' if running != 1 else ''} still running at exit\n"
+            )
+        report.write(f"Profile written to {path} (python -m pstats {path})\n")
+        sys.stderr.write(report.getvalue())
+
+    def _area(self, filename: str) -> str:
+        for label, fragments in self.AREAS:
+            if any(fragment in filename for fragment in fragments):
+                return label
+        if filename == '~':
+            return 'builtins'
+        return 'stdlib/other'
+
+    def _print_summary(self, stats: pstats.Stats, stream) -> None:
+        areas: Dict[str, float] = {}
+        total = 0.0
+        for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+            area = self._area(filename)
+            areas[area] = areas.get(area, 0.0) + tottime
+            total += tottime
+        stream.write("\nCPU time by area (own time, all threads)\n")
+        for label, seconds in sorted(areas.items(), key=lambda item: -item[1]):
+            share = seconds / total * 100 if total else 0.0
+            stream.write(f"  {label:<14}{seconds:>9.3f}s {share:>5.1f}%\n")
+        stats.sort_stats('tottime').print_stats(self.TOP)
+
+
 def _read_password_stdin() -> str:
     if sys.stdin.isatty():
         # Friendlier than blocking silently.
@@ -1343,7 +6501,17 @@ def _read_password_stdin() -> str:
 def main(argv: Optional[List[str]] = None) -> int:
     parser = _build_parser()
     args = parser.parse_args(argv)
+    if not args.profile_file:
+        return _dispatch(parser, args)
+    profiler = _RunProfiler()
+    profiler.start()
+    try:
+        return _dispatch(parser, args)
+    finally:
+        profiler.stop(os.path.expanduser(args.profile_file))
 
+
+def _dispatch(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
     _set_output_flags(
         quiet=getattr(args, 'quiet', False),
         verbose=getattr(args, 'verbose', False),
@@ -1356,22 +6524,121 @@ def main(argv: Optional[List[str]] = None) -> int:
         return 0
 
     try:
+        pool_socket = None
+        if (args.pool or args.pool_socket) and args.command != 'pool':
+            pool_socket = (
+                os.path.expanduser(args.pool_socket) if args.pool_socket else _default_pool_socket()
+            )
+            if not _pool_alive(pool_socket):
+                print(
+                    f"{Fore.YELLOW}Warning: no connection pool running on {pool_socket}; "
+                    f"connecting directly.{Style.RESET_ALL}",
+                    file=sys.stderr,
+                )
+                pool_socket = None
+
         commander = SSHCommander(
             config_file=args.config,
             connect_timeout=args.timeout,
+            pool_socket=pool_socket,
         )
+        commander.use_agent = args.agent
+
+        if args.command in ('exec', 'test'):
+            if args.max_parallel < 1:
+                print(f"{Fore.RED}Error: --max-parallel must be >= 1{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            commander.max_parallel = args.max_parallel
+            if args.connect_parallel is not None and args.connect_parallel < 1:
+                print(f"{Fore.RED}Error: --connect-parallel must be >= 1{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            commander.connect_parallel = args.connect_parallel
+            try:
+                if args.connect_rate or args.connect_rate_per:
+                    commander.connect_rate = ConnectRateLimiter.from_specs(
+                        args.connect_rate, args.connect_rate_per
+                    )
+                commander.retry = RetryPolicy(
+                    retries=args.connect_retries,
+                    backoff=args.retry_backoff,
+                    max_backoff=max(args.retry_backoff, RetryPolicy.MAX_BACKOFF),
+                )
+            except SSHCommanderError as e:
+                print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            if args.output == 'ndjson':
+                if args.timings_json == '-':
+                    print(
+                        f"{Fore.RED}Error: --timings-json - cannot be combined with -o ndjson"
+                        f"{Style.RESET_ALL}",
+                        file=sys.stderr,
+                    )
+                    return 2
+                # Keep stdout to bare JSON lines (colorama's autoreset would
+                # append escape codes to each write); records carry timings.
+                _set_output_flags(quiet=True, no_color=True)
+                commander.timings = TimingReport()
+            elif args.timings or args.timings_json:
+                commander.timings = TimingReport()
+            if args.trace:
+                commander.tracer = SpanTracer()
+            if args.metrics_file:
+                commander.metrics = RunMetrics(args.command)
+            if args.dns_cache_ttl < 0:
+                print(f"{Fore.RED}Error: --dns-cache-ttl must be >= 0{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            if args.dns_cache_ttl:
+                commander.resolver = _HostResolver(_default_dns_cache(), ttl=args.dns_cache_ttl)
+            # Report a malformed transport.yaml once rather than per host.
+            commander.transport_profiles.load()
 
         if args.command == 'exec':
-            tags = _split_tags(args.tags)
-            if args.parallel < 1:
+            tags = args.tags
+            if args.parallel != 'auto' and args.parallel < 1:
                 print(f"{Fore.RED}Error: --parallel must be >= 1{Style.RESET_ALL}", file=sys.stderr)
                 return 2
+            output = args.output
+            if args.collate:
+                if output != 'text':
+                    print(
+                        f"{Fore.RED}Error: --collate cannot be combined with -o {output}{Style.RESET_ALL}",
+                        file=sys.stderr,
+                    )
+                    return 2
+                output = 'collate'
+            if args.batch and not args.exec_file:
+                print(f"{Fore.RED}Error: --batch requires -f/--file{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            for flag, value in (('--command-timeout', args.command_timeout), ('--deadline', args.deadline)):
+                if value is not None and value <= 0:
+                    print(f"{Fore.RED}Error: {flag} must be > 0{Style.RESET_ALL}", file=sys.stderr)
+                    return 2
+            commander.command_timeout = args.command_timeout
+            if args.deadline is not None:
+                commander.deadline = time.monotonic() + args.deadline
+            rollout = None
+            if (args.batch_size is not None or args.batch_percent is not None or args.canary
+                    or args.pause or args.max_failures is not None):
+                try:
+                    rollout = Rollout(
+                        batch_size=args.batch_size,
+                        batch_percent=args.batch_percent,
+                        canary=args.canary,
+                        pause=args.pause,
+                        max_failures=args.max_failures,
+                    )
+                except SSHCommanderError as e:
+                    print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}", file=sys.stderr)
+                    return 2
             if args.exec_command:
                 failures = commander.run_command_on_all(
                     args.exec_command,
                     tags=tags,
                     parallel=args.parallel,
                     strict_host_key_checking=args.strict_host_key_checking,
+                    engine=args.engine,
+                    output=output,
+                    rollout=rollout,
                 )
             else:
                 if not os.path.exists(args.exec_file):
@@ -1388,7 +6655,14 @@ def main(argv: Optional[List[str]] = None) -> int:
                     parallel=args.parallel,
                     strict_host_key_checking=args.strict_host_key_checking,
                     stop_on_error=args.stop_on_error,
+                    engine=args.engine,
+                    batch=args.batch,
+                    output=output,
+                    rollout=rollout,
                 )
+            _report_timings(commander.timings, args)
+            _write_trace(commander.tracer, args)
+            _write_metrics(commander.metrics, args)
             return 0 if failures == 0 else 3
 
         elif args.command == 'add':
@@ -1433,7 +6707,7 @@ def main(argv: Optional[List[str]] = None) -> int:
             return 0
 
         elif args.command == 'list':
-            tags = _split_tags(args.tags)
+            tags = args.tags
             commander.list_servers(tags=tags, output=args.output)
             return 0
 
@@ -1477,15 +6751,129 @@ def main(argv: Optional[List[str]] = None) -> int:
                 )
             return 0 if removed else 1
 
+        elif args.command == 'import':
+            if args.mode == 'replace' and not args.dry_run and commander.servers:
+                prompt = (
+                    f"Replace all {len(commander.servers)} configured server(s) "
+                    f"with the contents of {args.file}?"
+                )
+                if not _confirm(prompt, assume_yes=args.yes):
+                    print(f"{Fore.YELLOW}Aborted.{Style.RESET_ALL}")
+                    return 1
+            counts = commander.import_servers(
+                args.file,
+                fmt=args.format,
+                mode=args.mode,
+                username=args.username,
+                key_file=args.key_file,
+                dry_run=args.dry_run,
+            )
+            _info(
+                f"{Fore.GREEN}{'Would import' if args.dry_run else 'Imported'} {args.file}: "
+                f"{Style.RESET_ALL}{counts['added']} added, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['removed']} removed"
+            )
+            return 0
+
+        elif args.command == 'export':
+            if args.output == '-':
+                # Keep stdout byte-for-byte importable; colorama's autoreset
+                # would prefix every row after the first with an escape code.
+                _set_output_flags(quiet=args.quiet, no_color=True)
+                commander.export_servers(sys.stdout, fmt=args.format, tags=args.tags)
+            else:
+                # The export may contain passwords.
+                fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'w', newline='') as f:
+                    count = commander.export_servers(f, fmt=args.format, tags=args.tags)
+                _info(f"{Fore.GREEN}Exported {count} server(s) to {Style.RESET_ALL}{args.output}")
+            return 0
+
         elif args.command == 'test':
-            tags = _split_tags(args.tags)
+            tags = args.tags
             failures = commander.test_connectivity(
                 tags=tags,
-                parallel=max(1, args.parallel),
+                parallel=args.parallel if args.parallel == 'auto' else max(1, args.parallel),
+                strict_host_key_checking=args.strict_host_key_checking,
+                engine=args.engine,
+                output=args.output,
+            )
+            _report_timings(commander.timings, args)
+            _write_trace(commander.tracer, args)
+            _write_metrics(commander.metrics, args)
+            return 0 if failures == 0 else 3
+
+        elif args.command in ('push', 'pull'):
+            if args.parallel != 'auto' and args.parallel < 1:
+                print(f"{Fore.RED}Error: --parallel must be >= 1{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            if args.max_parallel < 1:
+                print(f"{Fore.RED}Error: --max-parallel must be >= 1{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            commander.max_parallel = args.max_parallel
+            transfer = commander.push_files if args.command == 'push' else commander.pull_files
+            failures = transfer(
+                args.source,
+                args.destination,
+                tags=args.tags,
+                parallel=args.parallel,
                 strict_host_key_checking=args.strict_host_key_checking,
+                force=args.force,
             )
             return 0 if failures == 0 else 3
 
+        elif args.command == 'transport-bench':
+            if args.size < 0 or args.repeat < 1:
+                print(
+                    f"{Fore.RED}Error: --size must be >= 0 and --repeat >= 1{Style.RESET_ALL}",
+                    file=sys.stderr,
+                )
+                return 2
+            results = commander.benchmark_transport(
+                args.hostname,
+                profiles=args.profile,
+                size=args.size,
+                repeat=args.repeat,
+                payload=args.payload,
+                strict_host_key_checking=args.strict_host_key_checking,
+            )
+            _print_transport_bench(results)
+            return 3 if any('error' in row for row in results) else 0
+
+        elif args.command == 'pool':
+            socket_path = args.socket or args.pool_socket
+            socket_path = os.path.expanduser(socket_path) if socket_path else _default_pool_socket()
+            if args.action == 'start':
+                daemon = _ConnectionPoolDaemon(
+                    commander,
+                    socket_path,
+                    idle_ttl=args.idle_ttl,
+                    keepalive=args.keepalive,
+                )
+                if not args.foreground:
+                    _info(f"{Fore.GREEN}Connection pool listening on {Style.RESET_ALL}{socket_path}")
+                _start_pool_daemon(daemon, foreground=args.foreground)
+                return 0
+            if not _pool_alive(socket_path):
+                print(f"{Fore.YELLOW}No connection pool running on {socket_path}{Style.RESET_ALL}")
+                return 1
+            if args.action == 'stop':
+                _pool_call(socket_path, {'op': 'stop'})
+                _info(f"{Fore.GREEN}Connection pool stopped.{Style.RESET_ALL}")
+                return 0
+            entries = _pool_call(socket_path, {'op': 'status'}) or []
+            print(
+                f"{Fore.LIGHTGREEN_EX}Connection pool on {socket_path}: "
+                f"{len(entries)} open connection(s){Style.RESET_ALL}"
+            )
+            for entry in entries:
+                print(
+                    f"  {entry['username']}@{entry['hostname']}:{entry['port']} "
+                    f"{Fore.LIGHTBLACK_EX}(active {entry['active']}, idle {entry['idle']}s)"
+                    f"{Style.RESET_ALL}"
+                )
+            return 0
+
         elif args.command == 'config-path':
             print(commander.config_file)
             return 0